@@ -0,0 +1,262 @@
+import re
+import json
+import math
+import time
+import asyncio
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple, FrozenSet
+
+from ..utils.histogram import LatencyHistogram
+
+CLASSES = ("search", "chat", "ingest", "eval")
+
+ROUTES = [
+    ("POST", re.compile(r"^/search$"), "search"),
+    ("POST", re.compile(r"^/chat$"), "chat"),
+    ("POST", re.compile(r"^/documents/upload$"), "ingest"),
+    ("POST", re.compile(r"^/documents/[^/]+/reindex$"), "ingest"),
+    ("DELETE", re.compile(r"^/documents/[^/]+$"), "ingest"),
+    ("POST", re.compile(r"^/eval/(run|jobs)$"), "eval"),
+]
+
+def classify(method: str, path: str) -> Optional[str]:
+    for m, pattern, cls in ROUTES:
+        if m == method and pattern.match(path):
+            return cls
+    return None
+
+def parse_class_spec(spec: str) -> Dict[str, str]:
+    out = {}
+    for part in (spec or "").split(","):
+        name, _, value = part.strip().partition("=")
+        name = name.strip().lower()
+        if not name:
+            continue
+        if name not in CLASSES:
+            raise ValueError(f"unknown admission class {name!r}, expected one of {CLASSES}")
+        out[name] = value.strip()
+    return out
+
+def parse_rates(spec: str) -> Dict[str, Tuple[float, float]]:
+    out = {}
+    for name, value in parse_class_spec(spec).items():
+        rate, _, burst = value.partition(":")
+        out[name] = (float(rate), float(burst or rate))
+    return out
+
+class Rejected(Exception):
+    def __init__(self, status: int, detail: str, retry_after: float):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+        self.retry_after = max(1, int(math.ceil(retry_after)))
+
+class RateLimiter:
+    def __init__(self, rates: Dict[str, Tuple[float, float]], max_clients: int = 10000):
+        self.rates = rates
+        self.max_clients = max_clients
+        self._buckets: "OrderedDict[Tuple[str, str], List[float]]" = OrderedDict()
+
+    def check(self, client: str, cls: str) -> float:
+        rate, burst = self.rates.get(cls, (0.0, 0.0))
+        if rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        key = (client, cls)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = [burst, now]
+            self._buckets[key] = bucket
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+        if bucket[0] >= 1.0:
+            bucket[0] -= 1.0
+            return 0.0
+        return (1.0 - bucket[0]) / rate
+
+    def clients(self) -> int:
+        return len({c for c, _ in self._buckets})
+
+class ClassPool:
+    def __init__(self, name: str, priority: int, limit: int, max_queue: int):
+        self.name = name
+        self.priority = priority
+        self.limit = max(1, limit)
+        self.max_queue = max(0, max_queue)
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.shed = 0
+        self.rate_limited = 0
+        self.timed_out = 0
+        self.latency = LatencyHistogram()
+        self.queue_wait = LatencyHistogram()
+
+class AdmissionController:
+    def __init__(
+        self,
+        max_active: int = 16,
+        limits: Optional[Dict[str, int]] = None,
+        queues: Optional[Dict[str, int]] = None,
+        rates: Optional[Dict[str, Tuple[float, float]]] = None,
+        queue_timeout_s: float = 30.0,
+        enabled: bool = True,
+    ):
+        limits = limits or {}
+        queues = queues or {}
+        self.enabled = enabled
+        self.max_active = max(1, max_active)
+        self.queue_timeout_s = max(0.1, queue_timeout_s)
+        self.pools = {
+            name: ClassPool(name, prio, limits.get(name, self.max_active), queues.get(name, 16))
+            for prio, name in enumerate(CLASSES)
+        }
+        self.limiter = RateLimiter(rates or {})
+        self.active = 0
+        self._waiters: List[List[Any]] = []
+        self._seq = 0
+
+    def _can_run(self, pool: ClassPool) -> bool:
+        return pool.active < pool.limit and self.active < self.max_active
+
+    def _grant(self, pool: ClassPool):
+        pool.active += 1
+        pool.admitted += 1
+        self.active += 1
+
+    def _retry_after(self, pool: ClassPool) -> float:
+        mean_s = (pool.latency.total / pool.latency.count / 1000.0) if pool.latency.count else 1.0
+        return mean_s * (pool.waiting + 1) / pool.limit
+
+    async def acquire(self, cls: str, client: str):
+        pool = self.pools[cls]
+        wait = self.limiter.check(client, cls)
+        if wait > 0:
+            pool.rate_limited += 1
+            raise Rejected(429, f"rate limit exceeded for {cls}", wait)
+        if self._can_run(pool) and not any(w[0] <= pool.priority for w in self._waiters):
+            self._grant(pool)
+            pool.queue_wait.observe(0.0)
+            return
+        if pool.waiting >= pool.max_queue:
+            pool.shed += 1
+            raise Rejected(503, f"{cls} queue is full ({pool.waiting} waiting)", self._retry_after(pool))
+
+        self._seq += 1
+        fut = asyncio.get_running_loop().create_future()
+        entry = [pool.priority, self._seq, cls, fut]
+        self._waiters.append(entry)
+        pool.waiting += 1
+        t0 = time.perf_counter()
+        try:
+            await asyncio.wait_for(fut, self.queue_timeout_s)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if entry in self._waiters:
+                self._waiters.remove(entry)
+                pool.waiting -= 1
+            elif fut.done() and not fut.cancelled():
+                self.release(cls)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            pool.timed_out += 1
+            raise Rejected(503, f"timed out waiting for a {cls} slot", self._retry_after(pool))
+        pool.queue_wait.observe((time.perf_counter() - t0) * 1000.0)
+
+    def release(self, cls: str, elapsed_ms: Optional[float] = None):
+        pool = self.pools[cls]
+        pool.active -= 1
+        self.active -= 1
+        if elapsed_ms is not None:
+            pool.latency.observe(elapsed_ms)
+        self._dispatch()
+
+    def _dispatch(self):
+        if not self._waiters:
+            return
+        self._waiters.sort(key=lambda w: (w[0], w[1]))
+        keep = []
+        for entry in self._waiters:
+            pool = self.pools[entry[2]]
+            fut = entry[3]
+            if fut.done():
+                pool.waiting -= 1
+                continue
+            if self._can_run(pool):
+                pool.waiting -= 1
+                self._grant(pool)
+                fut.set_result(None)
+                continue
+            keep.append(entry)
+        self._waiters = keep
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "active": self.active,
+            "max_active": self.max_active,
+            "clients": self.limiter.clients(),
+            "classes": {
+                name: {
+                    "priority": p.priority,
+                    "limit": p.limit,
+                    "active": p.active,
+                    "queue_depth": p.waiting,
+                    "max_queue": p.max_queue,
+                    "admitted": p.admitted,
+                    "shed": p.shed,
+                    "rate_limited": p.rate_limited,
+                    "timed_out": p.timed_out,
+                    "latency": p.latency.snapshot(),
+                    "queue_wait": p.queue_wait.snapshot(),
+                }
+                for name, p in self.pools.items()
+            },
+        }
+
+def parse_keys(spec: str) -> FrozenSet[str]:
+    return frozenset(k.strip() for k in (spec or "").split(",") if k.strip())
+
+def client_key(scope: Dict[str, Any], api_keys: FrozenSet[str] = frozenset()) -> str:
+    if api_keys:
+        for name, value in scope.get("headers") or []:
+            if name in (b"x-api-key", b"x-client-id") and value.decode("latin-1") in api_keys:
+                return "key:" + value.decode("latin-1")
+    client = scope.get("client")
+    return "ip:" + (client[0] if client else "unknown")
+
+class AdmissionMiddleware:
+    def __init__(self, app, controller: AdmissionController, api_keys: FrozenSet[str] = frozenset()):
+        self.app = app
+        self.controller = controller
+        self.api_keys = api_keys
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.controller.enabled:
+            return await self.app(scope, receive, send)
+        cls = classify(scope["method"], scope["path"])
+        if cls is None:
+            return await self.app(scope, receive, send)
+        try:
+            await self.controller.acquire(cls, client_key(scope, self.api_keys))
+        except Rejected as e:
+            body = json.dumps({"detail": e.detail}).encode("utf-8")
+            await send({
+                "type": "http.response.start",
+                "status": e.status,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"retry-after", str(e.retry_after).encode()),
+                ],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(cls, (time.perf_counter() - t0) * 1000.0)
@@ -5,15 +5,86 @@ class Settings(BaseSettings):
 
     data_dir: str = "./data"
     db_path: str = "./data/second_brain.db"
+    blob_zstd_level: int = 10
 
     embed_model: str = "sentence-transformers/all-MiniLM-L6-v2"
+    embed_backend: str = "torch"
+    embed_workers: int = 0
+    embed_threads: int = 0
+    onnx_model_dir: str = "./data/onnx"
+    onnx_quantized: bool = False
     top_k: int = 8
     hybrid_alpha: float = 0.65
     max_context_chars: int = 14000
+    max_context_tokens: int = 3000
+    context_tokenizer: str = ""
+    llm_tokenizers: str = ""
+    llm_context_tokens: str = ""
+    context_dedup_threshold: float = 0.92
+    map_reduce_max_batches: int = 8
+    map_reduce_concurrency: int = 4
+
+    embed_cache_size: int = 4096
+    result_cache_size: int = 1024
+    rerank_cache_size: int = 20000
+    query_log_enabled: bool = True
+    query_log_batch: int = 64
+    query_log_flush_s: float = 2.0
+    query_log_max_rows: int = 200000
+    prewarm_top_n: int = 50
+    prewarm_window_h: float = 72.0
+
+    index_mmap: bool = True
+    index_type: str = "flat"
+    index_reduction: str = ""
+    index_target_dim: int = 0
+    keyword_backend: str = "bm25"
+    embed_batch_size: int = 256
+    chunk_size: int = 900
+    chunk_overlap: int = 120
+    chunk_max_tokens: int = 256
+    quant_train_size: int = 20000
+    binary_rescore_mult: int = 10
+    preload_models: bool = True
+    rerank_model: str = ""
+
+    admission_enabled: bool = True
+    admission_max_active: int = 16
+    admission_limits: str = "search=16,chat=4,ingest=2,eval=1"
+    admission_queue: str = "search=64,chat=16,ingest=32,eval=4"
+    admission_queue_timeout_s: float = 30.0
+    rate_limits: str = "search=20:40,chat=2:10,ingest=20:100,eval=0.2:2"
+    api_keys: str = ""
+
+    serve_role: str = "all"
+    writer_url: str = ""
+    snapshot_poll_s: float = 1.0
+    snapshot_keep: int = 3
+    max_resident_collections: int = 8
+
+    num_shards: int = 1
+    shard_addresses: str = ""
+    shard_processes: bool = False
+    shard_base_port: int = 7100
+    shard_authkey: str = ""
+
+    sync_dir: str = ""
+    sync_collection: str = "default"
+    sync_debounce_s: float = 2.0
+    sync_poll_s: float = 30.0
+    sync_reconcile_s: float = 600.0
+    sync_use_inotify: bool = True
 
     llm_provider: str = ""
+    llm_fallbacks: str = ""
+    llm_timeout_s: float = 60.0
+    llm_hedge_percentile: float = 0.95
+    llm_hedge_min_samples: int = 20
+    llm_hedge_default_ms: float = 8000.0
+    llm_hedge_floor_ms: float = 250.0
     openai_api_key: str = ""
     openai_model: str = "gpt-4o-mini"
+    openai_base_url: str = "https://api.openai.com/v1"
 
     ollama_base_url: str = "http://localhost:11434"
     ollama_model: str = "llama3.1"
@@ -29,12 +29,135 @@ SCHEMA = [
     )""",
     """CREATE INDEX IF NOT EXISTS idx_chunks_doc_id ON chunks(doc_id)""",
     """CREATE INDEX IF NOT EXISTS idx_chunks_sha ON chunks(sha256)""",
+    """CREATE INDEX IF NOT EXISTS idx_documents_sha ON documents(sha256)""",
+    """CREATE TABLE IF NOT EXISTS document_aliases (
+        doc_id TEXT NOT NULL,
+        original_name TEXT NOT NULL,
+        created_at TEXT NOT NULL,
+        PRIMARY KEY(doc_id, original_name),
+        FOREIGN KEY(doc_id) REFERENCES documents(id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS library_stats (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        doc_count INTEGER NOT NULL,
+        total_bytes INTEGER NOT NULL,
+        chunk_count INTEGER NOT NULL,
+        version INTEGER NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS collections (
+        name TEXT PRIMARY KEY,
+        doc_count INTEGER NOT NULL DEFAULT 0,
+        total_bytes INTEGER NOT NULL DEFAULT 0,
+        chunk_count INTEGER NOT NULL DEFAULT 0,
+        created_at TEXT NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS eval_jobs (
+        id TEXT PRIMARY KEY,
+        status TEXT NOT NULL,
+        total INTEGER NOT NULL,
+        done INTEGER NOT NULL,
+        request TEXT NOT NULL,
+        result TEXT,
+        error TEXT,
+        created_at TEXT NOT NULL,
+        finished_at TEXT
+    )""",
+    """CREATE TABLE IF NOT EXISTS sync_files (
+        path TEXT PRIMARY KEY,
+        mtime_ns INTEGER NOT NULL,
+        size INTEGER NOT NULL,
+        sha256 TEXT NOT NULL,
+        doc_id TEXT,
+        owned INTEGER NOT NULL DEFAULT 0,
+        error TEXT,
+        synced_at TEXT NOT NULL
+    )""",
+    """CREATE INDEX IF NOT EXISTS idx_sync_files_doc ON sync_files(doc_id)""",
+    """CREATE TABLE IF NOT EXISTS query_log (
+        id INTEGER PRIMARY KEY,
+        ts REAL NOT NULL,
+        kind TEXT NOT NULL,
+        collection TEXT NOT NULL,
+        query TEXT NOT NULL,
+        top_k INTEGER NOT NULL,
+        params TEXT NOT NULL,
+        latency TEXT NOT NULL,
+        chunk_ids TEXT NOT NULL,
+        generation INTEGER NOT NULL
+    )""",
+    """CREATE INDEX IF NOT EXISTS idx_query_log_collection ON query_log(collection, ts)""",
+    """CREATE TABLE IF NOT EXISTS terms (
+        id INTEGER PRIMARY KEY,
+        term TEXT NOT NULL UNIQUE
+    )""",
+]
+
+MIGRATIONS = [
+    ("documents", "chunk_count", "ALTER TABLE documents ADD COLUMN chunk_count INTEGER NOT NULL DEFAULT 0",
+     "UPDATE documents SET chunk_count = (SELECT COUNT(1) FROM chunks c WHERE c.doc_id = documents.id)"),
+    ("documents", "collection", "ALTER TABLE documents ADD COLUMN collection TEXT NOT NULL DEFAULT 'default'", None),
+    ("chunks", "collection", "ALTER TABLE chunks ADD COLUMN collection TEXT NOT NULL DEFAULT 'default'", None),
+    ("eval_jobs", "owner", "ALTER TABLE eval_jobs ADD COLUMN owner INTEGER", None),
+    ("chunks", "term_ids", "ALTER TABLE chunks ADD COLUMN term_ids BLOB", None),
+    ("chunks", "token_count", "ALTER TABLE chunks ADD COLUMN token_count INTEGER", None),
+]
+
+POST_MIGRATION = [
+    """CREATE INDEX IF NOT EXISTS idx_documents_created ON documents(created_at, id)""",
+    """CREATE INDEX IF NOT EXISTS idx_documents_name ON documents(original_name, id)""",
+    """CREATE INDEX IF NOT EXISTS idx_documents_bytes ON documents(bytes, id)""",
+    """CREATE INDEX IF NOT EXISTS idx_documents_chunk_count ON documents(chunk_count, id)""",
+    """DROP INDEX IF EXISTS idx_documents_collection""",
+    """CREATE UNIQUE INDEX IF NOT EXISTS idx_documents_collection_sha ON documents(collection, sha256)""",
+    """CREATE INDEX IF NOT EXISTS idx_documents_collection_created ON documents(collection, created_at, id)""",
+    """CREATE INDEX IF NOT EXISTS idx_documents_collection_name ON documents(collection, original_name, id)""",
+    """CREATE INDEX IF NOT EXISTS idx_documents_collection_bytes ON documents(collection, bytes, id)""",
+    """CREATE INDEX IF NOT EXISTS idx_documents_collection_chunk_count ON documents(collection, chunk_count, id)""",
+    """CREATE INDEX IF NOT EXISTS idx_chunks_collection ON chunks(collection, created_at)""",
+    """INSERT OR IGNORE INTO collections (name, doc_count, total_bytes, chunk_count, created_at)
+       SELECT collection, COUNT(1), COALESCE(SUM(bytes), 0), COALESCE(SUM(chunk_count), 0), MIN(created_at)
+       FROM documents WHERE NOT EXISTS (SELECT 1 FROM collections) GROUP BY collection""",
+    """INSERT OR IGNORE INTO library_stats (id, doc_count, total_bytes, chunk_count, version)
+       SELECT 1, COUNT(1), COALESCE(SUM(bytes), 0), COALESCE(SUM(chunk_count), 0), 1 FROM documents""",
+]
+
+DEDUP_DOCUMENTS = [
+    """CREATE TEMP TABLE dup_docs AS
+       SELECT d.id AS id, k.id AS keep_id, d.original_name AS original_name, d.created_at AS created_at
+       FROM documents d
+       JOIN (SELECT collection, sha256, MIN(rowid) AS keep_rowid FROM documents
+             GROUP BY collection, sha256 HAVING COUNT(1) > 1) g
+         ON g.collection = d.collection AND g.sha256 = d.sha256
+       JOIN documents k ON k.rowid = g.keep_rowid
+       WHERE d.rowid != g.keep_rowid""",
+    """INSERT OR IGNORE INTO document_aliases (doc_id, original_name, created_at)
+       SELECT x.keep_id, x.original_name, x.created_at FROM dup_docs x
+       WHERE x.original_name != (SELECT original_name FROM documents WHERE id = x.keep_id)""",
+    """INSERT OR IGNORE INTO document_aliases (doc_id, original_name, created_at)
+       SELECT x.keep_id, a.original_name, a.created_at FROM document_aliases a JOIN dup_docs x ON a.doc_id = x.id""",
+    """DELETE FROM document_aliases WHERE doc_id IN (SELECT id FROM dup_docs)""",
+    """UPDATE sync_files SET doc_id = (SELECT keep_id FROM dup_docs WHERE id = sync_files.doc_id)
+       WHERE doc_id IN (SELECT id FROM dup_docs)""",
+    """DELETE FROM chunks WHERE doc_id IN (SELECT id FROM dup_docs)""",
+    """DELETE FROM documents WHERE id IN (SELECT id FROM dup_docs)""",
+    """UPDATE collections SET
+         doc_count = (SELECT COUNT(1) FROM documents d WHERE d.collection = collections.name),
+         total_bytes = (SELECT COALESCE(SUM(bytes), 0) FROM documents d WHERE d.collection = collections.name),
+         chunk_count = (SELECT COALESCE(SUM(chunk_count), 0) FROM documents d WHERE d.collection = collections.name)""",
+    """UPDATE library_stats SET
+         doc_count = (SELECT COUNT(1) FROM documents),
+         total_bytes = (SELECT COALESCE(SUM(bytes), 0) FROM documents),
+         chunk_count = (SELECT COALESCE(SUM(chunk_count), 0) FROM documents),
+         version = version + 1""",
+    """DROP TABLE dup_docs""",
 ]
 
 def _connect():
     os.makedirs(os.path.dirname(settings.db_path), exist_ok=True)
-    conn = sqlite3.connect(settings.db_path, check_same_thread=False)
+    conn = sqlite3.connect(settings.db_path, check_same_thread=False, timeout=30.0)
     conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
     return conn
 
 _conn = None
@@ -50,6 +173,17 @@ def init_db(conn: sqlite3.Connection):
     cur = conn.cursor()
     for stmt in SCHEMA:
         cur.execute(stmt)
+    for table, column, ddl, backfill in MIGRATIONS:
+        cols = {r[1] for r in cur.execute(f"PRAGMA table_info({table})").fetchall()}
+        if column not in cols:
+            cur.execute(ddl)
+            if backfill:
+                cur.execute(backfill)
+    if cur.execute("SELECT 1 FROM documents GROUP BY collection, sha256 HAVING COUNT(1) > 1 LIMIT 1").fetchone():
+        for stmt in DEDUP_DOCUMENTS:
+            cur.execute(stmt)
+    for stmt in POST_MIGRATION:
+        cur.execute(stmt)
     conn.commit()
 
 def execute(stmt: str, params: Iterable[Any] = ()):
@@ -0,0 +1,85 @@
+import math
+from typing import List, Set, Dict, Any
+
+def dedup_ranked(ids: List[str]) -> List[str]:
+    seen = set()
+    out = []
+    for x in ids:
+        if x in seen:
+            continue
+        seen.add(x)
+        out.append(x)
+    return out
+
+def reciprocal_rank(ranked: List[str], relevant: Set[str]) -> float:
+    for i, x in enumerate(ranked, start=1):
+        if x in relevant:
+            return 1.0 / i
+    return 0.0
+
+def ndcg_at_k(ranked: List[str], relevant: Set[str], k: int) -> float:
+    if not relevant:
+        return 0.0
+    dcg = 0.0
+    for i, x in enumerate(ranked[:k], start=1):
+        if x in relevant:
+            dcg += 1.0 / math.log2(i + 1)
+    ideal = sum(1.0 / math.log2(i + 1) for i in range(1, min(len(relevant), k) + 1))
+    if ideal <= 0.0:
+        return 0.0
+    return dcg / ideal
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    xs = sorted(values)
+    rank = max(1, int(math.ceil(p / 100.0 * len(xs))))
+    return float(xs[min(rank, len(xs)) - 1])
+
+def latency_summary(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {"mean": 0.0, "p50": 0.0, "p90": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    return {
+        "mean": float(sum(values) / len(values)),
+        "p50": percentile(values, 50),
+        "p90": percentile(values, 90),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": float(max(values)),
+    }
+
+def score_item(item: Dict[str, Any], hits: List[Dict[str, Any]], top_k: int) -> Dict[str, Any]:
+    exp_docs = set(item.get("expected_doc_ids") or [])
+    exp_chunks = set(item.get("expected_chunk_ids") or [])
+    got_docs = [h["doc_id"] for h in hits]
+    got_chunks = [h["chunk_id"] for h in hits]
+    got_docs_set = set(got_docs)
+    got_chunks_set = set(got_chunks)
+    denom = max(1, top_k)
+
+    if exp_chunks:
+        correct = len(exp_chunks & got_chunks_set)
+        prec = correct / denom
+        rec_chunks = correct / max(1, len(exp_chunks))
+        ranked, relevant = got_chunks, exp_chunks
+    else:
+        correct = len(exp_docs & got_docs_set)
+        prec = correct / denom
+        rec_chunks = 0.0
+        ranked, relevant = dedup_ranked(got_docs), exp_docs
+
+    if exp_docs:
+        rec_docs = len(exp_docs & got_docs_set) / max(1, len(exp_docs))
+    else:
+        rec_docs = 0.0
+
+    return {
+        "question": item["question"],
+        "precision_at_k": prec,
+        "recall_at_k_docs": rec_docs,
+        "recall_at_k_chunks": rec_chunks,
+        "mrr": reciprocal_rank(ranked, relevant),
+        "ndcg_at_k": ndcg_at_k(ranked, relevant, top_k),
+        "top_docs": got_docs[:min(5, len(got_docs))],
+        "top_chunks": got_chunks[:min(5, len(got_chunks))]
+    }
@@ -0,0 +1,165 @@
+import os
+import json
+import time
+import uuid
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional
+
+from ..db import execute, executemany, fetchone, fetchall
+from ..retrieval.service import RetrievalService, SearchParams
+from ..retrieval.collection import DEFAULT_COLLECTION
+from .metrics import score_item, latency_summary
+
+METRIC_KEYS = ["precision_at_k", "recall_at_k_docs", "recall_at_k_chunks", "mrr", "ndcg_at_k"]
+
+def _now() -> str:
+    return datetime.datetime.utcnow().isoformat() + "Z"
+
+def params_from_config(cfg: Optional[Dict[str, Any]]) -> SearchParams:
+    if not cfg:
+        return SearchParams(use_cache=False)
+    return SearchParams(
+        hybrid_alpha=cfg.get("hybrid_alpha"),
+        candidate_mult=int(cfg.get("candidate_mult") or 4),
+        rerank=bool(cfg.get("rerank", True)),
+        collection=cfg.get("collection") or DEFAULT_COLLECTION,
+        rescore_mult=cfg.get("rescore_mult"),
+        use_cache=False,
+    )
+
+def _alive(pid: Optional[int]) -> bool:
+    if not pid:
+        return False
+    if pid == os.getpid():
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+class _Accumulator:
+    def __init__(self, name: str):
+        self.name = name
+        self.per: List[Dict[str, Any]] = []
+        self.batches: List[float] = []
+        self.batch_size = 0
+
+    def add_batch(self, items: List[Dict[str, Any]], hits: List[List[Dict[str, Any]]], top_k: int, elapsed_ms: float):
+        for it, h in zip(items, hits):
+            self.per.append(score_item(it, h, top_k))
+        self.batches.append(elapsed_ms)
+        self.batch_size = max(self.batch_size, len(items))
+
+    def result(self, top_k: int) -> Dict[str, Any]:
+        n = max(1, len(self.per))
+        out = {"name": self.name, "top_k": top_k, "count": len(self.per), "batch_size": self.batch_size}
+        for k in METRIC_KEYS:
+            out[k] = sum(p[k] for p in self.per) / n
+        total_s = sum(self.batches) / 1000.0
+        out["batch_ms"] = latency_summary(self.batches)
+        out["qps"] = len(self.per) / total_s if total_s > 0 else 0.0
+        if self.batch_size == 1:
+            out["latency_ms"] = out["batch_ms"]
+        out["per_item"] = self.per
+        return out
+
+class EvalRunner:
+    def __init__(self, retrieval: RetrievalService):
+        self.retrieval = retrieval
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="eval")
+        self.recover()
+
+    def recover(self) -> int:
+        rows = fetchall("SELECT id, owner FROM eval_jobs WHERE status IN ('queued', 'running')")
+        dead = [r["id"] for r in rows if not _alive(r["owner"])]
+        if dead:
+            executemany(
+                "UPDATE eval_jobs SET status = 'failed', error = ?, finished_at = ? WHERE id = ?",
+                [("interrupted: the worker running this job exited", _now(), job_id) for job_id in dead]
+            )
+        return len(dead)
+
+    def run(
+        self,
+        items: List[Dict[str, Any]],
+        top_k: int,
+        batch_size: int = 32,
+        config: Optional[Dict[str, Any]] = None,
+        compare_with: Optional[Dict[str, Any]] = None,
+        progress=None,
+    ) -> Dict[str, Any]:
+        configs = [("a", config)]
+        if compare_with is not None:
+            configs.append(("b", compare_with))
+        accs = [_Accumulator((cfg or {}).get("name") or name) for name, cfg in configs]
+        params = [params_from_config(cfg) for _, cfg in configs]
+        batch_size = max(1, batch_size)
+
+        for start in range(0, len(items), batch_size):
+            batch = items[start:start + batch_size]
+            queries = [it["question"] for it in batch]
+            for acc, p in zip(accs, params):
+                t0 = time.perf_counter()
+                hits = self.retrieval.search_batch(queries, top_k, p)
+                acc.add_batch(batch, hits, top_k, (time.perf_counter() - t0) * 1000.0)
+            if progress is not None:
+                progress(min(len(items), start + batch_size), len(items))
+
+        results = [acc.result(top_k) for acc in accs]
+        if len(results) == 1:
+            return results[0]
+        a, b = results
+        delta = {k: b[k] - a[k] for k in METRIC_KEYS}
+        delta["batch_ms_p95"] = b["batch_ms"]["p95"] - a["batch_ms"]["p95"]
+        delta["qps"] = b["qps"] - a["qps"]
+        return {"top_k": top_k, "count": len(items), "a": a, "b": b, "delta": delta}
+
+    def submit(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        job_id = str(uuid.uuid4())
+        execute(
+            """INSERT INTO eval_jobs (id, status, total, done, request, result, error, created_at, finished_at, owner)
+               VALUES (?, 'queued', ?, 0, ?, NULL, NULL, ?, NULL, ?)""",
+            (job_id, len(request.get("items") or []), json.dumps(request, ensure_ascii=False), _now(), os.getpid())
+        )
+        self._pool.submit(self._run_job, job_id, request)
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = fetchone(
+            "SELECT id, status, total, done, result, error, created_at, finished_at FROM eval_jobs WHERE id = ?",
+            (job_id,)
+        )
+        if row is None:
+            return None
+        out = dict(row)
+        out["result"] = json.loads(out["result"]) if out["result"] else None
+        return out
+
+    def _run_job(self, job_id: str, request: Dict[str, Any]):
+        execute("UPDATE eval_jobs SET status = 'running' WHERE id = ?", (job_id,))
+
+        def progress(done: int, total: int):
+            execute("UPDATE eval_jobs SET done = ? WHERE id = ?", (done, job_id))
+
+        try:
+            res = self.run(
+                request["items"],
+                int(request.get("top_k") or 8),
+                int(request.get("batch_size") or 32),
+                request.get("config"),
+                request.get("compare_with"),
+                progress=progress,
+            )
+            execute(
+                "UPDATE eval_jobs SET status = 'done', result = ?, finished_at = ? WHERE id = ?",
+                (json.dumps(res, ensure_ascii=False), _now(), job_id)
+            )
+        except Exception as e:
+            execute(
+                "UPDATE eval_jobs SET status = 'failed', error = ?, finished_at = ? WHERE id = ?",
+                (str(e), _now(), job_id)
+            )
@@ -0,0 +1,167 @@
+import os
+import io
+import struct
+from typing import Iterable, Iterator, List, Tuple, Optional
+
+try:
+    import zstandard
+except Exception:
+    zstandard = None
+
+MAGIC = b"SBB1"
+_footer = struct.Struct("<4sBIIQ")
+_entry = struct.Struct("<QIQI")
+
+CODEC_NONE = 0
+CODEC_ZSTD = 1
+
+class BlobStore:
+    def __init__(self, root: str, frame_size: int = 1 << 20, level: int = 10):
+        self.root = root
+        self.frame_size = frame_size
+        self.level = level
+
+    def path(self, digest: str, kind: str = "raw") -> str:
+        return os.path.join(self.root, digest[:2], f"{digest}.{kind}.sbb")
+
+    def exists(self, digest: str, kind: str = "raw") -> bool:
+        return os.path.exists(self.path(digest, kind))
+
+    def put(self, digest: str, content: bytes) -> str:
+        frames = (content[i:i + self.frame_size] for i in range(0, len(content), self.frame_size))
+        return self.put_frames(digest, frames, kind="raw")
+
+    def put_pages(self, digest: str, pages: Iterable[str]) -> str:
+        return self.put_frames(digest, (p.encode("utf-8") for p in pages), kind="pages")
+
+    def put_frames(self, digest: str, frames: Iterable[bytes], kind: str) -> str:
+        path = self.path(digest, kind)
+        if os.path.exists(path):
+            return path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        codec = CODEC_ZSTD if zstandard is not None else CODEC_NONE
+        cctx = zstandard.ZstdCompressor(level=self.level) if codec == CODEC_ZSTD else None
+        entries: List[Tuple[int, int, int, int]] = []
+        tmp = path + ".tmp"
+        raw_off = 0
+        with open(tmp, "wb") as f:
+            for frame in frames:
+                data = cctx.compress(frame) if cctx is not None else frame
+                entries.append((f.tell(), len(data), raw_off, len(frame)))
+                f.write(data)
+                raw_off += len(frame)
+            for e in entries:
+                f.write(_entry.pack(*e))
+            f.write(_footer.pack(MAGIC, codec, len(entries), self.frame_size, raw_off))
+        os.replace(tmp, path)
+        return path
+
+    def delete(self, digest: str):
+        for kind in ("raw", "pages"):
+            try:
+                os.remove(self.path(digest, kind))
+            except FileNotFoundError:
+                pass
+
+    def open(self, digest: str, kind: str = "raw") -> "BlobReader":
+        return BlobReader(self.path(digest, kind))
+
+    def read(self, digest: str) -> bytes:
+        with self.open(digest) as r:
+            return r.read()
+
+    def page_count(self, digest: str) -> int:
+        with self.open(digest, "pages") as r:
+            return len(r.entries)
+
+    def read_page(self, digest: str, page_no: int) -> str:
+        with self.open(digest, "pages") as r:
+            return r.frame(page_no - 1).decode("utf-8")
+
+    def iter_pages(self, digest: str, start: int = 1, end: Optional[int] = None) -> Iterator[Tuple[str, int]]:
+        with self.open(digest, "pages") as r:
+            last = len(r.entries) if end is None else min(end, len(r.entries))
+            for page_no in range(max(1, start), last + 1):
+                yield r.frame(page_no - 1).decode("utf-8"), page_no
+
+class BlobReader(io.RawIOBase):
+    def __init__(self, path: str):
+        self._f = open(path, "rb")
+        self._f.seek(-_footer.size, os.SEEK_END)
+        magic, codec, n, _, raw_size = _footer.unpack(self._f.read(_footer.size))
+        if magic != MAGIC:
+            self._f.close()
+            raise ValueError(f"not a blob file: {path}")
+        if codec == CODEC_ZSTD and zstandard is None:
+            self._f.close()
+            raise RuntimeError("zstandard is required to read compressed blobs")
+        self._f.seek(-_footer.size - n * _entry.size, os.SEEK_END)
+        table = self._f.read(n * _entry.size)
+        self.entries = [_entry.unpack_from(table, i * _entry.size) for i in range(n)]
+        self.codec = codec
+        self.size = raw_size
+        self._dctx = zstandard.ZstdDecompressor() if codec == CODEC_ZSTD else None
+        self._pos = 0
+        self._cache: Tuple[int, bytes] = (-1, b"")
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        if whence == os.SEEK_CUR:
+            offset += self._pos
+        elif whence == os.SEEK_END:
+            offset += self.size
+        self._pos = max(0, offset)
+        return self._pos
+
+    def frame(self, i: int) -> bytes:
+        if self._cache[0] == i:
+            return self._cache[1]
+        c_off, c_len, _, raw_len = self.entries[i]
+        self._f.seek(c_off)
+        data = self._f.read(c_len)
+        if self._dctx is not None:
+            data = self._dctx.decompress(data, max_output_size=raw_len)
+        self._cache = (i, data)
+        return data
+
+    def _frame_at(self, pos: int) -> int:
+        lo, hi = 0, len(self.entries) - 1
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if self.entries[mid][2] <= pos:
+                lo = mid
+            else:
+                hi = mid - 1
+        return lo
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            size = self.size - self._pos
+        end = min(self.size, self._pos + size)
+        out = []
+        while self._pos < end:
+            i = self._frame_at(self._pos)
+            _, _, raw_off, raw_len = self.entries[i]
+            data = self.frame(i)
+            take = data[self._pos - raw_off:min(raw_len, end - raw_off)]
+            out.append(take)
+            self._pos += len(take)
+        return b"".join(out)
+
+    def readinto(self, b) -> int:
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            self._f.close()
+        super().close()
@@ -0,0 +1,197 @@
+import re
+from collections import deque
+from typing import List, Dict, Any, Optional, Iterable, Iterator, Tuple
+
+from ..utils.text import normalize_text, split_normalized
+from ..retrieval.bm25 import tokenize
+from ..retrieval.vocab import Vocabulary
+from ..llm.tokens import Tokenizer
+
+try:
+    from rapidfuzz.fuzz import ratio
+except Exception:
+    ratio = None
+
+_atx = re.compile(r"^ {0,3}(#{1,6})\s+(.*?)(?:\s+#+)?\s*$")
+_setext = re.compile(r"^ {0,3}(=+|-+)\s*$")
+_fence = re.compile(r"^ {0,3}(`{3,}|~{3,})")
+
+Block = Tuple[int, str, Optional[int]]
+
+def iter_blocks(pages: Iterable[Tuple[str, Optional[int]]]) -> Iterator[Block]:
+    fence = ""
+    for text, page_no in pages:
+        para: List[str] = []
+        for line in text.splitlines():
+            if fence:
+                para.append(line)
+                if line.strip().startswith(fence):
+                    fence = ""
+                    yield 0, " ".join(para), page_no
+                    para = []
+                continue
+            m = _fence.match(line)
+            if m:
+                if para:
+                    yield 0, " ".join(para), page_no
+                fence = m.group(1)[:3]
+                para = [line]
+                continue
+            if not line.strip():
+                if para:
+                    yield 0, " ".join(para), page_no
+                    para = []
+                continue
+            m = _atx.match(line)
+            if m:
+                if para:
+                    yield 0, " ".join(para), page_no
+                    para = []
+                yield len(m.group(1)), m.group(2), page_no
+                continue
+            m = _setext.match(line)
+            if m and len(para) == 1:
+                yield (1 if m.group(1)[0] == "=" else 2), para[0], page_no
+                para = []
+                continue
+            if m and m.group(1)[0] == "-":
+                if para:
+                    yield 0, " ".join(para), page_no
+                    para = []
+                continue
+            para.append(line)
+        if para:
+            yield 0, " ".join(para), page_no
+
+def split_long(sent: str, limit: int) -> List[str]:
+    if len(sent) <= limit:
+        return [sent]
+    out: List[str] = []
+    cur: List[str] = []
+    size = 0
+    for w in sent.split(" "):
+        while len(w) > limit:
+            if cur:
+                out.append(" ".join(cur))
+                cur, size = [], 0
+            out.append(w[:limit])
+            w = w[limit:]
+        if cur and size + 1 + len(w) > limit:
+            out.append(" ".join(cur))
+            cur, size = [], 0
+        size += len(w) + (1 if cur else 0)
+        cur.append(w)
+    if cur:
+        out.append(" ".join(cur))
+    return out
+
+class _Stream:
+    def __init__(self, tokenizer: Tokenizer, chunk_size: int, overlap: int, hard_limit: int, max_tokens: int,
+                 dedup_threshold: float):
+        self.tokenizer = tokenizer
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+        self.hard_limit = hard_limit
+        self.max_tokens = max_tokens
+        self.threshold = dedup_threshold * 100.0
+        self.out: List[Dict[str, Any]] = []
+        self.seen = set()
+        self.recent: deque = deque(maxlen=50)
+        self.buf: List[Tuple[str, int, int, List[str], Optional[int]]] = []
+        self.size = 0
+        self.tokens = 0
+        self.stack: List[Tuple[int, str]] = []
+        self.section: Optional[str] = None
+
+    def heading(self, level: int, title: str):
+        title = normalize_text(title)
+        if not title:
+            return
+        self.emit()
+        self.buf, self.size, self.tokens = [], 0, 0
+        while self.stack and self.stack[-1][0] >= level:
+            self.stack.pop()
+        self.stack.append((level, title))
+        self.section = " > ".join(t for _, t in self.stack)[:300]
+
+    def paragraph(self, text: str, page_no: Optional[int]):
+        sents = [p for s in split_normalized(normalize_text(text)) for p in split_long(s, self.hard_limit)]
+        if not sents:
+            return
+        for sent, n in self.fit(sents):
+            self.add(sent, n, page_no)
+
+    def fit(self, sents: List[str]) -> List[Tuple[str, int]]:
+        out = []
+        for sent, n in zip(sents, self.tokenizer.count_many(sents)):
+            words = sent.split(" ")
+            if not self.max_tokens or n <= self.max_tokens or len(words) < 2:
+                out.append((sent, n))
+                continue
+            step = -(-len(words) // -(-n // self.max_tokens))
+            parts = [" ".join(words[i:i + step]) for i in range(0, len(words), step)]
+            out.extend(zip(parts, self.tokenizer.count_many(parts)))
+        return out
+
+    def over(self, size: int, tokens: int) -> bool:
+        return size > self.chunk_size or bool(self.max_tokens and tokens > self.max_tokens)
+
+    def add(self, sent: str, n: int, page_no: Optional[int]):
+        sl = len(sent)
+        if self.buf and self.over(self.size + sl, self.tokens + n):
+            self.emit()
+            keep = []
+            size = tokens = 0
+            for prev in reversed(self.buf):
+                if size + prev[1] + 1 > self.overlap:
+                    break
+                keep.append(prev)
+                size += prev[1] + 1
+                tokens += prev[2]
+            if self.over(size + sl, tokens + n):
+                keep, size, tokens = [], 0, 0
+            self.buf = keep[::-1]
+            self.size, self.tokens = size, tokens
+        self.buf.append((sent, sl, n, tokenize(sent), page_no))
+        self.size += sl + 1
+        self.tokens += n
+
+    def emit(self):
+        if not self.buf:
+            return
+        text = " ".join(s[0] for s in self.buf)
+        if text in self.seen or (ratio is not None and any(ratio(text, k) >= self.threshold for k in self.recent)):
+            return
+        self.seen.add(text)
+        self.recent.append(text)
+        pages = [s[4] for s in self.buf if s[4] is not None]
+        self.out.append({
+            "text": text,
+            "page_start": min(pages) if pages else None,
+            "page_end": max(pages) if pages else None,
+            "section": self.section,
+            "terms": [t for s in self.buf for t in s[3]],
+            "token_count": sum(s[2] for s in self.buf),
+        })
+
+def chunk_pages(
+    pages: Iterable[Tuple[str, Optional[int]]],
+    tokenizer: Tokenizer,
+    vocab: Vocabulary,
+    chunk_size: int = 900,
+    overlap: int = 120,
+    hard_limit: int = 1400,
+    max_tokens: int = 0,
+    dedup_threshold: float = 0.92,
+) -> List[Dict[str, Any]]:
+    stream = _Stream(tokenizer, chunk_size, overlap, max(hard_limit, chunk_size), max_tokens, dedup_threshold)
+    for level, text, page_no in iter_blocks(pages):
+        if level:
+            stream.heading(level, text)
+        else:
+            stream.paragraph(text, page_no)
+    stream.emit()
+    ids_of = vocab.intern(t for ch in stream.out for t in ch["terms"])
+    for ch in stream.out:
+        ch["term_ids"] = [ids_of[t] for t in ch.pop("terms")]
+    return stream.out
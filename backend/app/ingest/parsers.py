@@ -1,16 +1,86 @@
-from typing import List, Tuple, Optional
+from typing import List, Tuple, Dict, Optional
 import fitz
 
 def parse_pdf(path: str) -> List[Tuple[str, int]]:
     doc = fitz.open(path)
+    return _pdf_pages(doc)
+
+def parse_pdf_bytes(content: bytes) -> List[Tuple[str, int]]:
+    doc = fitz.open(stream=content, filetype="pdf")
+    return _pdf_pages(doc)
+
+def _pdf_pages(doc) -> List[Tuple[str, int]]:
     pages = []
     for i in range(len(doc)):
         page = doc.load_page(i)
-        text = page.get_text("text")
-        pages.append((text, i + 1))
+        pages.append((_page_blocks(page), i + 1))
     doc.close()
     return pages
 
+def _join_lines(lines: List[str]) -> str:
+    out = lines[0]
+    for line in lines[1:]:
+        if out.endswith("-") and out[-2:-1].isalpha() and line[:1].islower():
+            out = out[:-1] + line
+        else:
+            out += " " + line
+    return out
+
+def _heading_level(text: str, size: float, bold: bool, body: float, nlines: int) -> int:
+    if nlines > 2 or len(text) > 120 or text[-1] in ".,;:" or not any(c.isalpha() for c in text):
+        return 0
+    r = size / body if body else 1.0
+    if r >= 1.6:
+        return 1
+    if r >= 1.3:
+        return 2
+    if r >= 1.15:
+        return 3
+    if bold and r >= 0.95:
+        return 4
+    return 0
+
+def _page_blocks(page) -> str:
+    blocks = []
+    sizes: Dict[float, int] = {}
+    for b in page.get_text("dict")["blocks"]:
+        if b.get("type") != 0:
+            continue
+        lines = []
+        top = 0.0
+        bold: Optional[bool] = None
+        for line in b["lines"]:
+            text = "".join(s["text"] for s in line["spans"]).strip()
+            if not text:
+                continue
+            lines.append(text)
+            for s in line["spans"]:
+                if not s["text"].strip():
+                    continue
+                size = round(s["size"], 1)
+                sizes[size] = sizes.get(size, 0) + len(s["text"])
+                top = max(top, size)
+                bold = (bold is not False) and bool(s["flags"] & 16)
+        if lines:
+            blocks.append((lines, top, bool(bold)))
+    if not blocks:
+        return ""
+    body = max(sizes, key=sizes.get)
+    out = []
+    for lines, top, bold in blocks:
+        text = _join_lines(lines)
+        level = _heading_level(text, top, bold, body, len(lines))
+        if level:
+            out.append("#" * level + " " + text)
+        elif text[:1] in "#`~=-":
+            out.append("    " + text)
+        else:
+            out.append(text)
+    return "\n\n".join(out)
+
 def parse_text(path: str) -> str:
     with open(path, "r", encoding="utf-8", errors="ignore") as f:
         return f.read()
+
+def decode_text(content: bytes) -> str:
+    return content.decode("utf-8", errors="ignore")
@@ -0,0 +1,226 @@
+import re
+from typing import List, Dict, Any, Tuple
+
+from ..utils.text import split_normalized, normalize_text
+from .tokens import Tokenizer
+
+def naive_context(hits: List[Dict[str, Any]]) -> str:
+    lines = []
+    for i, h in enumerate(hits, start=1):
+        header = f"[{i}] doc={h['original_name']} chunk={h['chunk_index']}"
+        if h.get("page_start"):
+            header += f" pages={h['page_start']}-{h.get('page_end') or h['page_start']}"
+        lines.append(header)
+        lines.append(h["text"].strip())
+        lines.append("")
+    return "\n".join(lines).strip()
+
+def merge_adjacent(hits: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    by_doc: Dict[str, List[Tuple[int, Dict[str, Any]]]] = {}
+    seen = set()
+    for rank, h in enumerate(hits):
+        if h["chunk_id"] in seen:
+            continue
+        seen.add(h["chunk_id"])
+        by_doc.setdefault(h["doc_id"], []).append((rank, h))
+
+    blocks = []
+    for doc_hits in by_doc.values():
+        doc_hits.sort(key=lambda x: x[1]["chunk_index"])
+        cur = None
+        for rank, h in doc_hits:
+            if cur is not None and h["chunk_index"] <= cur["chunk_end"] + 1:
+                cur["chunk_end"] = max(cur["chunk_end"], h["chunk_index"])
+                cur["rank"] = min(cur["rank"], rank)
+                cur["texts"].append(h["text"])
+                cur["chunk_ids"].append(h["chunk_id"])
+                cur["members"] += 1
+                if h.get("page_end"):
+                    cur["page_end"] = max(cur["page_end"] or 0, h["page_end"])
+                continue
+            cur = {
+                "original_name": h["original_name"],
+                "chunk_start": h["chunk_index"],
+                "chunk_end": h["chunk_index"],
+                "page_start": h.get("page_start"),
+                "page_end": h.get("page_end") or h.get("page_start"),
+                "rank": rank,
+                "texts": [h["text"]],
+                "chunk_ids": [h["chunk_id"]],
+                "members": 1,
+            }
+            blocks.append(cur)
+    blocks.sort(key=lambda b: b["rank"])
+    return blocks
+
+def _header(i: int, b: Dict[str, Any]) -> str:
+    if b["chunk_start"] == b["chunk_end"]:
+        header = f"[{i}] doc={b['original_name']} chunk={b['chunk_start']}"
+    else:
+        header = f"[{i}] doc={b['original_name']} chunks={b['chunk_start']}-{b['chunk_end']}"
+    if b.get("page_start"):
+        header += f" pages={b['page_start']}-{b.get('page_end') or b['page_start']}"
+    return header
+
+def _source(hit: Dict[str, Any], b: Dict[str, Any], text: str) -> Dict[str, Any]:
+    out = dict(hit)
+    out.update({
+        "chunk_index": b["chunk_start"],
+        "chunk_end": b["chunk_end"],
+        "chunk_ids": list(b["chunk_ids"]),
+        "page_start": b.get("page_start"),
+        "page_end": b.get("page_end"),
+        "text": text,
+    })
+    return out
+
+_digits = re.compile(r"\d+")
+
+class _SentenceFilter:
+    def __init__(self, threshold: float):
+        self.threshold = threshold * 100.0
+        self.exact = set()
+        self.kept: Dict[Tuple[str, ...], List[str]] = {}
+        try:
+            from rapidfuzz import process
+            from rapidfuzz.fuzz import ratio
+            self._match = lambda s, pool: process.extractOne(s, pool, scorer=ratio, score_cutoff=self.threshold)
+        except Exception:
+            self._match = lambda s, pool: None
+
+    def _key(self, sent: str) -> Tuple[str, Tuple[str, ...]]:
+        key = normalize_text(sent).lower()
+        return key, tuple(_digits.findall(key))
+
+    def is_dup(self, sent: str) -> bool:
+        key, sig = self._key(sent)
+        if key in self.exact:
+            return True
+        pool = self.kept.setdefault(sig, [])
+        if self.threshold < 100.0 and pool and self._match(key, pool) is not None:
+            return True
+        self.exact.add(key)
+        pool.append(key)
+        return False
+
+    def forget(self, sents: List[str]):
+        for sent in sents:
+            key, sig = self._key(sent)
+            if key in self.exact:
+                self.exact.discard(key)
+                self.kept[sig].remove(key)
+
+def pack_batches(
+    hits: List[Dict[str, Any]],
+    tokenizer: Tokenizer,
+    max_tokens: int,
+    max_chars: int = 0,
+    dedup_threshold: float = 0.9,
+    max_batches: int = 1,
+) -> Tuple[List[str], List[Dict[str, Any]], Dict[str, Any]]:
+    blocks = merge_adjacent(hits)
+    sources: List[Dict[str, Any]] = []
+    filt = _SentenceFilter(dedup_threshold)
+    max_batches = max(1, max_batches)
+    batches: List[List[str]] = [[]]
+    remaining = max(0, max_tokens)
+    chars_left = max_chars if max_chars > 0 else None
+    numbered = 0
+    dropped = truncated = skipped = 0
+
+    for b in blocks:
+        sents = []
+        for t in b["texts"]:
+            for s in split_normalized(t):
+                if filt.is_dup(s):
+                    dropped += 1
+                else:
+                    sents.append(s)
+        if not sents:
+            continue
+        counts = tokenizer.count_many(sents)
+        header = _header(numbered + 1, b)
+        while True:
+            cost = tokenizer.count(header) + 2
+            taken = []
+            used_chars = len(header) + 2
+            if cost < remaining:
+                for s, n in zip(sents, counts):
+                    n += 1
+                    if cost + n > remaining or (chars_left is not None and used_chars + len(s) + 1 > chars_left):
+                        break
+                    taken.append(s)
+                    cost += n
+                    used_chars += len(s) + 1
+            if len(taken) < len(sents) and batches[-1] and len(batches) < max_batches:
+                batches.append([])
+                remaining = max(0, max_tokens)
+                chars_left = max_chars if max_chars > 0 else None
+                continue
+            break
+        filt.forget(sents[len(taken):])
+        if not taken:
+            skipped += 1
+            continue
+        if len(taken) < len(sents):
+            truncated += 1
+        batches[-1].append(header + "\n" + " ".join(taken))
+        sources.append(_source(hits[b["rank"]], b, " ".join(taken)))
+        numbered += 1
+        remaining -= cost
+        if chars_left is not None:
+            chars_left -= used_chars
+
+    contexts = ["\n\n".join(parts) for parts in batches if parts]
+    naive_tokens = tokenizer.count(naive_context(hits))
+    prompt_tokens = sum(tokenizer.count(c) for c in contexts)
+    stats = {
+        "tokenizer": tokenizer.name,
+        "tokenizer_fallback": tokenizer.fallback,
+        "budget_tokens": max_tokens,
+        "prompt_tokens": prompt_tokens,
+        "naive_tokens": naive_tokens,
+        "saved_tokens": max(0, naive_tokens - prompt_tokens),
+        "hits": len(hits),
+        "blocks": numbered,
+        "batches": len(contexts),
+        "merged_chunks": sum(b["members"] - 1 for b in blocks),
+        "dropped_sentences": dropped,
+        "truncated_blocks": truncated,
+        "skipped_blocks": skipped,
+    }
+    return contexts, sources, stats
+
+def pack_context(
+    hits: List[Dict[str, Any]],
+    tokenizer: Tokenizer,
+    max_tokens: int,
+    max_chars: int = 0,
+    dedup_threshold: float = 0.9,
+) -> Tuple[str, List[Dict[str, Any]], Dict[str, Any]]:
+    contexts, sources, stats = pack_batches(hits, tokenizer, max_tokens, max_chars, dedup_threshold, max_batches=1)
+    return (contexts[0] if contexts else ""), sources, stats
+
+def fit_notes(notes: List[str], tokenizer: Tokenizer, max_tokens: int, max_chars: int = 0) -> Tuple[str, Dict[str, Any]]:
+    parts: List[str] = []
+    remaining = max(0, max_tokens)
+    chars_left = max_chars if max_chars > 0 else None
+    dropped = truncated = 0
+    for note in notes:
+        lines = [ln.rstrip() for ln in note.splitlines() if ln.strip()]
+        taken = []
+        for ln, n in zip(lines, tokenizer.count_many(lines)):
+            n += 1
+            if n > remaining or (chars_left is not None and len(ln) + 1 > chars_left):
+                break
+            taken.append(ln)
+            remaining -= n
+            if chars_left is not None:
+                chars_left -= len(ln) + 1
+        if not taken:
+            dropped += 1
+            continue
+        if len(taken) < len(lines):
+            truncated += 1
+        parts.append("\n".join(taken))
+    return "\n\n".join(parts), {"notes": len(notes), "dropped_notes": dropped, "truncated_notes": truncated}
@@ -0,0 +1,46 @@
+import time
+import asyncio
+from typing import List, Dict, Any, Tuple, Optional
+
+from .providers import LLM, NOTHING
+from .context import fit_notes
+from .tokens import Tokenizer
+
+def _is_empty(note: str) -> bool:
+    return not note.strip() or note.strip().strip(".").upper() in NOTHING
+
+async def map_reduce(llm: LLM, query: str, contexts: List[str], concurrency: int = 4, tokenizer: Optional[Tokenizer] = None,
+                     max_tokens: int = 0, max_chars: int = 0) -> Tuple[str, Dict[str, Any]]:
+    t0 = time.perf_counter()
+    sem = asyncio.Semaphore(max(1, concurrency))
+
+    async def summarize(ctx: str) -> Tuple[str, Dict[str, Any]]:
+        async with sem:
+            return await llm.generate_with_meta(query, ctx, task="map")
+
+    mapped = await asyncio.gather(*[summarize(c) for c in contexts])
+    map_ms = (time.perf_counter() - t0) * 1000.0
+    notes = [note.strip() for note, _ in mapped if not _is_empty(note)]
+
+    meta: Dict[str, Any] = {}
+    reduce_stats: Dict[str, Any] = {"notes": len(notes), "dropped_notes": 0, "truncated_notes": 0}
+    if notes:
+        if tokenizer is not None and max_tokens > 0:
+            joined, reduce_stats = fit_notes(notes, tokenizer, max_tokens, max_chars)
+        else:
+            joined = "\n\n".join(notes)
+        ans, meta = await llm.generate_with_meta(query, joined, task="reduce")
+    else:
+        ans = ""
+    return ans, {
+        **meta,
+        "mode": "map_reduce",
+        "reduce": reduce_stats,
+        "map": [
+            {"provider": m.get("provider"), "hedged": m.get("hedged", False), "empty": _is_empty(note),
+             "latency_ms": m.get("latency_ms")}
+            for note, m in mapped
+        ],
+        "map_ms": map_ms,
+        "latency_ms": (time.perf_counter() - t0) * 1000.0,
+    }
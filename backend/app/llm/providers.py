@@ -1,17 +1,34 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 import os
+import re
 import json
 import httpx
 
 from ..config import settings
 
+TASKS = ("answer", "map", "reduce")
+NOTHING = ("YOK", "NONE")
+
+_citation = re.compile(r"^\[(\d+)\]")
+
 class LLM:
-    async def generate(self, query: str, context: str) -> str:
+    name = "llm"
+
+    async def generate(self, query: str, context: str, task: str = "answer") -> str:
         return ""
 
+    async def generate_with_meta(self, query: str, context: str, task: str = "answer") -> Tuple[str, Dict[str, Any]]:
+        return await self.generate(query, context, task), {"provider": self.name}
+
 class ExtractiveLLM(LLM):
-    async def generate(self, query: str, context: str) -> str:
+    name = "extractive"
+
+    async def generate(self, query: str, context: str, task: str = "answer") -> str:
         lines = [x.strip() for x in context.splitlines() if x.strip()]
+        if task == "map":
+            return self._cite(lines)
+        if task == "reduce":
+            lines = [x.lstrip("- ").strip() for x in lines]
         if not lines:
             return "Kaynaklarda bu soruya dair yeterli içerik bulamadım."
         picked = []
@@ -29,20 +46,55 @@ class ExtractiveLLM(LLM):
             picked = lines[:6]
         return "\n".join(["- " + p for p in picked])
 
+    def _cite(self, lines: List[str]) -> str:
+        picked = []
+        cite = ""
+        for ln in lines:
+            m = _citation.match(ln)
+            if m:
+                cite = m.group(0)
+                continue
+            if len(ln) < 40:
+                continue
+            picked.append(f"- {ln[:400]} {cite}".rstrip())
+            if len(picked) >= 4:
+                break
+        return "\n".join(picked) or NOTHING[0]
+
 class OpenAILLM(LLM):
-    def __init__(self, api_key: str, model: str):
+    def __init__(self, api_key: str, model: str, base_url: str = "https://api.openai.com/v1", timeout: float = 60.0):
         self.api_key = api_key
         self.model = model
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.name = f"openai:{model}"
 
-    async def generate(self, query: str, context: str) -> str:
-        url = "https://api.openai.com/v1/chat/completions"
+    async def generate(self, query: str, context: str, task: str = "answer") -> str:
+        url = self.base_url + "/chat/completions"
         headers = {"Authorization": f"Bearer {self.api_key}"}
-        system = (
-            "You are a careful assistant that answers ONLY using the provided SOURCES. "
-            "If the sources do not contain the answer, say you cannot find it. "
-            "Write in Turkish. Prefer short paragraphs and bullet points."
-        )
-        user = f"SORU:\n{query}\n\nSOURCES:\n{context}\n\nCEVAP:"
+        if task == "map":
+            system = (
+                "You extract evidence from a PART of the sources for a later answer. "
+                "List only facts from SOURCES that help answer the question, as short bullet points, "
+                "each ending with the [n] number of the source it came from. "
+                "Do not answer the question. If nothing is relevant, reply with NONE. Write in Turkish."
+            )
+            user = f"SORU:\n{query}\n\nSOURCES:\n{context}\n\nNOTLAR:"
+        elif task == "reduce":
+            system = (
+                "You are a careful assistant that answers ONLY using the provided NOTES, which were extracted "
+                "from numbered sources. Keep the [n] citation numbers exactly as they appear in the notes and "
+                "never invent new ones. If the notes do not contain the answer, say you cannot find it. "
+                "Write in Turkish. Prefer short paragraphs and bullet points."
+            )
+            user = f"SORU:\n{query}\n\nNOTES:\n{context}\n\nCEVAP:"
+        else:
+            system = (
+                "You are a careful assistant that answers ONLY using the provided SOURCES. "
+                "If the sources do not contain the answer, say you cannot find it. "
+                "Write in Turkish. Prefer short paragraphs and bullet points."
+            )
+            user = f"SORU:\n{query}\n\nSOURCES:\n{context}\n\nCEVAP:"
         payload = {
             "model": self.model,
             "messages": [
@@ -51,34 +103,74 @@ class OpenAILLM(LLM):
             ],
             "temperature": 0.2
         }
-        async with httpx.AsyncClient(timeout=60.0) as client:
+        async with httpx.AsyncClient(timeout=self.timeout) as client:
             r = await client.post(url, headers=headers, json=payload)
             r.raise_for_status()
             data = r.json()
         return data["choices"][0]["message"]["content"].strip()
 
 class OllamaLLM(LLM):
-    def __init__(self, base_url: str, model: str):
+    def __init__(self, base_url: str, model: str, timeout: float = 60.0):
         self.base_url = base_url.rstrip("/")
         self.model = model
+        self.timeout = timeout
+        self.name = f"ollama:{model}"
 
-    async def generate(self, query: str, context: str) -> str:
+    async def generate(self, query: str, context: str, task: str = "answer") -> str:
         url = self.base_url + "/api/generate"
-        prompt = (
-            "Kaynaklara dayalı cevap ver. Sadece aşağıdaki SOURCES içeriğini kullan. "
-            "Eğer kaynaklarda cevap yoksa açıkça 'bulamadım' de. Türkçe yaz.\n\n"
-            f"SORU:\n{query}\n\nSOURCES:\n{context}\n\nCEVAP:"
-        )
-        async with httpx.AsyncClient(timeout=60.0) as client:
+        if task == "map":
+            prompt = (
+                "Aşağıdaki SOURCES kaynakların yalnızca bir parçası. Soruyu cevaplama; sadece soruyla ilgili "
+                "bilgileri kısa maddeler halinde çıkar ve her maddenin sonuna geldiği kaynağın [n] numarasını yaz. "
+                "İlgili bilgi yoksa sadece 'YOK' yaz. Türkçe yaz.\n\n"
+                f"SORU:\n{query}\n\nSOURCES:\n{context}\n\nNOTLAR:"
+            )
+        elif task == "reduce":
+            prompt = (
+                "Numaralı kaynaklardan çıkarılmış NOTES notlarına dayanarak cevap ver. Notlardaki [n] kaynak "
+                "numaralarını aynen koru, yeni numara uydurma. Notlarda cevap yoksa açıkça 'bulamadım' de. Türkçe yaz.\n\n"
+                f"SORU:\n{query}\n\nNOTES:\n{context}\n\nCEVAP:"
+            )
+        else:
+            prompt = (
+                "Kaynaklara dayalı cevap ver. Sadece aşağıdaki SOURCES içeriğini kullan. "
+                "Eğer kaynaklarda cevap yoksa açıkça 'bulamadım' de. Türkçe yaz.\n\n"
+                f"SORU:\n{query}\n\nSOURCES:\n{context}\n\nCEVAP:"
+            )
+        async with httpx.AsyncClient(timeout=self.timeout) as client:
             r = await client.post(url, json={"model": self.model, "prompt": prompt, "stream": False})
             r.raise_for_status()
             data = r.json()
         return (data.get("response") or "").strip()
 
+def make_provider(spec: str) -> Optional[LLM]:
+    kind, _, model = spec.strip().partition(":")
+    kind = kind.strip().lower()
+    timeout = settings.llm_timeout_s
+    if kind == "openai" and settings.openai_api_key.strip():
+        return OpenAILLM(settings.openai_api_key.strip(), model.strip() or settings.openai_model.strip() or "gpt-4o-mini",
+                         base_url=settings.openai_base_url, timeout=timeout)
+    if kind == "ollama":
+        return OllamaLLM(settings.ollama_base_url, model.strip() or settings.ollama_model, timeout=timeout)
+    if kind == "extractive":
+        return ExtractiveLLM()
+    return None
+
 def make_llm() -> LLM:
-    p = (settings.llm_provider or "").strip().lower()
-    if p == "openai" and settings.openai_api_key.strip():
-        return OpenAILLM(settings.openai_api_key.strip(), settings.openai_model.strip() or "gpt-4o-mini")
-    if p == "ollama":
-        return OllamaLLM(settings.ollama_base_url, settings.ollama_model)
-    return ExtractiveLLM()
+    from .router import RouterLLM
+    chain: List[LLM] = []
+    primary = make_provider(settings.llm_provider)
+    if primary is not None and primary.name != ExtractiveLLM.name:
+        chain.append(primary)
+        for spec in settings.llm_fallbacks.split(","):
+            llm = make_provider(spec) if spec.strip() else None
+            if llm is not None and llm.name != ExtractiveLLM.name and all(x.name != llm.name for x in chain):
+                chain.append(llm)
+    chain.append(ExtractiveLLM())
+    return RouterLLM(
+        chain,
+        hedge_percentile=settings.llm_hedge_percentile,
+        hedge_min_samples=settings.llm_hedge_min_samples,
+        hedge_default_ms=settings.llm_hedge_default_ms,
+        hedge_floor_ms=settings.llm_hedge_floor_ms,
+    )
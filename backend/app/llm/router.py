@@ -0,0 +1,152 @@
+import time
+import asyncio
+from typing import List, Dict, Any, Optional, Tuple
+
+from .providers import LLM, ExtractiveLLM
+from ..utils.histogram import LatencyHistogram
+
+def _describe(e: BaseException) -> str:
+    msg = (str(e).splitlines() or [""])[0]
+    return f"{e.__class__.__name__}: {msg}" if msg else e.__class__.__name__
+
+class ProviderStats:
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.calls = 0
+        self.errors = 0
+        self.wins = 0
+        self.hedges = 0
+        self.cancelled = 0
+        self.censored = 0
+        self.last_error: Optional[str] = None
+
+class RouterLLM(LLM):
+    name = "router"
+
+    def __init__(
+        self,
+        chain: List[LLM],
+        hedge_percentile: float = 0.95,
+        hedge_min_samples: int = 20,
+        hedge_default_ms: float = 8000.0,
+        hedge_floor_ms: float = 250.0,
+    ):
+        self.remote = [x for x in chain if not isinstance(x, ExtractiveLLM)]
+        self.fallback = next((x for x in chain if isinstance(x, ExtractiveLLM)), ExtractiveLLM())
+        self.hedge_percentile = min(max(hedge_percentile, 0.0), 1.0)
+        self.hedge_min_samples = max(1, hedge_min_samples)
+        self.hedge_default_ms = max(0.0, hedge_default_ms)
+        self.hedge_floor_ms = max(0.0, hedge_floor_ms)
+        self.stats_by_name: Dict[str, ProviderStats] = {x.name: ProviderStats() for x in self.remote + [self.fallback]}
+
+    def hedge_delay_ms(self, llm: LLM) -> Optional[float]:
+        if self.hedge_percentile <= 0.0:
+            return None
+        hist = self.stats_by_name[llm.name].latency
+        if hist.count < self.hedge_min_samples:
+            return self.hedge_default_ms or None
+        return max(self.hedge_floor_ms, hist.percentile(self.hedge_percentile))
+
+    async def _call(self, llm: LLM, query: str, context: str, task: str) -> str:
+        st = self.stats_by_name[llm.name]
+        st.calls += 1
+        t0 = time.perf_counter()
+        try:
+            out = await llm.generate(query, context, task)
+        except asyncio.CancelledError:
+            st.cancelled += 1
+            elapsed = (time.perf_counter() - t0) * 1000.0
+            delay = self.hedge_delay_ms(llm)
+            if delay is not None and elapsed >= delay:
+                st.censored += 1
+                st.latency.observe(elapsed)
+            raise
+        except Exception as e:
+            st.errors += 1
+            st.last_error = _describe(e)
+            raise
+        st.latency.observe((time.perf_counter() - t0) * 1000.0)
+        return out
+
+    async def generate(self, query: str, context: str, task: str = "answer") -> str:
+        return (await self.generate_with_meta(query, context, task))[0]
+
+    async def generate_with_meta(self, query: str, context: str, task: str = "answer") -> Tuple[str, Dict[str, Any]]:
+        t0 = time.perf_counter()
+        pending: Dict[asyncio.Task, LLM] = {}
+        attempts: List[str] = []
+        errors: List[str] = []
+        hedged = False
+        nxt = 0
+
+        def launch():
+            nonlocal nxt
+            llm = self.remote[nxt]
+            nxt += 1
+            attempts.append(llm.name)
+            pending[asyncio.ensure_future(self._call(llm, query, context, task))] = llm
+
+        def meta(provider: str) -> Dict[str, Any]:
+            return {
+                "provider": provider,
+                "attempts": attempts,
+                "hedged": hedged,
+                "errors": errors,
+                "latency_ms": (time.perf_counter() - t0) * 1000.0,
+            }
+
+        try:
+            if self.remote:
+                launch()
+            while pending:
+                timeout = None
+                if not hedged and nxt < len(self.remote) and len(pending) == 1:
+                    delay = self.hedge_delay_ms(next(iter(pending.values())))
+                    if delay is not None:
+                        timeout = delay / 1000.0
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedged = True
+                    self.stats_by_name[next(iter(pending.values())).name].hedges += 1
+                    launch()
+                    continue
+                for task in done:
+                    llm = pending.pop(task)
+                    if task.exception() is None:
+                        self.stats_by_name[llm.name].wins += 1
+                        return task.result(), meta(llm.name)
+                    errors.append(f"{llm.name}: {_describe(task.exception())}")
+                if not pending and nxt < len(self.remote):
+                    launch()
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+        attempts.append(self.fallback.name)
+        ans = await self._call(self.fallback, query, context, task)
+        self.stats_by_name[self.fallback.name].wins += 1
+        return ans, meta(self.fallback.name)
+
+    def stats(self) -> Dict[str, Any]:
+        providers = {}
+        for llm in self.remote + [self.fallback]:
+            st = self.stats_by_name[llm.name]
+            providers[llm.name] = {
+                **st.latency.snapshot(),
+                "calls": st.calls,
+                "errors": st.errors,
+                "wins": st.wins,
+                "hedges": st.hedges,
+                "cancelled": st.cancelled,
+                "censored": st.censored,
+                "last_error": st.last_error,
+                "hedge_delay_ms": self.hedge_delay_ms(llm) if llm is not self.fallback else None,
+            }
+        return {
+            "chain": [x.name for x in self.remote + [self.fallback]],
+            "hedge_percentile": self.hedge_percentile,
+            "hedge_min_samples": self.hedge_min_samples,
+            "providers": providers,
+        }
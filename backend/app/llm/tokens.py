@@ -0,0 +1,107 @@
+from typing import List, Dict, Tuple
+
+from ..config import settings
+from .router import _describe
+
+class Tokenizer:
+    name = "chars/4"
+    fallback = ""
+
+    def count(self, text: str) -> int:
+        return (len(text) + 3) // 4
+
+    def count_many(self, texts: List[str]) -> List[int]:
+        return [self.count(t) for t in texts]
+
+class TiktokenTokenizer(Tokenizer):
+    def __init__(self, model: str):
+        import tiktoken
+        try:
+            self.enc = tiktoken.encoding_for_model(model)
+        except KeyError:
+            self.enc = tiktoken.get_encoding("o200k_base")
+        self.name = f"tiktoken:{self.enc.name}"
+
+    def count(self, text: str) -> int:
+        return len(self.enc.encode_ordinary(text))
+
+    def count_many(self, texts: List[str]) -> List[int]:
+        return [len(x) for x in self.enc.encode_ordinary_batch(texts)]
+
+class HFTokenizer(Tokenizer):
+    def __init__(self, name: str):
+        from transformers import AutoTokenizer
+        self.tok = AutoTokenizer.from_pretrained(name)
+        self.tok.model_max_length = 1 << 30
+        self.name = f"hf:{name}"
+
+    def count(self, text: str) -> int:
+        return len(self.tok.encode(text, add_special_tokens=False))
+
+    def count_many(self, texts: List[str]) -> List[int]:
+        if not texts:
+            return []
+        enc = self.tok(texts, add_special_tokens=False)
+        return [len(x) for x in enc["input_ids"]]
+
+class ChainTokenizer(Tokenizer):
+    def __init__(self, parts: List[Tuple[str, Tokenizer, int]], budget: int):
+        self.budget = max(1, budget)
+        groups: Dict[Tuple[str, int], Tokenizer] = {}
+        for _, tok, limit in parts:
+            groups.setdefault((tok.name, max(1, limit)), tok)
+        self.parts = [(tok, limit) for (_, limit), tok in groups.items()]
+        self.name = "+".join(sorted({tok.name for tok, _ in self.parts}))
+        self.fallback = "; ".join(f"{p}: {tok.fallback}" for p, tok, _ in parts if tok.fallback)
+
+    def count(self, text: str) -> int:
+        return self.count_many([text])[0]
+
+    def count_many(self, texts: List[str]) -> List[int]:
+        out = [0] * len(texts)
+        for tok, limit in self.parts:
+            for i, n in enumerate(tok.count_many(texts)):
+                out[i] = max(out[i], -(-n * self.budget // limit))
+        return out
+
+def parse_spec(spec: str) -> Dict[str, str]:
+    out = {}
+    for part in (spec or "").split(","):
+        key, _, value = part.strip().partition("=")
+        if key.strip() and value.strip():
+            out[key.strip()] = value.strip()
+    return out
+
+def make_tokenizer(provider: str = "") -> Tokenizer:
+    kind, _, model = provider.partition(":")
+    name = parse_spec(settings.llm_tokenizers).get(provider) or settings.context_tokenizer.strip()
+    errors = []
+    if name:
+        try:
+            return HFTokenizer(name)
+        except Exception as e:
+            errors.append(f"hf:{name} {_describe(e)}")
+    if kind == "openai":
+        try:
+            return TiktokenTokenizer(model or "gpt-4o-mini")
+        except Exception as e:
+            errors.append(f"tiktoken {_describe(e)}")
+    out = Tokenizer()
+    if provider and not errors:
+        errors.append("no tokenizer configured")
+    out.fallback = "; ".join(errors)
+    return out
+
+def make_context_tokenizer(providers: List[str]) -> Tokenizer:
+    if not providers:
+        return make_tokenizer()
+    limits = parse_spec(settings.llm_context_tokens)
+    parts = [(p, make_tokenizer(p), int(limits.get(p) or settings.max_context_tokens)) for p in providers]
+    return ChainTokenizer(parts, settings.max_context_tokens)
+
+def make_embed_tokenizer() -> Tokenizer:
+    name = settings.onnx_model_dir if settings.embed_backend.strip().lower() == "onnx" else settings.embed_model
+    try:
+        return HFTokenizer(name)
+    except Exception:
+        return Tokenizer()
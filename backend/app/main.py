@@ -1,16 +1,56 @@
+import threading
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from .config import settings
 from .service import AppService
+from .sync.folder import FolderSync
+from .admission.control import AdmissionController, AdmissionMiddleware, parse_class_spec, parse_rates, parse_keys
 from .routes.documents import router as documents_router
 from .routes.search import router as search_router
 from .routes.chat import router as chat_router
 from .routes.eval import router as eval_router
+from .routes.collections import router as collections_router
+from .routes.metrics import router as metrics_router
 
 service = AppService()
+folder_sync = None
+admission = AdmissionController(
+    max_active=settings.admission_max_active,
+    limits={k: int(v) for k, v in parse_class_spec(settings.admission_limits).items()},
+    queues={k: int(v) for k, v in parse_class_spec(settings.admission_queue).items()},
+    rates=parse_rates(settings.rate_limits),
+    queue_timeout_s=settings.admission_queue_timeout_s,
+    enabled=settings.admission_enabled,
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global folder_sync
+    service.querylog.start()
+    threading.Thread(target=service.startup, name="startup", daemon=True).start()
+    if settings.sync_dir and service.retrieval.is_writer:
+        folder_sync = FolderSync(
+            service,
+            settings.sync_dir,
+            debounce_s=settings.sync_debounce_s,
+            poll_s=settings.sync_poll_s,
+            use_inotify=settings.sync_use_inotify,
+            collection=settings.sync_collection,
+            reconcile_s=settings.sync_reconcile_s,
+        )
+        folder_sync.start()
+    yield
+    if folder_sync is not None:
+        folder_sync.stop()
+    service.querylog.stop()
+    service.retrieval.close()
 
-app = FastAPI(title="Second Brain RAG", version="1.0.0")
+app = FastAPI(title="Second Brain RAG", version="1.0.0", lifespan=lifespan)
 
+app.add_middleware(AdmissionMiddleware, controller=admission, api_keys=parse_keys(settings.api_keys))
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -23,7 +63,17 @@ app.include_router(documents_router)
 app.include_router(search_router)
 app.include_router(chat_router)
 app.include_router(eval_router)
+app.include_router(collections_router)
+app.include_router(metrics_router)
 
 @app.get("/health")
 def health():
-    return {"ok": True}
+    return {
+        "ok": True,
+        "ready": service.ready,
+        "role": service.retrieval.role,
+        "generation": service.retrieval.generation,
+        "collections": service.retrieval.resident(),
+        "sync": folder_sync.last_scan if folder_sync is not None else None,
+        "prewarm": service.last_prewarm,
+    }
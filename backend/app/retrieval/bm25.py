@@ -1,6 +1,9 @@
-from typing import List, Tuple, Dict, Any
+from typing import List, Tuple, Dict, Any, Optional, Hashable, Iterable
+from collections import Counter
 import re
-from rank_bm25 import BM25Okapi
+import math
+import threading
+import numpy as np
 
 _tok = re.compile(r"[\w\-]+", re.UNICODE)
 
@@ -8,23 +11,108 @@ def tokenize(text: str) -> List[str]:
     return [t.lower() for t in _tok.findall(text)]
 
 class BM25Index:
-    def __init__(self):
-        self.bm25 = None
-        self.meta = []
-        self.corpus = []
-
-    def build(self, texts: List[str], meta: List[Dict[str, Any]]):
-        self.corpus = [tokenize(t) for t in texts]
-        self.bm25 = BM25Okapi(self.corpus)
-        self.meta = meta
-
-    def search(self, query: str, top_k: int) -> List[Tuple[int, float]]:
-        if self.bm25 is None:
-            return []
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.vocab = None
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.meta: List[Any] = []
+        self.slots: Dict[Any, int] = {}
+        self.terms: List[Tuple[Hashable, ...]] = []
+        self.lengths = np.zeros((0,), dtype=np.float32)
+        self.postings: Dict[Hashable, Dict[int, int]] = {}
+        self.total = 0
+        self.free: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+    def __contains__(self, key: Any) -> bool:
+        return key in self.slots
+
+    def build(self, texts: List[str], meta: List[Any]):
+        self.build_terms([tokenize(t) for t in texts], meta)
+
+    def build_terms(self, corpus: List[List[Hashable]], meta: List[Any], vocab: Optional[Any] = None):
+        with self._lock:
+            self._reset()
+        self.vocab = vocab
+        self.add_terms(corpus, meta)
+
+    def add_terms(self, corpus: Iterable[List[Hashable]], meta: Iterable[Any]):
+        with self._lock:
+            for terms, key in zip(corpus, meta):
+                if key in self.slots:
+                    continue
+                if self.free:
+                    slot = self.free.pop()
+                    self.meta[slot] = key
+                    self.terms[slot] = ()
+                else:
+                    slot = len(self.meta)
+                    self.meta.append(key)
+                    self.terms.append(())
+                    if slot >= len(self.lengths):
+                        self.lengths = np.concatenate([self.lengths, np.zeros(max(1024, slot), dtype=np.float32)])
+                counts = Counter(terms)
+                for t, tf in counts.items():
+                    self.postings.setdefault(t, {})[slot] = tf
+                self.slots[key] = slot
+                self.terms[slot] = tuple(counts)
+                self.lengths[slot] = len(terms)
+                self.total += len(terms)
+
+    def remove(self, keys: Iterable[Any]) -> int:
+        removed = 0
+        with self._lock:
+            for key in keys:
+                slot = self.slots.pop(key, None)
+                if slot is None:
+                    continue
+                for t in self.terms[slot]:
+                    p = self.postings.get(t)
+                    if p is not None:
+                        p.pop(slot, None)
+                        if not p:
+                            del self.postings[t]
+                self.total -= int(self.lengths[slot])
+                self.lengths[slot] = 0
+                self.meta[slot] = None
+                self.terms[slot] = ()
+                self.free.append(slot)
+                removed += 1
+        return removed
+
+    def search(self, query: str, top_k: int) -> List[Tuple[Any, float]]:
         q = tokenize(query)
-        scores = self.bm25.get_scores(q)
-        idxs = sorted(range(len(scores)), key=lambda i: float(scores[i]), reverse=True)[:top_k]
-        out = []
-        for i in idxs:
-            out.append((i, float(scores[i])))
-        return out
+        if self.vocab is not None:
+            q = self.vocab.lookup(q)
+        with self._lock:
+            n = len(self.slots)
+            if not n or not q:
+                return []
+            avgdl = self.total / n or 1.0
+            touched = []
+            for t, qtf in Counter(q).items():
+                p = self.postings.get(t)
+                if not p:
+                    continue
+                idf = math.log(1.0 + (n - len(p) + 0.5) / (len(p) + 0.5))
+                slots = np.fromiter(p.keys(), dtype=np.int64, count=len(p))
+                tf = np.fromiter(p.values(), dtype=np.float32, count=len(p))
+                norm = self.k1 * (1.0 - self.b + self.b * self.lengths[slots] / avgdl)
+                touched.append((slots, qtf * idf * tf * (self.k1 + 1.0) / (tf + norm)))
+            if not touched:
+                return []
+            slots = np.concatenate([s for s, _ in touched])
+            vals = np.concatenate([v for _, v in touched])
+            uniq, inv = np.unique(slots, return_inverse=True)
+            total = np.zeros(len(uniq), dtype=np.float64)
+            np.add.at(total, inv, vals)
+            k = min(top_k, len(uniq))
+            top = np.argpartition(-total, k - 1)[:k] if k < len(uniq) else np.arange(len(uniq))
+            top = top[np.argsort(-total[top], kind="stable")]
+            return [(self.meta[int(uniq[i])], float(total[i])) for i in top]
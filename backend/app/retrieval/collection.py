@@ -0,0 +1,47 @@
+import os
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import List, Any
+
+from .snapshots import SnapshotStore
+
+DEFAULT_COLLECTION = "default"
+
+_name = re.compile(r"^[a-z0-9][a-z0-9_-]{0,63}$")
+
+def validate_collection(name: str) -> str:
+    name = (name or DEFAULT_COLLECTION).strip().lower()
+    if not _name.match(name):
+        raise ValueError(f"invalid collection name {name!r}: use 1-64 chars of a-z, 0-9, '_' or '-'")
+    return name
+
+def collection_dir(index_dir: str, name: str) -> str:
+    if name == DEFAULT_COLLECTION:
+        return index_dir
+    return os.path.join(index_dir, "collections", name)
+
+@dataclass
+class IndexState:
+    generation: int
+    shards: List[Any] = field(default_factory=list)
+
+    def size(self) -> int:
+        return sum(len(s) for s in self.shards)
+
+class CollectionIndex:
+    def __init__(self, name: str, index_dir: str, keep: int, shards: List[Any]):
+        self.name = name
+        self.snapshots = SnapshotStore(collection_dir(index_dir, name), keep=keep)
+        self.state = IndexState(0, shards)
+        self.loaded = False
+        self.last_poll = 0.0
+        self.lock = threading.RLock()
+
+    @property
+    def generation(self) -> int:
+        return self.state.generation
+
+    @staticmethod
+    def exists_on_disk(name: str, index_dir: str) -> bool:
+        return os.path.exists(os.path.join(collection_dir(index_dir, name), "CURRENT"))
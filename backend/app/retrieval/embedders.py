@@ -0,0 +1,131 @@
+import os
+import json
+import multiprocessing
+from abc import ABC, abstractmethod
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+class Embedder(ABC):
+    dim: int = 0
+    tokenizer = None
+
+    @abstractmethod
+    def encode(self, texts: List[str], batch_size: int = 64, lengths: Optional[List[int]] = None) -> np.ndarray:
+        ...
+
+    def close(self):
+        pass
+
+def _normalize(x: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    np.maximum(norms, 1e-12, out=norms)
+    x /= norms
+    return x
+
+def length_order(texts: List[str], lengths: Optional[List[int]] = None) -> List[int]:
+    if lengths is None or len(lengths) != len(texts):
+        lengths = [len(t) for t in texts]
+    return sorted(range(len(texts)), key=lambda i: lengths[i], reverse=True)
+
+class SentenceTransformerEmbedder(Embedder):
+    def __init__(self, model_name: str, threads: int = 0):
+        from sentence_transformers import SentenceTransformer
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        self.model = SentenceTransformer(model_name)
+        self.tokenizer = self.model.tokenizer
+        self.dim = int(self.model.get_sentence_embedding_dimension())
+
+    def encode(self, texts: List[str], batch_size: int = 64, lengths: Optional[List[int]] = None) -> np.ndarray:
+        vecs = self.model.encode(texts, batch_size=batch_size, show_progress_bar=False, convert_to_numpy=True,
+                                 normalize_embeddings=True)
+        return np.asarray(vecs, dtype=np.float32)
+
+class OnnxEmbedder(Embedder):
+    def __init__(self, model_dir: str, quantized: bool = False, threads: int = 0, expected_model: str = ""):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+        with open(os.path.join(model_dir, "embedder.json"), "r", encoding="utf-8") as f:
+            cfg = json.load(f)
+        if expected_model and cfg.get("model") != expected_model:
+            raise ValueError(f"ONNX export in {model_dir} was made from {cfg.get('model')!r}, "
+                             f"EMBED_MODEL is {expected_model!r}; re-run tools/export_onnx.py")
+        self.max_length = int(cfg.get("max_seq_length") or 256)
+        self.dim = int(cfg["dim"])
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        opts = ort.SessionOptions()
+        if threads:
+            opts.intra_op_num_threads = threads
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        path = os.path.join(model_dir, "model.int8.onnx" if quantized else "model.onnx")
+        self.session = ort.InferenceSession(path, opts, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def encode(self, texts: List[str], batch_size: int = 64, lengths: Optional[List[int]] = None) -> np.ndarray:
+        out = np.empty((len(texts), self.dim), dtype=np.float32)
+        order = length_order(texts, lengths)
+        for start in range(0, len(order), batch_size):
+            idx = order[start:start + batch_size]
+            enc = self.tokenizer([texts[i] for i in idx], padding=True, truncation=True,
+                                 max_length=self.max_length, return_tensors="np")
+            feeds = {k: enc[k].astype(np.int64) for k in ("input_ids", "attention_mask", "token_type_ids")
+                     if k in self.input_names and k in enc}
+            hidden = self.session.run(None, feeds)[0]
+            mask = enc["attention_mask"][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+            out[idx] = pooled
+        return _normalize(out)
+
+def make_embedder(spec: Dict[str, Any]) -> Embedder:
+    backend = (spec.get("backend") or "torch").strip().lower()
+    threads = int(spec.get("threads") or 0)
+    if backend == "onnx":
+        return OnnxEmbedder(spec["onnx_model_dir"], quantized=bool(spec.get("onnx_quantized")), threads=threads,
+                            expected_model=spec.get("model") or "")
+    if backend == "torch":
+        return SentenceTransformerEmbedder(spec["model"], threads=threads)
+    raise ValueError(f"unknown embed backend {backend!r}")
+
+_worker: Optional[Embedder] = None
+
+def _init_worker(spec: Dict[str, Any]):
+    global _worker
+    _worker = make_embedder(spec)
+
+def _encode_in_worker(args):
+    texts, batch_size = args
+    return _worker.encode(texts, batch_size)
+
+class PooledEmbedder(Embedder):
+    def __init__(self, spec: Dict[str, Any], workers: int):
+        self.workers = max(1, workers)
+        spec = dict(spec)
+        if not spec.get("threads"):
+            spec["threads"] = max(1, (os.cpu_count() or 1) // self.workers)
+        self.spec = spec
+        ctx = multiprocessing.get_context("spawn")
+        self.pool = ctx.Pool(self.workers, initializer=_init_worker, initargs=(spec,))
+        self.dim = 0
+
+    def encode(self, texts: List[str], batch_size: int = 64, lengths: Optional[List[int]] = None) -> np.ndarray:
+        if not texts:
+            return np.empty((0, self.dim), dtype=np.float32)
+        order = length_order(texts, lengths)
+        jobs = []
+        for start in range(0, len(order), batch_size):
+            idx = order[start:start + batch_size]
+            jobs.append((idx, [texts[i] for i in idx]))
+        results = self.pool.imap(_encode_in_worker, [(t, batch_size) for _, t in jobs])
+        out = None
+        for (idx, _), vecs in zip(jobs, results):
+            if out is None:
+                self.dim = vecs.shape[1]
+                out = np.empty((len(texts), self.dim), dtype=np.float32)
+            out[idx] = vecs
+        return out
+
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
@@ -1,55 +1,345 @@
 import os
-import json
 from typing import List, Tuple, Dict, Any, Optional
 import numpy as np
 import faiss
 
+INDEX_TYPES = ("flat", "fp16", "sq8", "binary")
+REDUCTIONS = ("pca", "truncate")
+RESCORE_MULT = 10
+VEC_CHUNK = 65536
+
+def _mmap_flags() -> int:
+    if not hasattr(faiss, "IO_FLAG_MMAP_IFC"):
+        raise RuntimeError(f"faiss {faiss.__version__} cannot memory-map flat/SQ codes (IO_FLAG_MMAP_IFC is missing); "
+                           "install faiss-cpu>=1.11.0 or set INDEX_MMAP=false")
+    return faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY | faiss.IO_FLAG_MMAP_IFC
+
+def new_index(dim: int, index_type: str):
+    if index_type == "fp16":
+        return faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_INNER_PRODUCT)
+    if index_type == "sq8":
+        return faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT)
+    if index_type == "flat":
+        return faiss.IndexFlatIP(dim)
+    if index_type == "binary":
+        if dim % 8:
+            raise ValueError(f"binary index needs a dimension divisible by 8, got {dim}")
+        return faiss.IndexBinaryFlat(dim)
+    raise ValueError(f"unknown index_type {index_type!r}, expected one of {INDEX_TYPES}")
+
+def check_index_config(index_type: str, reduction: str, target_dim: int):
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"unknown index_type {index_type!r}, expected one of {INDEX_TYPES}")
+    if reduction and reduction not in REDUCTIONS:
+        raise ValueError(f"unknown index_reduction {reduction!r}, expected one of {REDUCTIONS}")
+    if index_type == "binary" and reduction and target_dim % 8:
+        raise ValueError(f"binary index needs index_target_dim divisible by 8, got {target_dim}")
+
+def index_type_of(index) -> str:
+    if isinstance(index, faiss.IndexBinary):
+        return "binary"
+    if isinstance(index, faiss.IndexScalarQuantizer):
+        return "fp16" if index.sq.qtype == faiss.ScalarQuantizer.QT_fp16 else "sq8"
+    return "flat"
+
+def binarize(vectors: np.ndarray) -> np.ndarray:
+    return np.packbits(vectors > 0, axis=1)
+
+def new_transform(vectors: np.ndarray, reduction: str, target_dim: int):
+    d = vectors.shape[1]
+    if not reduction or target_dim <= 0 or target_dim >= d:
+        return None
+    if reduction == "truncate":
+        return faiss.RemapDimensionsTransform(d, target_dim, False)
+    if reduction == "pca":
+        if len(vectors) < 2 * target_dim:
+            return None
+        t = faiss.PCAMatrix(d, target_dim)
+        t.train(np.ascontiguousarray(vectors, dtype=np.float32))
+        return t
+    raise ValueError(f"unknown index_reduction {reduction!r}, expected one of {REDUCTIONS}")
+
+def transform_name(t) -> str:
+    if t is None:
+        return ""
+    kind = "pca" if isinstance(t, faiss.PCAMatrix) else "truncate"
+    return f"{kind}:{t.d_out}"
+
+class LiveFilter:
+    def __init__(self, mask: np.ndarray):
+        self.mask = mask
+        self.deleted = int(mask.size - np.count_nonzero(mask))
+        self.bitmap = np.packbits(mask, bitorder="little")
+        self.sel = faiss.IDSelectorBitmap(mask.size, faiss.swig_ptr(self.bitmap))
+        self.params = faiss.SearchParameters()
+        self.params.sel = self.sel
+
 class FaissStore:
-    def __init__(self, dim: int, index_path: str):
+    def __init__(self, dim: int, index_path: str, mmap: bool = True, index_type: str = "flat",
+                 rescore_mult: int = RESCORE_MULT, reduction: str = "", target_dim: int = 0):
         self.dim = dim
         self.index_path = index_path
-        self.meta_path = index_path + ".meta.json"
+        self.ids_path = index_path + ".ids.npy"
+        self.vecs_path = index_path + ".f32.npy"
+        self.proj_path = index_path + ".proj"
+        self.mmap = mmap
+        self.index_type = index_type
+        self.rescore_mult = rescore_mult
+        self.reduction = reduction
+        self.target_dim = target_dim
+        self.transform = None
         self.index = None
-        self.meta = []
+        self._ids = np.empty((0,), dtype="U36")
+        self._pending: List[np.ndarray] = []
+        self._vecs: Optional[np.ndarray] = None
+        self._pending_vecs: List[np.ndarray] = []
+        self._spills: List[str] = []
+
+    @property
+    def is_binary(self) -> bool:
+        return self.index_type == "binary"
+
+    @property
+    def projection(self) -> str:
+        return transform_name(self.transform)
+
+    def project(self, vectors: np.ndarray) -> np.ndarray:
+        if self.transform is None:
+            return vectors
+        out = np.ascontiguousarray(self.transform.apply(vectors), dtype=np.float32)
+        faiss.normalize_L2(out)
+        return out
+
+    def _vec_parts(self) -> List[np.ndarray]:
+        return ([self._vecs] if self._vecs is not None else []) + self._pending_vecs
+
+    def vector_rows(self, start: int, stop: int) -> np.ndarray:
+        out = []
+        base = 0
+        for part in self._vec_parts():
+            lo, hi = max(start, base), min(stop, base + len(part))
+            if lo < hi:
+                out.append(np.asarray(part[lo - base:hi - base], dtype=np.float32))
+            base += len(part)
+        return np.concatenate(out) if out else np.empty((0, self.dim or 0), dtype=np.float32)
+
+    def _gather(self, ids: np.ndarray) -> np.ndarray:
+        out = np.empty((len(ids), self.dim), dtype=np.float32)
+        base = 0
+        for part in self._vec_parts():
+            sel = (ids >= base) & (ids < base + len(part))
+            if sel.any():
+                out[sel] = part[ids[sel] - base]
+            base += len(part)
+        return out
+
+    @property
+    def chunk_ids(self) -> np.ndarray:
+        if self._pending:
+            self._ids = np.concatenate([np.asarray(self._ids)] + self._pending)
+            self._pending = []
+        return self._ids
+
+    @chunk_ids.setter
+    def chunk_ids(self, ids: np.ndarray):
+        self._ids = ids
+        self._pending = []
+
+    def set_path(self, index_path: str):
+        self.index_path = index_path
+        self.ids_path = index_path + ".ids.npy"
+        self.vecs_path = index_path + ".f32.npy"
+        self.proj_path = index_path + ".proj"
+
+    def __len__(self) -> int:
+        return int(self.index.ntotal) if self.index is not None else 0
+
+    def chunk_id(self, i: int) -> str:
+        return str(self.chunk_ids[i])
+
+    def memory_bytes(self) -> int:
+        if self.index is None:
+            return 0
+        if self.is_binary:
+            return int(self.index.code_size) * int(self.index.ntotal)
+        return int(self.index.sa_code_size()) * int(self.index.ntotal)
+
+    def files(self) -> List[str]:
+        out = [self.index_path, self.ids_path]
+        if self.is_binary:
+            out.append(self.vecs_path)
+        if self.transform is not None:
+            out.append(self.proj_path)
+        return out
 
     def exists(self) -> bool:
-        return os.path.exists(self.index_path) and os.path.exists(self.meta_path)
+        return os.path.exists(self.index_path) and os.path.exists(self.ids_path)
 
     def load(self):
-        self.index = faiss.read_index(self.index_path)
-        with open(self.meta_path, "r", encoding="utf-8") as f:
-            self.meta = json.load(f)
+        binary = os.path.exists(self.vecs_path)
+        read = faiss.read_index_binary if binary else faiss.read_index
+        index = read(self.index_path, _mmap_flags()) if self.mmap else read(self.index_path)
+        self.index = index
+        self.chunk_ids = np.load(self.ids_path, mmap_mode="r" if self.mmap else None)
         self.dim = self.index.d
+        self.index_type = index_type_of(index)
+        self._vecs = np.load(self.vecs_path, mmap_mode="r") if binary else None
+        self._pending_vecs = []
+        self.transform = faiss.read_VectorTransform(self.proj_path) if os.path.exists(self.proj_path) else None
 
     def save(self):
         os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
-        faiss.write_index(self.index, self.index_path)
-        with open(self.meta_path, "w", encoding="utf-8") as f:
-            json.dump(self.meta, f, ensure_ascii=False)
-
-    def build(self, vectors: np.ndarray, meta: List[Dict[str, Any]]):
-        if vectors.dtype != np.float32:
-            vectors = vectors.astype(np.float32)
-        self.dim = vectors.shape[1]
-        idx = faiss.IndexFlatIP(self.dim)
-        faiss.normalize_L2(vectors)
-        idx.add(vectors)
-        self.index = idx
-        self.meta = meta
+        tmp = self.index_path + ".tmp"
+        if self.is_binary:
+            faiss.write_index_binary(self.index, tmp)
+        else:
+            faiss.write_index(self.index, tmp)
+        os.replace(tmp, self.index_path)
+        tmp_ids = self.ids_path + ".tmp.npy"
+        np.save(tmp_ids, np.asarray(self.chunk_ids))
+        os.replace(tmp_ids, self.ids_path)
+        if self.is_binary:
+            self._save_vectors()
+        if self.transform is not None:
+            tmp_proj = self.proj_path + ".tmp"
+            faiss.write_VectorTransform(self.transform, tmp_proj)
+            os.replace(tmp_proj, self.proj_path)
+
+    def _save_vectors(self):
+        parts = self._vec_parts()
+        tmp = self.vecs_path + ".tmp.npy"
+        out = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float32,
+                                        shape=(sum(len(p) for p in parts), self.dim))
+        at = 0
+        for part in parts:
+            for start in range(0, len(part), VEC_CHUNK):
+                block = np.asarray(part[start:start + VEC_CHUNK], dtype=np.float32)
+                out[at:at + len(block)] = block
+                at += len(block)
+        out.flush()
+        del out
+        os.replace(tmp, self.vecs_path)
+        self._vecs = np.load(self.vecs_path, mmap_mode="r")
+        self._pending_vecs = []
+        self.release()
+
+    def release(self):
+        for path in self._spills:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self._spills = []
+
+    def _spill(self, count: int) -> Tuple[str, np.ndarray]:
+        path = "%s.spill%d.npy" % (self.vecs_path, len(self._spills))
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._spills.append(path)
+        return path, np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=(count, self.dim))
+
+    def add(self, vectors: np.ndarray, chunk_ids: List[str]):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if self.index is None:
+            if self.transform is None:
+                self.transform = new_transform(vectors, self.reduction, self.target_dim)
+            vectors = self.project(vectors)
+            self.dim = vectors.shape[1]
+            self.index = new_index(self.dim, self.index_type)
+        else:
+            vectors = self.project(vectors)
+        if self.is_binary:
+            self.index.add(binarize(vectors))
+            self._pending_vecs.append(vectors)
+        else:
+            if not self.index.is_trained:
+                self.index.train(vectors)
+            self.index.add(vectors)
+        self._pending.append(np.asarray(chunk_ids, dtype="U"))
+
+    def spawn(self, index_path: str) -> "FaissStore":
+        out = FaissStore(self.dim, index_path, mmap=False, index_type=self.index_type, rescore_mult=self.rescore_mult,
+                         reduction=self.reduction, target_dim=self.target_dim)
+        if self.index is None:
+            return out
+        out.transform = self.transform
+        out.index = new_index(self.dim, self.index_type)
+        if isinstance(self.index, faiss.IndexScalarQuantizer) and self.index.is_trained:
+            out.index.sq.trained = self.index.sq.trained
+            out.index.is_trained = True
+        return out
+
+    def extend(self, other: "FaissStore", live: Optional[np.ndarray] = None, batch: int = VEC_CHUNK):
+        ids = other.chunk_ids
+        n = len(other)
+        spill = None
+        if self.is_binary:
+            path, spill = self._spill(n if live is None else int(np.count_nonzero(live)))
+        at = 0
+        for start in range(0, n, batch):
+            m = min(batch, n - start)
+            keep = slice(None) if live is None else live[start:start + m]
+            vecs = other.index.reconstruct_n(start, m)[keep]
+            if not len(vecs):
+                continue
+            self.index.add(vecs)
+            if spill is not None:
+                rows = other.vector_rows(start, start + m)[keep]
+                spill[at:at + len(rows)] = rows
+                at += len(rows)
+            self._pending.append(np.asarray(ids[start:start + m])[keep])
+        if spill is not None:
+            spill.flush()
+            del spill
+            self._pending_vecs.append(np.load(path, mmap_mode="r"))
 
     def search(self, q: np.ndarray, top_k: int) -> List[Tuple[int, float]]:
+        if q.ndim == 1:
+            q = q.reshape(1, -1)
+        return self.search_batch(q[:1], top_k)[0]
+
+    def search_batch(self, q: np.ndarray, top_k: int, rescore_mult: Optional[int] = None,
+                     live: Optional["LiveFilter"] = None, projected: bool = False) -> List[List[Tuple[int, float]]]:
         if self.index is None:
             raise RuntimeError("index not loaded")
-        if q.dtype != np.float32:
-            q = q.astype(np.float32)
         if q.ndim == 1:
             q = q.reshape(1, -1)
-        qq = q.copy()
-        faiss.normalize_L2(qq)
-        scores, ids = self.index.search(qq, top_k)
+        q = np.ascontiguousarray(q, dtype=np.float32)
+        if not projected:
+            q = self.project(q)
+        if self.is_binary:
+            return self._search_binary(q, top_k, self.rescore_mult if rescore_mult is None else rescore_mult, live)
+        if live is not None:
+            scores, ids = self.index.search(q, top_k, params=live.params)
+        else:
+            scores, ids = self.index.search(q, top_k)
         out = []
-        for i, s in zip(ids[0].tolist(), scores[0].tolist()):
-            if i == -1:
-                continue
-            out.append((i, float(s)))
+        for row_ids, row_scores in zip(ids.tolist(), scores.tolist()):
+            hits = []
+            for i, s in zip(row_ids, row_scores):
+                if i == -1:
+                    continue
+                hits.append((i, float(s)))
+            out.append(hits)
+        return out
+
+    def _search_binary(self, q: np.ndarray, top_k: int, rescore_mult: int,
+                       live: Optional["LiveFilter"] = None) -> List[List[Tuple[int, float]]]:
+        n = len(self)
+        if n == 0:
+            return [[] for _ in range(len(q))]
+        k1 = min(n, top_k * max(1, rescore_mult) + (live.deleted if live is not None else 0))
+        dist, cand = self.index.search(binarize(q), k1)
+        if live is not None:
+            ok = (cand != -1) & live.mask[np.maximum(cand, 0)]
+            cand = np.where(ok, cand, -1)
+        if rescore_mult <= 0:
+            scale = 2.0 / float(self.dim)
+            return [[(int(i), 1.0 - scale * float(d)) for i, d in zip(ids, ds) if i != -1][:top_k]
+                    for ids, ds in zip(cand, dist)]
+        out = []
+        for qi, ids in zip(q, cand):
+            ids = np.sort(ids[ids != -1])
+            scores = self._gather(ids) @ qi
+            order = np.argsort(-scores)[:top_k]
+            out.append([(int(ids[j]), float(scores[j])) for j in order])
         return out
@@ -0,0 +1,65 @@
+from typing import List, Tuple
+
+from ..db import get_conn, fetchall, scalar
+from .bm25 import tokenize
+
+FTS_SCHEMA = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(
+        text,
+        content='chunks',
+        content_rowid='rowid',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS chunks_fts_ai AFTER INSERT ON chunks BEGIN
+        INSERT INTO chunks_fts(rowid, text) VALUES (new.rowid, new.text);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS chunks_fts_ad AFTER DELETE ON chunks BEGIN
+        INSERT INTO chunks_fts(chunks_fts, rowid, text) VALUES ('delete', old.rowid, old.text);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS chunks_fts_au AFTER UPDATE OF text ON chunks BEGIN
+        INSERT INTO chunks_fts(chunks_fts, rowid, text) VALUES ('delete', old.rowid, old.text);
+        INSERT INTO chunks_fts(rowid, text) VALUES (new.rowid, new.text);
+    END""",
+]
+
+def match_expr(query: str) -> str:
+    terms = []
+    seen = set()
+    for t in tokenize(query):
+        if t in seen:
+            continue
+        seen.add(t)
+        terms.append('"' + t.replace('"', '""') + '"')
+    return " OR ".join(terms)
+
+class FtsIndex:
+    def __init__(self):
+        self._ready = False
+
+    def ensure_schema(self):
+        if self._ready:
+            return
+        conn = get_conn()
+        exists = scalar("SELECT COUNT(1) FROM sqlite_master WHERE type = 'table' AND name = 'chunks_fts'")
+        cur = conn.cursor()
+        for stmt in FTS_SCHEMA:
+            cur.execute(stmt)
+        if not exists:
+            cur.execute("INSERT INTO chunks_fts(chunks_fts) VALUES ('rebuild')")
+        conn.commit()
+        self._ready = True
+
+    def search(self, query: str, top_k: int, collection: str = "default") -> List[Tuple[str, float]]:
+        expr = match_expr(query)
+        if not expr:
+            return []
+        self.ensure_schema()
+        rows = fetchall(
+            """SELECT c.id AS chunk_id, -bm25(chunks_fts) AS score
+               FROM chunks_fts JOIN chunks c ON c.rowid = chunks_fts.rowid
+               WHERE chunks_fts MATCH ? AND c.collection = ?
+               ORDER BY bm25(chunks_fts)
+               LIMIT ?""",
+            (expr, collection, top_k)
+        )
+        return [(r["chunk_id"], float(r["score"])) for r in rows]
@@ -0,0 +1,69 @@
+import os
+import json
+import hashlib
+import datetime
+from typing import List, Dict, Any, Optional, Iterable
+
+from ..db import fetchone
+
+MANIFEST_FILE = "manifest.json"
+
+def ids_digest(ids: Iterable[str]) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    for cid in ids:
+        h.update(cid.encode("utf-8"))
+        h.update(b"\n")
+    return h.hexdigest()
+
+def db_signature(collection: str) -> Dict[str, Any]:
+    row = fetchone(
+        """SELECT COUNT(1) AS count, COALESCE(MAX(rowid), 0) AS max_rowid, COALESCE(SUM(rowid), 0) AS rowid_sum,
+                  COALESCE(MAX(created_at), '') AS max_created_at
+           FROM chunks WHERE collection = ?""",
+        (collection,)
+    )
+    return dict(row)
+
+def read_manifest(gen_dir: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(os.path.join(gen_dir, MANIFEST_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+def write_manifest(gen_dir: str, manifest: Dict[str, Any]):
+    path = os.path.join(gen_dir, MANIFEST_FILE)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+def build_manifest(
+    generation: int,
+    collection: str,
+    shards: List[Any],
+    embed_id: str,
+    index_type: str,
+    db: Dict[str, Any],
+    projection: str = "",
+    projection_fit: int = 0,
+) -> Dict[str, Any]:
+    entries = []
+    for s in shards:
+        entries.append({"count": len(s.faiss), "ids_hash": s.faiss.ids_hash, "dim": int(s.faiss.dim or 0),
+                        "projection": s.faiss.projection})
+    return {
+        "generation": generation,
+        "collection": collection,
+        "chunk_count": sum(e["count"] for e in entries),
+        "embed_model": embed_id,
+        "index_type": index_type,
+        "projection": projection,
+        "projection_fit": projection_fit,
+        "num_shards": len(shards),
+        "shards": entries,
+        "db": db,
+        "created_at": datetime.datetime.utcnow().isoformat() + "Z",
+    }
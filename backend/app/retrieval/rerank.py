@@ -2,18 +2,28 @@ from typing import List, Dict, Any, Tuple
 import os
 import httpx
 
+from .cache import LRUCache
+
 class Reranker:
+    cache = LRUCache(0)
+
     def rerank(self, query: str, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         return items
 
 class CrossEncoderReranker(Reranker):
-    def __init__(self, model_name: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"):
+    def __init__(self, model_name: str = "cross-encoder/ms-marco-MiniLM-L-6-v2", cache_size: int = 0):
         from sentence_transformers import CrossEncoder
         self.model = CrossEncoder(model_name)
+        self.cache = LRUCache(cache_size)
 
     def rerank(self, query: str, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        pairs = [(query, it["text"]) for it in items]
-        scores = self.model.predict(pairs)
+        scores = [self.cache.get((query, it["chunk_id"])) for it in items]
+        todo = [i for i, s in enumerate(scores) if s is None]
+        if todo:
+            fresh = self.model.predict([(query, items[i]["text"]) for i in todo])
+            for i, s in zip(todo, fresh):
+                scores[i] = float(s)
+                self.cache.put((query, items[i]["chunk_id"]), scores[i])
         out = []
         for it, s in zip(items, scores):
             it2 = dict(it)
@@ -23,23 +33,28 @@ class CrossEncoderReranker(Reranker):
         return out
 
 class OllamaReranker(Reranker):
-    def __init__(self, base_url: str, model: str):
+    def __init__(self, base_url: str, model: str, cache_size: int = 0):
         self.base_url = base_url.rstrip("/")
         self.model = model
+        self.cache = LRUCache(cache_size)
 
     def rerank(self, query: str, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         if not items:
             return items
-        prompt = self._prompt(query, items)
-        url = self.base_url + "/api/generate"
-        try:
-            with httpx.Client(timeout=30.0) as client:
-                r = client.post(url, json={"model": self.model, "prompt": prompt, "stream": False})
-                r.raise_for_status()
-                txt = r.json().get("response", "")
-        except Exception:
-            return items
-        order = self._parse(txt, len(items))
+        key = (query, tuple(it["chunk_id"] for it in items))
+        order = self.cache.get(key)
+        if order is None:
+            prompt = self._prompt(query, items)
+            url = self.base_url + "/api/generate"
+            try:
+                with httpx.Client(timeout=30.0) as client:
+                    r = client.post(url, json={"model": self.model, "prompt": prompt, "stream": False})
+                    r.raise_for_status()
+                    txt = r.json().get("response", "")
+            except Exception:
+                return items
+            order = self._parse(txt, len(items))
+            self.cache.put(key, order)
         if not order:
             return items
         ordered = []
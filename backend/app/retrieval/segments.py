@@ -0,0 +1,320 @@
+import os
+import json
+import shutil
+from typing import List, Tuple, Dict, Any, Optional, Iterable
+
+import numpy as np
+
+from .faiss_store import FaissStore, LiveFilter, RESCORE_MULT
+from .manifest import ids_digest
+
+BASE_SEGMENT = "chunks"
+SEGMENTS_FILE = "segments.json"
+MAX_DELETED_RATIO = 0.25
+MERGE_FACTOR = 2
+
+def _link(src: str, dst: str):
+    if os.path.exists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+def _file_id(path: str) -> Tuple[int, int]:
+    st = os.stat(path)
+    return st.st_dev, st.st_ino
+
+class Segment:
+    def __init__(self, name: str, store: FaissStore, deleted: Optional[np.ndarray] = None):
+        self.name = name
+        self.store = store
+        self.deleted = np.empty((0,), dtype=np.int64) if deleted is None else deleted
+        self.live: Optional[LiveFilter] = None
+        self._order: Optional[np.ndarray] = None
+        if self.deleted.size:
+            mask = np.ones(len(store), dtype=bool)
+            mask[self.deleted] = False
+            self.live = LiveFilter(mask)
+
+    @property
+    def total(self) -> int:
+        return len(self.store)
+
+    @property
+    def count(self) -> int:
+        return self.total - int(self.deleted.size)
+
+    @property
+    def del_path(self) -> str:
+        return self.store.index_path + ".del.npy"
+
+    def with_deleted(self, positions: np.ndarray) -> "Segment":
+        out = Segment(self.name, self.store, np.union1d(self.deleted, positions).astype(np.int64))
+        out._order = self._order
+        return out
+
+    def live_ids(self) -> np.ndarray:
+        ids = np.asarray(self.store.chunk_ids)
+        return ids if self.live is None else ids[self.live.mask]
+
+    def positions(self, chunk_ids: np.ndarray) -> np.ndarray:
+        ids = np.asarray(self.store.chunk_ids)
+        if not ids.size or not chunk_ids.size:
+            return np.empty((0,), dtype=np.int64)
+        if self._order is None:
+            self._order = np.argsort(ids, kind="stable")
+        at = np.searchsorted(ids, chunk_ids, sorter=self._order)
+        at = np.minimum(at, ids.size - 1)
+        pos = self._order[at][ids[self._order[at]] == chunk_ids]
+        return np.setdiff1d(pos, self.deleted).astype(np.int64)
+
+def live_diff(before: "SegmentStore", after: "SegmentStore") -> Tuple[np.ndarray, np.ndarray]:
+    old = {id(s.store): s for s in before.segments}
+    new = {id(s.store): s for s in after.segments}
+    removed, added = [], []
+    for key, s in old.items():
+        t = new.get(key)
+        if t is None:
+            removed.append(s.live_ids())
+            continue
+        gone = np.setdiff1d(t.deleted, s.deleted)
+        if gone.size:
+            removed.append(np.asarray(s.store.chunk_ids)[gone])
+    for key, t in new.items():
+        if key not in old:
+            added.append(t.live_ids())
+    added_ids = np.concatenate(added) if added else np.empty((0,), dtype="U36")
+    removed_ids = np.concatenate(removed) if removed else np.empty((0,), dtype="U36")
+    return np.setdiff1d(removed_ids, added_ids), added_ids
+
+class SegmentStore:
+    def __init__(self, path: str, mmap: bool = True, index_type: str = "flat", rescore_mult: int = RESCORE_MULT,
+                 reduction: str = "", target_dim: int = 0, transform=None):
+        self.path = path
+        self.mmap = mmap
+        self.index_type = index_type
+        self.rescore_mult = rescore_mult
+        self.reduction = reduction
+        self.target_dim = target_dim
+        self.base_transform = transform
+        self.segments: List[Segment] = []
+        self.seq = 0
+        self.dirty: set = set()
+        self._ids: Optional[np.ndarray] = None
+        self._ids_hash: Optional[str] = None
+        self._offsets = np.zeros((1,), dtype=np.int64)
+
+    def fork(self, path: str) -> "SegmentStore":
+        out = SegmentStore(path, self.mmap, self.index_type, self.rescore_mult, self.reduction, self.target_dim,
+                           self.transform)
+        out.segments = list(self.segments)
+        out.seq = self.seq
+        out._reindex()
+        return out
+
+    def _reindex(self):
+        self._ids = None
+        self._ids_hash = None
+        self._offsets = np.cumsum([0] + [s.total for s in self.segments]).astype(np.int64)
+
+    @property
+    def first(self) -> Optional[FaissStore]:
+        return self.segments[0].store if self.segments else None
+
+    @property
+    def dim(self) -> int:
+        return int(self.first.dim or 0) if self.first is not None else 0
+
+    @property
+    def projection(self) -> str:
+        return self.first.projection if self.first is not None else ""
+
+    @property
+    def transform(self):
+        return self.first.transform if self.first is not None else self.base_transform
+
+    def project(self, vectors: np.ndarray) -> np.ndarray:
+        return self.first.project(vectors) if self.first is not None else vectors
+
+    def __len__(self) -> int:
+        return sum(s.count for s in self.segments)
+
+    @property
+    def chunk_ids(self) -> np.ndarray:
+        if self._ids is None:
+            parts = [s.live_ids() for s in self.segments]
+            self._ids = np.concatenate(parts) if parts else np.empty((0,), dtype="U36")
+        return self._ids
+
+    @property
+    def ids_hash(self) -> str:
+        if self._ids_hash is None:
+            self._ids_hash = ids_digest(self.chunk_ids.tolist())
+        return self._ids_hash
+
+    def chunk_id(self, i: int) -> str:
+        k = int(np.searchsorted(self._offsets, i, side="right")) - 1
+        return self.segments[k].store.chunk_id(i - int(self._offsets[k]))
+
+    def memory_bytes(self) -> int:
+        return sum(s.store.memory_bytes() for s in self.segments)
+
+    def _segment_path(self, name: str) -> str:
+        return os.path.join(self.path, name + ".faiss")
+
+    def files(self) -> List[str]:
+        out = [os.path.join(self.path, SEGMENTS_FILE)]
+        for s in self.segments:
+            out.extend(s.store.files())
+            if s.deleted.size:
+                out.append(s.del_path)
+        return out
+
+    def exists(self) -> bool:
+        return os.path.exists(os.path.join(self.path, SEGMENTS_FILE)) or \
+            FaissStore(0, self._segment_path(BASE_SEGMENT)).exists()
+
+    def _open(self, name: str) -> FaissStore:
+        return FaissStore(0, self._segment_path(name), mmap=self.mmap, rescore_mult=self.rescore_mult)
+
+    def load(self, prev: Optional["SegmentStore"] = None):
+        try:
+            with open(os.path.join(self.path, SEGMENTS_FILE), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            meta = {"seq": 0, "segments": [{"name": BASE_SEGMENT, "deleted": 0}]}
+        known = {}
+        if prev is not None:
+            for s in prev.segments:
+                try:
+                    known[(s.name, _file_id(s.store.index_path))] = s.store
+                except OSError:
+                    pass
+        self.segments = []
+        for entry in meta["segments"]:
+            path = self._segment_path(entry["name"])
+            store = known.get((entry["name"], _file_id(path)))
+            if store is None:
+                store = self._open(entry["name"])
+                store.load()
+            deleted = None
+            if entry.get("deleted"):
+                deleted = np.load(path + ".del.npy").astype(np.int64)
+            self.segments.append(Segment(entry["name"], store, deleted))
+        self.seq = int(meta.get("seq", 0))
+        if self.first is not None:
+            self.index_type = self.first.index_type
+            self.base_transform = self.first.transform
+        self.dirty = set()
+        self._reindex()
+
+    def save(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        for s in self.segments:
+            src = s.store.files()
+            src_del = s.del_path
+            s.store.set_path(self._segment_path(s.name))
+            if not all(os.path.exists(f) for f in src):
+                s.store.save()
+            else:
+                for a, b in zip(src, s.store.files()):
+                    if a != b:
+                        _link(a, b)
+            if s.deleted.size:
+                if s.name in self.dirty or not os.path.exists(src_del):
+                    tmp = s.del_path + ".tmp.npy"
+                    np.save(tmp, s.deleted)
+                    os.replace(tmp, s.del_path)
+                elif src_del != s.del_path:
+                    _link(src_del, s.del_path)
+        meta = {"seq": self.seq, "segments": [{"name": s.name, "count": s.total, "deleted": int(s.deleted.size)}
+                                              for s in self.segments]}
+        tmp = os.path.join(path, SEGMENTS_FILE + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+        os.replace(tmp, os.path.join(path, SEGMENTS_FILE))
+        self.dirty = set()
+
+    def new_segment(self) -> Tuple[str, FaissStore]:
+        name = BASE_SEGMENT if not self.segments and not self.seq else "%s-%06d" % (BASE_SEGMENT, self.seq + 1)
+        self.seq += 0 if name == BASE_SEGMENT else 1
+        path = self._segment_path(name)
+        if self.first is not None and self.first.index is not None:
+            return name, self.first.spawn(path)
+        store = FaissStore(0, path, mmap=False, index_type=self.index_type, rescore_mult=self.rescore_mult,
+                           reduction=self.reduction, target_dim=self.target_dim)
+        store.transform = self.base_transform
+        return name, store
+
+    def append(self, name: str, store: FaissStore):
+        if store.index is None or not len(store):
+            return
+        self.segments.append(Segment(name, store))
+        self._reindex()
+
+    def remove(self, chunk_ids: Iterable[str]) -> int:
+        wanted = np.asarray(list(chunk_ids), dtype="U")
+        if not wanted.size:
+            return 0
+        removed = 0
+        for i, s in enumerate(self.segments):
+            pos = s.positions(wanted)
+            if pos.size:
+                self.segments[i] = s.with_deleted(pos)
+                self.dirty.add(s.name)
+                removed += int(pos.size)
+        self._reindex()
+        return removed
+
+    def compact(self):
+        for i, s in enumerate(self.segments):
+            if s.total and s.deleted.size > MAX_DELETED_RATIO * s.total:
+                self.segments[i] = self._merge([s])
+        self.segments = [s for s in self.segments if s.count]
+        i = len(self.segments) - 1
+        while i > 0:
+            if self.segments[i - 1].count > MERGE_FACTOR * self.segments[i].count:
+                break
+            self.segments[i - 1:i + 1] = [self._merge(self.segments[i - 1:i + 1])]
+            i -= 1
+        self._reindex()
+
+    def _merge(self, parts: List[Segment]) -> Segment:
+        name, store = self.new_segment()
+        for s in parts:
+            store.extend(s.store, s.live.mask if s.live is not None else None)
+            s.store.release()
+        return Segment(name, store)
+
+    def search_batch(self, q: np.ndarray, top_k: int, rescore_mult: Optional[int] = None) -> List[List[Tuple[int, float]]]:
+        if not self.segments:
+            return [[] for _ in range(len(q))]
+        if q.ndim == 1:
+            q = q.reshape(1, -1)
+        qp = self.project(np.ascontiguousarray(q, dtype=np.float32))
+        per = [s.store.search_batch(qp, top_k, rescore_mult, live=s.live, projected=True) for s in self.segments]
+        if len(per) == 1:
+            return per[0]
+        out = []
+        for row in zip(*per):
+            hits = [(int(off) + i, sc) for off, hs in zip(self._offsets, row) for i, sc in hs]
+            hits.sort(key=lambda x: x[1], reverse=True)
+            out.append(hits[:top_k])
+        return out
+
+    def search(self, q: np.ndarray, top_k: int) -> List[Tuple[int, float]]:
+        if q.ndim == 1:
+            q = q.reshape(1, -1)
+        return self.search_batch(q[:1], top_k)[0]
+
+    def merged(self) -> FaissStore:
+        self.compact()
+        if len(self.segments) > 1 or (self.segments and self.segments[0].deleted.size):
+            self.segments = [self._merge(self.segments)]
+            self._reindex()
+        return self.first if self.first is not None else FaissStore(0, "", mmap=False)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"segments": len(self.segments), "deleted": sum(int(s.deleted.size) for s in self.segments)}
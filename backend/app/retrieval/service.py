@@ -1,79 +1,637 @@
-from typing import List, Dict, Any, Tuple, Optional
+from typing import List, Dict, Any, Tuple, Optional, Callable
+from dataclasses import dataclass
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import os
+import time
+import threading
 import numpy as np
-from sentence_transformers import SentenceTransformer
 
 from ..config import settings
 from ..db import fetchall
 from ..utils.text import normalize_text
-from .faiss_store import FaissStore
+from .faiss_store import FaissStore, check_index_config, new_transform
 from .bm25 import BM25Index
+from .fts import FtsIndex
+from .embedders import Embedder, PooledEmbedder, make_embedder
+from .snapshots import WriterLock
+from .collection import CollectionIndex, IndexState, DEFAULT_COLLECTION, validate_collection
+from .segments import SegmentStore
+from .shards import Shard, RemoteShard, LocalShardCluster, shard_of, shard_dir, merge_hits, parse_addresses, fetch_rows, fetch_texts, sync_bm25, backfill_terms, check_authkey
+from .manifest import db_signature, read_manifest, write_manifest, build_manifest
 from .rerank import Reranker, CrossEncoderReranker, OllamaReranker
+from .cache import LRUCache
+
+PCA_REFIT_FACTOR = 4
+
+@dataclass
+class SearchParams:
+    hybrid_alpha: Optional[float] = None
+    candidate_mult: int = 4
+    rerank: bool = True
+    collection: str = DEFAULT_COLLECTION
+    rescore_mult: Optional[int] = None
+    use_cache: bool = True
 
 class RetrievalService:
     def __init__(self, data_dir: str):
         self.data_dir = data_dir
         self.index_dir = os.path.join(self.data_dir, "index")
-        self.faiss_path = os.path.join(self.index_dir, "chunks.faiss")
-        self.embedder = SentenceTransformer(settings.embed_model)
-        self.dim = self.embedder.get_sentence_embedding_dimension()
-        self.faiss = FaissStore(self.dim, self.faiss_path)
-        self.bm25 = BM25Index()
-        self.reranker = self._make_reranker()
+        self.role = (settings.serve_role or "all").strip().lower()
+        self.num_shards = max(1, settings.num_shards)
+        self.index_type = (settings.index_type or "flat").strip().lower()
+        self.reduction = (settings.index_reduction or "").strip().lower()
+        self.target_dim = max(0, settings.index_target_dim) if self.reduction else 0
+        check_index_config(self.index_type, self.reduction, self.target_dim)
+        self.keyword_backend = (settings.keyword_backend or "bm25").strip().lower()
+        self.fts = FtsIndex() if self.keyword_backend == "fts" else None
+        self.max_resident = max(1, settings.max_resident_collections)
+        self.collections: "OrderedDict[str, CollectionIndex]" = OrderedDict()
+        self._embedder: Optional[Embedder] = None
+        self._bulk_embedder: Optional[Embedder] = None
+        self._reranker = None
+        self._lock = threading.RLock()
+        self._writer_lock: Optional[WriterLock] = None
+        self._pool = ThreadPoolExecutor(max_workers=self.num_shards, thread_name_prefix="shard") if self.num_shards > 1 else None
+        self._cluster: Optional[LocalShardCluster] = None
+        self._remote: List[RemoteShard] = []
+        self.embed_cache = LRUCache(settings.embed_cache_size)
+        self.result_cache = LRUCache(settings.result_cache_size)
+        self.on_generation: Optional[Callable[[CollectionIndex, IndexState], None]] = None
+        self._warming: set = set()
+
+    @property
+    def is_writer(self) -> bool:
+        return self.role != "reader"
+
+    @property
+    def state(self) -> IndexState:
+        with self._lock:
+            coll = self.collections.get(DEFAULT_COLLECTION)
+        return coll.state if coll is not None else IndexState(0, self._empty_shards())
+
+    @property
+    def generation(self) -> int:
+        return self.state.generation
+
+    def resident(self) -> Dict[str, int]:
+        with self._lock:
+            return {name: c.generation for name, c in self.collections.items()}
+
+    def collection(self, name: str) -> CollectionIndex:
+        name = validate_collection(name)
+        evicted = []
+        with self._lock:
+            coll = self.collections.get(name)
+            if coll is None:
+                coll = CollectionIndex(name, self.index_dir, settings.snapshot_keep, self._empty_shards())
+                self.collections[name] = coll
+            self.collections.move_to_end(name)
+            while len(self.collections) > self.max_resident:
+                evicted.append(self.collections.popitem(last=False)[1])
+        for old in evicted:
+            self._unload(old)
+        return coll
+
+    def lookup(self, name: str) -> Optional[CollectionIndex]:
+        name = validate_collection(name)
+        with self._lock:
+            known = name in self.collections
+        if not known and not CollectionIndex.exists_on_disk(name, self.index_dir):
+            return None
+        return self.collection(name)
+
+    def _empty_shards(self) -> List[Shard]:
+        return [Shard.empty(i) for i in range(self.num_shards)]
+
+    def _unload(self, coll: CollectionIndex):
+        with coll.lock:
+            for s in coll.state.shards:
+                if isinstance(s, RemoteShard):
+                    try:
+                        s.unload()
+                    except Exception:
+                        pass
+            coll.state = IndexState(0, self._empty_shards())
+            coll.loaded = False
+
+    @property
+    def embedder(self) -> Embedder:
+        if self._embedder is None:
+            with self._lock:
+                if self._embedder is None:
+                    self._embedder = make_embedder(self._embed_spec())
+        return self._embedder
+
+    @property
+    def bulk_embedder(self) -> Embedder:
+        if settings.embed_workers <= 0:
+            return self.embedder
+        if self._bulk_embedder is None:
+            with self._lock:
+                if self._bulk_embedder is None:
+                    self._bulk_embedder = PooledEmbedder(self._embed_spec(), settings.embed_workers)
+        return self._bulk_embedder
+
+    def _embed_spec(self) -> Dict[str, Any]:
+        return {
+            "backend": settings.embed_backend,
+            "model": settings.embed_model,
+            "onnx_model_dir": settings.onnx_model_dir,
+            "onnx_quantized": settings.onnx_quantized,
+            "threads": settings.embed_threads,
+        }
+
+    @property
+    def reranker(self) -> Reranker:
+        if self._reranker is None:
+            with self._lock:
+                if self._reranker is None:
+                    self._reranker = self._make_reranker()
+        return self._reranker
 
     def _make_reranker(self) -> Reranker:
+        if settings.rerank_model.strip():
+            return CrossEncoderReranker(settings.rerank_model.strip(), cache_size=settings.rerank_cache_size)
         if settings.llm_provider.strip().lower() == "ollama":
-            return OllamaReranker(settings.ollama_base_url, settings.ollama_model)
+            return OllamaReranker(settings.ollama_base_url, settings.ollama_model, cache_size=settings.rerank_cache_size)
         return Reranker()
 
-    def load_or_build(self):
-        rows = fetchall("SELECT id, doc_id, chunk_index, page_start, page_end, section, text FROM chunks ORDER BY created_at ASC")
-        texts = [normalize_text(r["text"]) for r in rows]
-        meta = []
-        for r in rows:
-            meta.append({
-                "chunk_id": r["id"],
-                "doc_id": r["doc_id"],
-                "chunk_index": int(r["chunk_index"]),
-                "page_start": r["page_start"],
-                "page_end": r["page_end"],
-                "section": r["section"]
-            })
-        if not rows:
-            self.faiss.index = None
-            self.faiss.meta = []
-            self.bm25.build([], [])
+    def ensure_loaded(self, collection: str = DEFAULT_COLLECTION) -> CollectionIndex:
+        coll = self.collection(collection)
+        if not coll.loaded:
+            with coll.lock:
+                if not coll.loaded:
+                    self._open(coll)
+        return coll
+
+    def load_or_build(self, collection: str = DEFAULT_COLLECTION):
+        coll = self.collection(collection)
+        with coll.lock:
+            self._open(coll)
+
+    def _open(self, coll: CollectionIndex):
+        if self.is_writer:
+            self._acquire_writer()
+            if self.fts is None:
+                backfill_terms(coll.name)
+            self._sync_writer(coll)
+        else:
+            self._connect_remote_shards()
+            gen = coll.snapshots.current()
+            if gen:
+                self._load_generation(coll, gen)
+        coll.loaded = True
+
+    def maybe_refresh(self, coll: CollectionIndex):
+        if self.is_writer:
+            return
+        now = time.monotonic()
+        if now - coll.last_poll < settings.snapshot_poll_s:
             return
+        coll.last_poll = now
+        gen = coll.snapshots.current()
+        if not gen or gen == coll.state.generation:
+            return
+        threading.Thread(target=self._refresh, args=(coll, gen), name=f"refresh-{coll.name}", daemon=True).start()
+
+    def _refresh(self, coll: CollectionIndex, gen: int):
+        if not coll.lock.acquire(blocking=False):
+            return
+        try:
+            if coll.state.generation != gen:
+                self._load_generation(coll, gen, warm=True)
+        except Exception:
+            pass
+        finally:
+            coll.lock.release()
 
-        if self.faiss.exists():
+    def _warm(self, coll: CollectionIndex, state: IndexState):
+        if self.on_generation is not None and state.size():
             try:
-                self.faiss.load()
-                if len(self.faiss.meta) != len(meta):
-                    raise RuntimeError("meta mismatch")
+                self.on_generation(coll, state)
             except Exception:
-                self._rebuild(texts, meta)
+                pass
+
+    def _swap(self, coll: CollectionIndex, state: IndexState):
+        self._warm(coll, state)
+        coll.state = state
+
+    def _warm_later(self, coll: CollectionIndex):
+        if self.on_generation is None:
+            return
+        with self._lock:
+            if coll.name in self._warming:
+                return
+            self._warming.add(coll.name)
+
+        def run():
+            warmed = None
+            while True:
+                state = coll.state
+                if state is warmed:
+                    with self._lock:
+                        if coll.state is warmed:
+                            self._warming.discard(coll.name)
+                            return
+                    continue
+                self._warm(coll, state)
+                warmed = state
+
+        threading.Thread(target=run, name=f"prewarm-{coll.name}", daemon=True).start()
+
+    def close(self):
+        for s in self._remote:
+            s.close()
+        if self._bulk_embedder is not None:
+            self._bulk_embedder.close()
+            self._bulk_embedder = None
+        if self._cluster is not None:
+            self._cluster.stop()
+            self._cluster = None
+
+    def _acquire_writer(self):
+        if self._writer_lock is not None:
+            return
+        with self._lock:
+            if self._writer_lock is not None:
+                return
+            lock = WriterLock(os.path.join(self.index_dir, "writer.lock"))
+            if not lock.acquire():
+                raise RuntimeError(f"another writer process owns {self.index_dir}")
+            self._writer_lock = lock
+
+    def _connect_remote_shards(self):
+        if self._remote:
+            return
+        with self._lock:
+            if not self._remote:
+                self._start_remote_shards()
+
+    def _start_remote_shards(self):
+        authkey = settings.shard_authkey.encode("utf-8")
+        addresses = parse_addresses(settings.shard_addresses)
+        if addresses:
+            if len(addresses) != self.num_shards:
+                raise RuntimeError(f"shard_addresses lists {len(addresses)} shards, num_shards is {self.num_shards}")
+            try:
+                check_authkey(authkey)
+            except ValueError as e:
+                raise RuntimeError(str(e))
+            self._remote = [RemoteShard(i, addr, authkey) for i, addr in enumerate(addresses)]
+        elif settings.shard_processes and self.num_shards > 1:
+            self._cluster = LocalShardCluster(self.num_shards, settings.shard_base_port, authkey,
+                                              mmap=settings.index_mmap, with_bm25=self.fts is None)
+            self._remote = self._cluster.start()
+
+    def _load_generation(self, coll: CollectionIndex, gen: int, mmap: Optional[bool] = None, warm: bool = False):
+        gen_dir = coll.snapshots.path(gen)
+        if self._remote:
+            views = [s.for_collection(coll.name, gen) for s in self._remote]
+            for v in views:
+                v.stage(shard_dir(gen_dir, v.shard_id), gen)
+            state = IndexState(gen, views)
+            if warm:
+                self._warm(coll, state)
+            for v in views:
+                v.activate(gen)
+            coll.state = state
+            return
+        use_mmap = settings.index_mmap if mmap is None else mmap
+        prev = [s if isinstance(s, Shard) else None for s in coll.state.shards]
+        shards = [Shard.load(i, shard_dir(gen_dir, i), use_mmap, self.fts is None, prev[i] if i < len(prev) else None)
+                  for i in range(self.num_shards)]
+        if warm:
+            self._swap(coll, IndexState(gen, shards))
         else:
-            self._rebuild(texts, meta)
+            coll.state = IndexState(gen, shards)
 
-        self.bm25.build(texts, meta)
+    def _embed_id(self) -> str:
+        spec = self._embed_spec()
+        out = f"{spec['backend']}:{spec['model']}"
+        if spec["backend"] == "onnx" and spec["onnx_quantized"]:
+            out += ":int8"
+        return out
 
-    def _rebuild(self, texts: List[str], meta: List[Dict[str, Any]]):
-        vecs = self.embedder.encode(texts, batch_size=64, show_progress_bar=False, convert_to_numpy=True, normalize_embeddings=True)
-        vecs = vecs.astype(np.float32)
-        self.faiss.build(vecs, meta)
-        self.faiss.save()
+    def _sync_writer(self, coll: CollectionIndex):
+        gen = coll.snapshots.current()
+        if gen and coll.state.generation != gen:
+            try:
+                self._load_generation(coll, gen, mmap=False)
+            except Exception:
+                coll.state = IndexState(0, self._empty_shards())
 
-    def search(self, query: str, top_k: int) -> List[Dict[str, Any]]:
-        query = normalize_text(query)
-        if not query:
-            return []
-        if self.faiss.index is None:
-            return []
+        sig = db_signature(coll.name)
+        if not sig["count"] and not coll.state.generation:
+            return
+        manifest = read_manifest(coll.snapshots.path(gen)) if coll.state.generation else None
+        trusted = self._trusted_shards(coll, manifest)
+        transform, fit = self._pca_state(coll, manifest)
+        refit = self._needs_refit(fit, sig)
+        if refit:
+            trusted = [False] * len(trusted)
+        if manifest is not None and all(trusted) and manifest["db"] == sig:
+            return
+
+        plan = self._append_plan(coll, manifest, sig, trusted) or self._diff_plan(coll, trusted)
+        if coll.state.generation and all(base is not None and not rm and not add for base, rm, add in plan):
+            write_manifest(coll.snapshots.path(coll.state.generation), build_manifest(
+                coll.state.generation, coll.name, coll.state.shards, self._embed_id(), self.index_type, sig,
+                self._projection(), fit))
+            return
+        if refit:
+            transform, fit = self._fit_pca(coll), sig["count"]
+
+        next_gen = coll.snapshots.begin()
+        gen_dir = coll.snapshots.path(next_gen)
+        shards = []
+        for i, (base, removed, added) in enumerate(plan):
+            path = shard_dir(gen_dir, i)
+            if base is not None and not removed and not added:
+                base.save(path)
+                shards.append(base)
+                continue
+            if base is not None and base.faiss.segments:
+                store = base.faiss.fork(path)
+            elif self.reduction == "pca":
+                store = SegmentStore(path, mmap=False, index_type=self.index_type, transform=transform)
+            else:
+                store = SegmentStore(path, mmap=False, index_type=self.index_type, reduction=self.reduction,
+                                     target_dim=self.target_dim)
+            if base is not None and len(base.bm25) == len(base.faiss):
+                bm25, before = base.bm25, base.faiss
+            else:
+                bm25, before = BM25Index(), SegmentStore(path)
+            store.remove(removed)
+            if added:
+                name, segment = store.new_segment()
+                self._encode_into(segment, added)
+                store.append(name, segment)
+            store.compact()
+            if self.fts is None:
+                sync_bm25(bm25, before, store)
+            shard = Shard(i, store, bm25)
+            shard.save(path)
+            shards.append(shard)
+        write_manifest(gen_dir, build_manifest(next_gen, coll.name, shards, self._embed_id(), self.index_type, sig,
+                                               self._projection(), fit))
+        coll.state = IndexState(next_gen, shards)
+        coll.snapshots.publish(next_gen)
+        self._warm_later(coll)
+
+    def _projection(self) -> str:
+        return f"{self.reduction}:{self.target_dim}" if self.reduction and self.target_dim else ""
+
+    def _pca_state(self, coll: CollectionIndex, manifest: Optional[Dict[str, Any]]) -> Tuple[Any, int]:
+        if self.reduction != "pca" or not self.target_dim or manifest is None:
+            return None, 0
+        fit = int(manifest.get("projection_fit") or 0)
+        stores = [s.faiss for s in coll.state.shards if len(s.faiss)]
+        if not fit or len({s.projection for s in stores}) > 1:
+            return None, 0
+        return (stores[0].transform if stores else None), fit
+
+    def _needs_refit(self, fit: int, sig: Dict[str, Any]) -> bool:
+        if self.reduction != "pca" or not self.target_dim or sig["count"] < 2 * self.target_dim:
+            return False
+        return not fit or sig["count"] >= PCA_REFIT_FACTOR * fit
+
+    def _fit_pca(self, coll: CollectionIndex):
+        size = max(2 * self.target_dim, settings.quant_train_size)
+        ids = [r["id"] for r in fetchall("SELECT id FROM chunks WHERE collection = ? ORDER BY RANDOM() LIMIT ?",
+                                         (coll.name, size))]
+        texts = fetch_texts(ids)
+        return new_transform(self._encode([texts.get(cid, "") for cid in ids], bulk=True), "pca", self.target_dim)
+
+    def _projection_ok(self, store: SegmentStore) -> bool:
+        if store.projection == self._projection() or not len(store):
+            return True
+        if store.projection or not self._projection():
+            return False
+        return self.target_dim >= (store.dim or 0) or (self.reduction == "pca" and len(store) < 2 * self.target_dim)
+
+    def _trusted_shards(self, coll: CollectionIndex, manifest: Optional[Dict[str, Any]]) -> List[bool]:
+        shards = coll.state.shards
+        if manifest is None:
+            return [not len(s) or (s.faiss.index_type == self.index_type and self._projection_ok(s.faiss))
+                    for s in shards]
+        if (manifest.get("embed_model") != self._embed_id() or manifest.get("num_shards") != len(shards)
+                or manifest.get("index_type") != self.index_type
+                or manifest.get("projection", "") != self._projection()):
+            return [False] * len(shards)
+        out = []
+        for s, entry in zip(shards, manifest.get("shards") or []):
+            out.append(len(s.faiss) == entry["count"] and s.faiss.ids_hash == entry["ids_hash"] and self._projection_ok(s.faiss))
+        return out + [False] * (len(shards) - len(out))
+
+    def _append_plan(self, coll: CollectionIndex, manifest: Optional[Dict[str, Any]], sig: Dict[str, Any],
+                     trusted: List[bool]):
+        if manifest is None or not all(trusted):
+            return None
+        old = manifest["db"]
+        rows = fetchall(
+            "SELECT rowid, id, doc_id, created_at FROM chunks WHERE collection = ? AND rowid > ? ORDER BY rowid ASC",
+            (coll.name, old["max_rowid"])
+        )
+        if old["count"] + len(rows) != sig["count"] or old["rowid_sum"] + sum(r["rowid"] for r in rows) != sig["rowid_sum"]:
+            return None
+        if max([old["max_created_at"]] + [r["created_at"] for r in rows]) != sig["max_created_at"]:
+            return None
+        groups: List[List[Any]] = [[] for _ in range(self.num_shards)]
+        for r in rows:
+            groups[shard_of(r["doc_id"], self.num_shards)].append(r)
+        return [(coll.state.shards[i], [], groups[i]) for i in range(self.num_shards)]
+
+    def _diff_plan(self, coll: CollectionIndex, trusted: List[bool]):
+        rows = fetchall("SELECT id, doc_id FROM chunks WHERE collection = ? ORDER BY rowid ASC", (coll.name,))
+        groups: List[List[Any]] = [[] for _ in range(self.num_shards)]
+        for r in rows:
+            groups[shard_of(r["doc_id"], self.num_shards)].append(r)
+        plan = []
+        for i, group in enumerate(groups):
+            cur = coll.state.shards[i]
+            if not trusted[i]:
+                plan.append((None, [], group))
+                continue
+            cur_ids = cur.faiss.chunk_ids.tolist()
+            db_ids = {r["id"] for r in group}
+            known = set(cur_ids)
+            removed = [cid for cid in cur_ids if cid not in db_ids]
+            added = [r for r in group if r["id"] not in known]
+            plan.append((cur, removed, added))
+        return plan
 
-        qv = self.embedder.encode([query], convert_to_numpy=True, normalize_embeddings=True).astype(np.float32)
-        vec_hits = self.faiss.search(qv, max(top_k * 4, top_k))
-        bm_hits = self.bm25.search(query, max(top_k * 4, top_k))
+    def _encode(self, texts: List[str], bulk: bool = False, lengths: Optional[List[int]] = None) -> np.ndarray:
+        embedder = self.bulk_embedder if bulk else self.embedder
+        return np.asarray(embedder.encode(texts, batch_size=64, lengths=lengths), dtype=np.float32)
 
+    def _encode_into(self, store: FaissStore, rows: List[Any]):
+        step = max(1, settings.embed_batch_size)
+        start = 0
+        while start < len(rows):
+            size = step
+            if store.index is None or not store.index.is_trained:
+                size = max(step, settings.quant_train_size)
+            batch = [r["id"] for r in rows[start:start + size]]
+            rows_of = fetch_rows(batch, "text, token_count")
+            texts = [rows_of[cid]["text"] if cid in rows_of else "" for cid in batch]
+            lengths = [rows_of[cid]["token_count"] if cid in rows_of and rows_of[cid]["token_count"] is not None
+                       else (len(texts[i]) + 3) // 4 for i, cid in enumerate(batch)]
+            store.add(self._encode(texts, bulk=True, lengths=lengths), batch)
+            start += len(batch)
+
+    def warmup(self):
+        self.ensure_loaded()
+        if self.fts is not None:
+            self.fts.ensure_schema()
+        _ = self.embedder
+        _ = self.reranker
+
+    def search(
+        self,
+        query: str,
+        top_k: int,
+        params: Optional[SearchParams] = None,
+        timings: Optional[Dict[str, float]] = None,
+    ) -> List[Dict[str, Any]]:
+        return self.search_batch([query], top_k, params, timings)[0]
+
+    def search_batch(
+        self,
+        queries: List[str],
+        top_k: int,
+        params: Optional[SearchParams] = None,
+        timings: Optional[Dict[str, float]] = None,
+    ) -> List[List[Dict[str, Any]]]:
+        params = params or SearchParams()
+        if self.lookup(params.collection) is None:
+            return [[] for _ in queries]
+        coll = self.ensure_loaded(params.collection)
+        self.maybe_refresh(coll)
+        return self._search(coll, coll.state, queries, top_k, params, timings)
+
+    def _search(
+        self,
+        coll: CollectionIndex,
+        state: IndexState,
+        queries: List[str],
+        top_k: int,
+        params: SearchParams,
+        timings: Optional[Dict[str, float]] = None,
+    ) -> List[List[Dict[str, Any]]]:
+        tm = timings if timings is not None else {}
+        alpha = settings.hybrid_alpha if params.hybrid_alpha is None else params.hybrid_alpha
+        cand_k = max(top_k * params.candidate_mult, top_k)
+        rescore = settings.binary_rescore_mult if params.rescore_mult is None else params.rescore_mult
+        norm_queries = [normalize_text(q) for q in queries]
+        results: List[List[Dict[str, Any]]] = [[] for _ in queries]
+        live = [i for i, q in enumerate(norm_queries) if q]
+        if not live or state.size() == 0:
+            return results
+
+        keys = {i: (coll.name, state.generation, norm_queries[i], top_k, alpha, cand_k, params.rerank, rescore) for i in live}
+        if params.use_cache:
+            for i in list(live):
+                cached = self.result_cache.get(keys[i])
+                if cached is not None:
+                    results[i] = [dict(h) for h in cached]
+                    live.remove(i)
+        tm["cached"] = len(keys) - len(live)
+        if not live:
+            return results
+
+        t0 = time.perf_counter()
+        live_queries = [norm_queries[i] for i in live]
+        qv = self._embed_queries(live_queries, params.use_cache)
+        t1 = time.perf_counter()
+        per_shard = self._fanout(state.shards, qv, live_queries, cand_k, rescore)
+        t2 = time.perf_counter()
+
+        fused = []
+        for pos in range(len(live)):
+            vec_hits = merge_hits([res[pos][0] for res in per_shard], cand_k)
+            if self.fts is not None:
+                bm_hits = self.fts.search(live_queries[pos], cand_k, coll.name)
+            else:
+                bm_hits = merge_hits([res[pos][1] for res in per_shard], cand_k)
+            fused.append(self._fuse(vec_hits, bm_hits, alpha)[:cand_k])
+
+        ids = sorted({cid for keep in fused for cid, _, _, _ in keep})
+        row_map = self._fetch_chunk_rows(ids)
+        t3 = time.perf_counter()
+
+        for pos, i in enumerate(live):
+            out = []
+            for cid, hs, vs, bs in fused[pos]:
+                r = row_map.get(cid)
+                if not r:
+                    continue
+                out.append({
+                    "chunk_id": r["chunk_id"],
+                    "doc_id": r["doc_id"],
+                    "original_name": r["original_name"],
+                    "filename": r["filename"],
+                    "chunk_index": int(r["chunk_index"]),
+                    "page_start": r["page_start"],
+                    "page_end": r["page_end"],
+                    "section": r["section"],
+                    "score": float(hs),
+                    "vec_score": float(vs),
+                    "bm25_score": float(bs),
+                    "text": r["text"]
+                })
+            out = self._dedup_results(out)
+            if params.rerank:
+                out = self.reranker.rerank(norm_queries[i], out)
+            out = out[:top_k]
+            if params.use_cache:
+                self.result_cache.put(keys[i], out)
+            results[i] = [dict(h) for h in out]
+        t4 = time.perf_counter()
+        tm["embed_ms"] = (t1 - t0) * 1000.0
+        tm["ann_ms"] = (t2 - t1) * 1000.0
+        tm["fuse_ms"] = (t3 - t2) * 1000.0
+        tm["rerank_ms"] = (t4 - t3) * 1000.0
+        return results
+
+    def _embed_queries(self, queries: List[str], use_cache: bool = True) -> np.ndarray:
+        vecs = [self.embed_cache.get(q) if use_cache else None for q in queries]
+        miss = [i for i, v in enumerate(vecs) if v is None]
+        if miss:
+            fresh = self._encode([queries[i] for i in miss])
+            for row, i in zip(fresh, miss):
+                vecs[i] = row
+                if use_cache:
+                    self.embed_cache.put(queries[i], row)
+        return np.stack(vecs).astype(np.float32, copy=False)
+
+    def prewarm(self, coll: CollectionIndex, state: IndexState, queries: List[Tuple[str, int, SearchParams]]) -> int:
+        groups: Dict[Tuple[Any, ...], List[str]] = {}
+        for query, top_k, params in queries:
+            groups.setdefault((top_k, params.hybrid_alpha, params.candidate_mult, params.rerank, params.rescore_mult), []).append(query)
+        done = 0
+        for (top_k, alpha, cand, rerank, rescore), qs in groups.items():
+            params = SearchParams(hybrid_alpha=alpha, candidate_mult=cand, rerank=rerank, collection=coll.name,
+                                  rescore_mult=rescore)
+            for start in range(0, len(qs), 32):
+                self._search(coll, state, qs[start:start + 32], top_k, params)
+                done += len(qs[start:start + 32])
+        return done
+
+    def cache_stats(self) -> Dict[str, Any]:
+        return {
+            "embed": self.embed_cache.stats(),
+            "result": self.result_cache.stats(),
+            "rerank": self.reranker.cache.stats() if self._reranker is not None else None,
+        }
+
+    def _fanout(self, shards: List[Any], qv: np.ndarray, queries: List[str], top_k: int, rescore_mult: int):
+        if len(shards) == 1 or self._pool is None:
+            return [s.search_batch(qv, queries, top_k, rescore_mult) for s in shards]
+        futures = [self._pool.submit(s.search_batch, qv, queries, top_k, rescore_mult) for s in shards]
+        return [f.result() for f in futures]
+
+    def _fuse(self, vec_hits: List[Tuple[str, float]], bm_hits: List[Tuple[str, float]], alpha: float):
         vec_map = {i: s for i, s in vec_hits}
         bm_map = {i: s for i, s in bm_hits}
 
@@ -98,45 +656,26 @@ class RetrievalService:
             b = bm_map.get(idx, None)
             vs = norm(v, vmin, vmax) if v is not None else 0.0
             bs = norm(b, bmin, bmax) if b is not None else 0.0
-            score = settings.hybrid_alpha * vs + (1.0 - settings.hybrid_alpha) * bs
+            score = alpha * vs + (1.0 - alpha) * bs
             scored.append((idx, float(score), float(v or 0.0), float(b or 0.0)))
         scored.sort(key=lambda x: x[1], reverse=True)
+        return scored
 
-        keep = scored[:max(top_k * 4, top_k)]
-        ids = [self.faiss.meta[i]["chunk_id"] for i, _, _, _ in keep]
-        rows = fetchall(
-            """SELECT c.id as chunk_id, c.doc_id, c.chunk_index, c.page_start, c.page_end, c.section, c.text,
-                       d.original_name, d.filename
-                FROM chunks c JOIN documents d ON d.id = c.doc_id
-                WHERE c.id IN (%s)
-            """ % ",".join(["?"] * len(ids)),
-            ids
-        )
-        row_map = {r["chunk_id"]: r for r in rows}
-        out = []
-        for idx, hs, vs, bs in keep:
-            cid = self.faiss.meta[idx]["chunk_id"]
-            r = row_map.get(cid)
-            if not r:
-                continue
-            out.append({
-                "chunk_id": r["chunk_id"],
-                "doc_id": r["doc_id"],
-                "original_name": r["original_name"],
-                "filename": r["filename"],
-                "chunk_index": int(r["chunk_index"]),
-                "page_start": r["page_start"],
-                "page_end": r["page_end"],
-                "section": r["section"],
-                "score": float(hs),
-                "vec_score": float(vs),
-                "bm25_score": float(bs),
-                "text": r["text"]
-            })
-
-        out = self._dedup_results(out)
-        out = self.reranker.rerank(query, out)
-        return out[:top_k]
+    def _fetch_chunk_rows(self, ids: List[str]) -> Dict[str, Any]:
+        out = {}
+        for start in range(0, len(ids), 500):
+            part = ids[start:start + 500]
+            rows = fetchall(
+                """SELECT c.id as chunk_id, c.doc_id, c.chunk_index, c.page_start, c.page_end, c.section, c.text,
+                           d.original_name, d.filename
+                    FROM chunks c JOIN documents d ON d.id = c.doc_id
+                    WHERE c.id IN (%s)
+                """ % ",".join(["?"] * len(part)),
+                part
+            )
+            for r in rows:
+                out[r["chunk_id"]] = r
+        return out
 
     def _dedup_results(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         seen = set()
@@ -0,0 +1,381 @@
+import os
+import sys
+import time
+import hashlib
+import ipaddress
+import threading
+import multiprocessing
+from multiprocessing.connection import Listener, Client
+from typing import List, Tuple, Dict, Any, Optional, Iterable
+
+import numpy as np
+
+from ..db import fetchall, executemany
+from .segments import SegmentStore, live_diff
+from .bm25 import BM25Index, tokenize
+from .vocab import vocabulary, pack_ids, unpack_ids
+
+PUBLIC_AUTHKEYS = (b"", b"second-brain")
+MIN_AUTHKEY_BYTES = 16
+
+Hits = List[Tuple[str, float]]
+
+def shard_of(doc_id: str, num_shards: int) -> int:
+    if num_shards <= 1:
+        return 0
+    h = hashlib.blake2b(doc_id.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(h, "big") % num_shards
+
+def shard_dir(gen_dir: str, shard_id: int) -> str:
+    return os.path.join(gen_dir, "shard-%02d" % shard_id)
+
+def check_authkey(authkey: bytes):
+    if authkey in PUBLIC_AUTHKEYS or len(authkey) < MIN_AUTHKEY_BYTES:
+        raise ValueError(f"shard RPC needs a secret authkey of at least {MIN_AUTHKEY_BYTES} bytes "
+                         "(set SHARD_AUTHKEY); the connection unpickles whatever the peer sends")
+
+def is_loopback(host: str) -> bool:
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+def fetch_rows(ids: Iterable[str], columns: str) -> Dict[str, Any]:
+    ids = list(ids)
+    out = {}
+    for start in range(0, len(ids), 500):
+        part = ids[start:start + 500]
+        rows = fetchall("SELECT id, %s FROM chunks WHERE id IN (%s)" % (columns, ",".join(["?"] * len(part))), part)
+        for r in rows:
+            out[r["id"]] = r
+    return out
+
+def fetch_texts(ids: Iterable[str]) -> Dict[str, str]:
+    return {cid: r["text"] for cid, r in fetch_rows(ids, "text").items()}
+
+def fetch_terms(ids: Iterable[str]) -> Dict[str, List[int]]:
+    rows = fetch_rows(ids, "term_ids")
+    return {cid: unpack_ids(r["term_ids"]) for cid, r in rows.items() if r["term_ids"] is not None}
+
+def backfill_terms(collection: str, batch: int = 500) -> int:
+    done = 0
+    while True:
+        rows = fetchall("SELECT id, text FROM chunks WHERE collection = ? AND term_ids IS NULL LIMIT ?", (collection, batch))
+        if not rows:
+            return done
+        terms = {r["id"]: tokenize(r["text"] or "") for r in rows}
+        ids_of = vocabulary.intern(t for toks in terms.values() for t in toks)
+        executemany("UPDATE chunks SET term_ids = ? WHERE id = ?",
+                    [(pack_ids([ids_of[t] for t in toks]), cid) for cid, toks in terms.items()])
+        done += len(rows)
+
+def merge_hits(lists: List[Hits], top_k: int) -> Hits:
+    best: Dict[str, float] = {}
+    for hits in lists:
+        for cid, s in hits:
+            if cid not in best or s > best[cid]:
+                best[cid] = s
+    return sorted(best.items(), key=lambda x: x[1], reverse=True)[:top_k]
+
+def sync_bm25(bm25: BM25Index, before: SegmentStore, after: SegmentStore):
+    removed, added = live_diff(before, after)
+    bm25.vocab = vocabulary
+    bm25.remove(removed.tolist())
+    fresh = [cid for cid in added.tolist() if cid not in bm25]
+    terms = fetch_terms(fresh)
+    ready = [cid for cid in fresh if cid in terms]
+    bm25.add_terms([terms[cid] for cid in ready], ready)
+
+class Shard:
+    def __init__(self, shard_id: int, faiss: SegmentStore, bm25: BM25Index):
+        self.shard_id = shard_id
+        self.faiss = faiss
+        self.bm25 = bm25
+        self.generation = 0
+
+    def __len__(self) -> int:
+        return len(self.faiss)
+
+    @classmethod
+    def empty(cls, shard_id: int, path: str = "") -> "Shard":
+        return cls(shard_id, SegmentStore(path, mmap=False), BM25Index())
+
+    @classmethod
+    def load(cls, shard_id: int, path: str, mmap: bool, with_bm25: bool = True, prev: Optional["Shard"] = None) -> "Shard":
+        store = SegmentStore(path, mmap=mmap)
+        if not store.exists():
+            return cls(shard_id, store, BM25Index())
+        store.load(prev.faiss if prev is not None else None)
+        if not with_bm25:
+            return cls(shard_id, store, BM25Index())
+        if prev is not None and len(prev.bm25) == len(prev.faiss):
+            bm25, before = prev.bm25, prev.faiss
+        else:
+            bm25, before = BM25Index(), SegmentStore(path)
+        sync_bm25(bm25, before, store)
+        return cls(shard_id, store, bm25)
+
+    def save(self, path: str):
+        self.faiss.save(path)
+
+    def search_batch(self, qv: np.ndarray, queries: List[str], top_k: int,
+                     rescore_mult: Optional[int] = None) -> List[Tuple[Hits, Hits]]:
+        if not len(self.faiss):
+            return [([], []) for _ in queries]
+        vec = self.faiss.search_batch(qv, top_k, rescore_mult)
+        return [([(self.faiss.chunk_id(i), s) for i, s in vh], self.bm25.search(q, top_k)) for q, vh in zip(queries, vec)]
+
+class _ShardClient:
+    def __init__(self, shard_id: int, address: Tuple[str, int], authkey: bytes):
+        check_authkey(authkey)
+        self.shard_id = shard_id
+        self.address = address
+        self.authkey = authkey
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def call(self, *msg):
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._conn is None:
+                        self._conn = Client(self.address, authkey=self.authkey)
+                    self._conn.send(msg)
+                    ok, payload = self._conn.recv()
+                    break
+                except (EOFError, OSError):
+                    self._conn = None
+                    if attempt:
+                        raise
+        if not ok:
+            raise RuntimeError(f"shard {self.shard_id}: {payload}")
+        return payload
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                try:
+                    self._conn.send(("bye",))
+                except OSError:
+                    pass
+                self._conn.close()
+                self._conn = None
+
+class RemoteShard:
+    def __init__(self, shard_id: int, address: Tuple[str, int], authkey: bytes, collection: str = "default",
+                 client: Optional[_ShardClient] = None, generation: Optional[int] = None):
+        self.shard_id = shard_id
+        self.address = address
+        self.authkey = authkey
+        self.collection = collection
+        self.generation = generation
+        self._client = client or _ShardClient(shard_id, address, authkey)
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _call(self, *msg):
+        return self._client.call(*msg)
+
+    def for_collection(self, collection: str, generation: Optional[int] = None) -> "RemoteShard":
+        return RemoteShard(self.shard_id, self.address, self.authkey, collection, self._client, generation)
+
+    def load(self, path: str, generation: int):
+        self._size = int(self._call("load", self.collection, path, generation))
+
+    def stage(self, path: str, generation: int):
+        self._size = int(self._call("stage", self.collection, path, generation))
+
+    def activate(self, generation: int):
+        self._call("activate", self.collection, generation)
+
+    def unload(self):
+        self._call("unload", self.collection)
+        self._size = 0
+
+    def search_batch(self, qv: np.ndarray, queries: List[str], top_k: int,
+                     rescore_mult: Optional[int] = None) -> List[Tuple[Hits, Hits]]:
+        return self._call("search_batch", self.collection, qv, queries, top_k, rescore_mult, self.generation)
+
+    def close(self):
+        self._client.close()
+
+class ShardServer:
+    def __init__(self, shard_id: int, address: Tuple[str, int], authkey: bytes, mmap: bool = True, with_bm25: bool = True,
+                 allow_remote: bool = False):
+        check_authkey(authkey)
+        if not allow_remote and not is_loopback(address[0]):
+            raise ValueError(f"refusing to bind shard {shard_id} to non-loopback address {address[0]!r} "
+                             "without a configured SHARD_AUTHKEY")
+        self.shard_id = shard_id
+        self.listener = Listener(address, authkey=authkey)
+        self.mmap = mmap
+        self.with_bm25 = with_bm25
+        self.shards: Dict[str, Shard] = {}
+        self.staged: Dict[str, Shard] = {}
+        self._load_lock = threading.Lock()
+
+    def serve_forever(self):
+        while True:
+            try:
+                conn = self.listener.accept()
+            except Exception:
+                continue
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn):
+        with conn:
+            while True:
+                try:
+                    msg = conn.recv()
+                except (EOFError, OSError):
+                    return
+                if msg[0] == "bye":
+                    return
+                try:
+                    conn.send((True, self._dispatch(msg)))
+                except Exception as e:
+                    conn.send((False, repr(e)))
+
+    def _pick(self, collection: str, generation: Optional[int]) -> Optional[Shard]:
+        cur = self.shards.get(collection)
+        if generation is not None and (cur is None or cur.generation != generation):
+            staged = self.staged.get(collection)
+            if staged is not None and staged.generation == generation:
+                return staged
+        return cur
+
+    def _stage(self, collection: str, path: str, generation: int) -> Shard:
+        shard = self._pick(collection, generation)
+        if shard is None or shard.generation != generation:
+            prev = self.staged.get(collection) or self.shards.get(collection)
+            shard = Shard.load(self.shard_id, path, self.mmap, self.with_bm25, prev)
+            shard.generation = generation
+            self.staged[collection] = shard
+        return shard
+
+    def _activate(self, collection: str, generation: int) -> int:
+        staged = self.staged.get(collection)
+        if staged is not None and staged.generation == generation:
+            self.shards[collection] = self.staged.pop(collection)
+        cur = self.shards.get(collection)
+        return len(cur) if cur is not None else 0
+
+    def _dispatch(self, msg):
+        op = msg[0]
+        if op == "search_batch":
+            _, collection, qv, queries, top_k, rescore_mult, generation = msg
+            shard = self._pick(collection, generation)
+            if shard is None:
+                return [([], []) for _ in queries]
+            return shard.search_batch(qv, queries, top_k, rescore_mult)
+        if op == "stage":
+            _, collection, path, generation = msg
+            with self._load_lock:
+                return len(self._stage(collection, path, generation))
+        if op == "activate":
+            _, collection, generation = msg
+            with self._load_lock:
+                return self._activate(collection, generation)
+        if op == "load":
+            _, collection, path, generation = msg
+            with self._load_lock:
+                self._stage(collection, path, generation)
+                return self._activate(collection, generation)
+        if op == "unload":
+            _, collection = msg
+            with self._load_lock:
+                self.shards.pop(collection, None)
+                self.staged.pop(collection, None)
+            return len(self.shards)
+        if op == "ping":
+            return len(self.shards)
+        raise ValueError(f"unknown op {op}")
+
+def serve_shard(shard_id: int, host: str, port: int, authkey: bytes, mmap: bool = True, with_bm25: bool = True,
+                allow_remote: bool = False):
+    ShardServer(shard_id, (host, port), authkey, mmap=mmap, with_bm25=with_bm25, allow_remote=allow_remote).serve_forever()
+
+def parse_addresses(spec: str) -> List[Tuple[str, int]]:
+    out = []
+    for part in (spec or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        host, _, port = part.rpartition(":")
+        out.append((host or "127.0.0.1", int(port)))
+    return out
+
+class LocalShardCluster:
+    def __init__(self, num_shards: int, base_port: int, authkey: bytes = b"", host: str = "127.0.0.1", mmap: bool = True,
+                 with_bm25: bool = True):
+        if not is_loopback(host):
+            raise ValueError("LocalShardCluster only binds loopback addresses")
+        self.num_shards = num_shards
+        self.host = host
+        self.base_port = base_port
+        self.authkey = authkey if authkey not in PUBLIC_AUTHKEYS else os.urandom(32)
+        self.mmap = mmap
+        self.with_bm25 = with_bm25
+        self.procs: List[multiprocessing.Process] = []
+
+    @property
+    def addresses(self) -> List[Tuple[str, int]]:
+        return [(self.host, self.base_port + i) for i in range(self.num_shards)]
+
+    def start(self) -> List[RemoteShard]:
+        ctx = multiprocessing.get_context("spawn")
+        for i, (host, port) in enumerate(self.addresses):
+            p = ctx.Process(target=serve_shard, args=(i, host, port, self.authkey, self.mmap, self.with_bm25), daemon=True)
+            p.start()
+            self.procs.append(p)
+        shards = [RemoteShard(i, addr, self.authkey) for i, addr in enumerate(self.addresses)]
+        for s in shards:
+            self._wait_ready(s)
+        return shards
+
+    def _wait_ready(self, shard: RemoteShard, timeout: float = 30.0):
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                shard._call("ping")
+                return
+            except (OSError, EOFError):
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.1)
+
+    def stop(self):
+        for p in self.procs:
+            p.terminate()
+        for p in self.procs:
+            p.join(timeout=5)
+        self.procs = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+def main(argv: List[str]) -> int:
+    if len(argv) < 3:
+        print("usage: python -m app.retrieval.shards <shard_id> <host:port>")
+        return 2
+    from ..config import settings
+    host, port = parse_addresses(argv[2])[0]
+    authkey = settings.shard_authkey.encode("utf-8")
+    try:
+        check_authkey(authkey)
+    except ValueError as e:
+        print(e)
+        return 2
+    serve_shard(int(argv[1]), host, port, authkey, mmap=settings.index_mmap,
+                with_bm25=settings.keyword_backend.strip().lower() != "fts", allow_remote=True)
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv))
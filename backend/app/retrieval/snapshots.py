@@ -0,0 +1,79 @@
+import os
+import re
+import shutil
+import fcntl
+from typing import List
+
+_gen_dir = re.compile(r"^gen-(\d+)$")
+
+class SnapshotStore:
+    def __init__(self, root: str, keep: int = 3):
+        self.root = root
+        self.keep = max(1, keep)
+        self.current_path = os.path.join(root, "CURRENT")
+
+    def path(self, generation: int) -> str:
+        return os.path.join(self.root, "gen-%06d" % generation)
+
+    def current(self) -> int:
+        try:
+            with open(self.current_path, "r", encoding="utf-8") as f:
+                return int(f.read().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def generations(self) -> List[int]:
+        if not os.path.isdir(self.root):
+            return []
+        out = []
+        for name in os.listdir(self.root):
+            m = _gen_dir.match(name)
+            if m:
+                out.append(int(m.group(1)))
+        return sorted(out)
+
+    def begin(self) -> int:
+        gens = self.generations()
+        gen = max(gens[-1] if gens else 0, self.current()) + 1
+        path = self.path(gen)
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.makedirs(path)
+        return gen
+
+    def publish(self, generation: int):
+        tmp = self.current_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(str(generation))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.current_path)
+        self.gc()
+
+    def gc(self):
+        cur = self.current()
+        for g in self.generations():
+            if g < cur - self.keep + 1 or g > cur:
+                shutil.rmtree(self.path(g), ignore_errors=True)
+
+class WriterLock:
+    def __init__(self, path: str):
+        self.path = path
+        self._fh = None
+
+    def acquire(self) -> bool:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        fh = open(self.path, "a+")
+        try:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            fh.close()
+            return False
+        self._fh = fh
+        return True
+
+    def release(self):
+        if self._fh is not None:
+            fcntl.flock(self._fh.fileno(), fcntl.LOCK_UN)
+            self._fh.close()
+            self._fh = None
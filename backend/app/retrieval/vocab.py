@@ -0,0 +1,44 @@
+import threading
+from typing import List, Dict, Iterable
+
+import numpy as np
+
+from ..db import executemany, fetchall
+
+def pack_ids(ids: List[int]) -> bytes:
+    return np.asarray(ids, dtype=np.uint32).tobytes()
+
+def unpack_ids(blob: bytes) -> List[int]:
+    return np.frombuffer(blob, dtype=np.uint32).tolist()
+
+class Vocabulary:
+    def __init__(self):
+        self._ids: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def _load(self, terms: List[str]):
+        for start in range(0, len(terms), 500):
+            part = terms[start:start + 500]
+            rows = fetchall("SELECT id, term FROM terms WHERE term IN (%s)" % ",".join(["?"] * len(part)), part)
+            for r in rows:
+                self._ids[r["term"]] = int(r["id"])
+
+    def intern(self, terms: Iterable[str]) -> Dict[str, int]:
+        with self._lock:
+            missing = [t for t in set(terms) if t not in self._ids]
+            if missing:
+                executemany("INSERT OR IGNORE INTO terms (term) VALUES (?)", [(t,) for t in missing])
+                self._load(missing)
+            return self._ids
+
+    def lookup(self, terms: List[str]) -> List[int]:
+        with self._lock:
+            missing = [t for t in set(terms) if t not in self._ids]
+            if missing:
+                self._load(missing)
+            return [self._ids[t] for t in terms if t in self._ids]
+
+vocabulary = Vocabulary()
@@ -10,5 +10,9 @@ def get_service() -> AppService:
 
 @router.post("/chat")
 async def chat(req: ChatRequest):
-    out = await get_service().chat(req.query, req.top_k, req.style)
+    out = await get_service().chat(req.query, req.top_k, req.style, req.collection, req.mode)
     return out
+
+@router.get("/llm/stats")
+def llm_stats():
+    return get_service().llm_stats()
@@ -0,0 +1,12 @@
+from fastapi import APIRouter
+from ..service import AppService
+
+router = APIRouter(prefix="/collections", tags=["collections"])
+
+def get_service() -> AppService:
+    from ..main import service
+    return service
+
+@router.get("")
+def list_collections():
+    return get_service().list_collections()
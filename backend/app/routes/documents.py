@@ -1,6 +1,9 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from typing import List
+from fastapi import APIRouter, UploadFile, File, HTTPException, Request, Response, Query
+from fastapi.concurrency import run_in_threadpool
+from typing import List, Optional
+import httpx
 
+from ..config import settings
 from ..service import AppService
 
 router = APIRouter(prefix="/documents", tags=["documents"])
@@ -10,13 +13,68 @@ def get_service() -> AppService:
     return service
 
 @router.get("")
-def list_docs():
-    return get_service().list_documents()
+def list_docs(
+    request: Request,
+    response: Response,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    sort: str = "created_at",
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+    prefix: str = "",
+    mime_type: str = "",
+    collection: str = "",
+):
+    svc = get_service()
+    etag = svc.documents_etag(limit, cursor, sort, order, prefix, mime_type, collection)
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    try:
+        page = svc.list_documents(limit, cursor, sort, order, prefix, mime_type, collection)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    response.headers["ETag"] = etag
+    return page
 
 @router.post("/upload")
-async def upload(file: UploadFile = File(...)):
+async def upload(file: UploadFile = File(...), collection: str = "default"):
     content = await file.read()
     if not content:
         raise HTTPException(status_code=400, detail="empty file")
-    doc = get_service().upload_and_index(file.filename or "file", file.content_type or "application/octet-stream", content)
+    svc = get_service()
+    if not svc.retrieval.is_writer:
+        return await _forward_upload(file.filename or "file", file.content_type or "application/octet-stream", content, collection)
+    try:
+        doc = await run_in_threadpool(svc.upload_and_index, file.filename or "file",
+                                      file.content_type or "application/octet-stream", content, collection=collection)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     return doc
+
+@router.delete("/{doc_id}")
+def delete_doc(doc_id: str):
+    svc = get_service()
+    if not svc.retrieval.is_writer:
+        raise HTTPException(status_code=409, detail="read-only worker; send deletes to the writer process")
+    if not svc.delete_document(doc_id):
+        raise HTTPException(status_code=404, detail="document not found")
+    return {"id": doc_id, "deleted": True}
+
+@router.post("/{doc_id}/reindex")
+def reindex(doc_id: str):
+    svc = get_service()
+    if not svc.retrieval.is_writer:
+        raise HTTPException(status_code=409, detail="read-only worker; send reindex requests to the writer process")
+    doc = svc.reingest(doc_id)
+    if doc is None:
+        raise HTTPException(status_code=404, detail="document not found")
+    return doc
+
+async def _forward_upload(name: str, mime_type: str, content: bytes, collection: str):
+    if not settings.writer_url.strip():
+        raise HTTPException(status_code=409, detail="read-only worker; send uploads to the writer process")
+    url = settings.writer_url.strip().rstrip("/") + "/documents/upload"
+    async with httpx.AsyncClient(timeout=180.0) as client:
+        r = await client.post(url, files={"file": (name, content, mime_type)}, params={"collection": collection})
+    if r.status_code >= 400:
+        raise HTTPException(status_code=r.status_code, detail=r.text)
+    return r.json()
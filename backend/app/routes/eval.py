@@ -12,6 +12,27 @@ def get_service() -> AppService:
 def run_eval(req: EvalRequest):
     if not req.items:
         raise HTTPException(status_code=400, detail="no items")
-    items = [it.model_dump() for it in req.items]
-    m = get_service().build_eval_metrics(items, req.top_k)
+    m = get_service().evals.run(**_run_args(req))
     return m
+
+@router.post("/jobs")
+def submit_eval(req: EvalRequest):
+    if not req.items:
+        raise HTTPException(status_code=400, detail="no items")
+    return get_service().evals.submit(req.model_dump())
+
+@router.get("/jobs/{job_id}")
+def get_eval_job(job_id: str):
+    job = get_service().evals.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="job not found")
+    return job
+
+def _run_args(req: EvalRequest):
+    return {
+        "items": [it.model_dump() for it in req.items],
+        "top_k": req.top_k,
+        "batch_size": req.batch_size,
+        "config": req.config.model_dump() if req.config else None,
+        "compare_with": req.compare_with.model_dump() if req.compare_with else None,
+    }
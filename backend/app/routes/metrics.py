@@ -0,0 +1,75 @@
+from typing import List, Dict, Any
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+router = APIRouter(tags=["metrics"])
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+def _labels(**kw) -> str:
+    return "{" + ",".join(f'{k}="{v}"' for k, v in kw.items()) + "}"
+
+def _summary(lines: List[str], name: str, hist, **labels):
+    for q in QUANTILES:
+        lines.append(f"{name}{_labels(**labels, quantile=q)} {hist.percentile(q):.3f}")
+    lines.append(f"{name}_sum{_labels(**labels)} {hist.total:.3f}")
+    lines.append(f"{name}_count{_labels(**labels)} {hist.count}")
+
+def render() -> str:
+    from ..main import admission, service
+    lines: List[str] = []
+    gauges = [
+        ("admission_active", "active", "requests currently running"),
+        ("admission_queue_depth", "waiting", "requests waiting for a slot"),
+        ("admission_limit", "limit", "concurrency limit"),
+    ]
+    counters = [
+        ("admission_admitted_total", "admitted", "requests admitted"),
+        ("admission_shed_total", "shed", "requests shed because the queue was full"),
+        ("admission_rate_limited_total", "rate_limited", "requests rejected by the per-client token bucket"),
+        ("admission_timeouts_total", "timed_out", "requests that gave up waiting in the queue"),
+    ]
+    for name, attr, help_ in gauges + counters:
+        lines.append(f"# HELP {name} {help_}")
+        lines.append(f"# TYPE {name} {'counter' if name.endswith('_total') else 'gauge'}")
+        for cls, pool in admission.pools.items():
+            lines.append(f"{name}{_labels(**{'class': cls})} {getattr(pool, attr)}")
+    lines.append("# TYPE admission_active_all gauge")
+    lines.append(f"admission_active_all {admission.active}")
+
+    lines.append("# HELP admission_latency_ms request latency after admission")
+    lines.append("# TYPE admission_latency_ms summary")
+    for cls, pool in admission.pools.items():
+        _summary(lines, "admission_latency_ms", pool.latency, **{"class": cls})
+    lines.append("# HELP admission_queue_wait_ms time spent waiting for a slot")
+    lines.append("# TYPE admission_queue_wait_ms summary")
+    for cls, pool in admission.pools.items():
+        _summary(lines, "admission_queue_wait_ms", pool.queue_wait, **{"class": cls})
+
+    llm_stats = getattr(service.llm, "stats_by_name", {})
+    if llm_stats:
+        lines.append("# TYPE llm_latency_ms summary")
+        for name, st in llm_stats.items():
+            _summary(lines, "llm_latency_ms", st.latency, provider=name)
+        lines.append("# TYPE llm_errors_total counter")
+        for name, st in llm_stats.items():
+            lines.append(f"llm_errors_total{_labels(provider=name)} {st.errors}")
+
+    caches: Dict[str, Any] = service.retrieval.cache_stats()
+    for metric, key in (("cache_hits_total", "hits"), ("cache_misses_total", "misses")):
+        lines.append(f"# TYPE {metric} counter")
+        for name, st in caches.items():
+            if st is not None:
+                lines.append(f"{metric}{_labels(cache=name)} {st[key]}")
+    lines.append("# TYPE query_log_pending gauge")
+    lines.append(f"query_log_pending {service.querylog.stats()['pending']}")
+    return "\n".join(lines) + "\n"
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return PlainTextResponse(render(), media_type="text/plain; version=0.0.4")
+
+@router.get("/admission")
+def admission_stats():
+    from ..main import admission
+    return admission.stats()
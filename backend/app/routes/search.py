@@ -10,5 +10,10 @@ def get_service() -> AppService:
 
 @router.post("/search")
 def search(req: SearchRequest):
-    hits = get_service().search(req.query, req.top_k)
-    return {"query": req.query, "top_k": req.top_k, "sources": hits}
+    hits = get_service().search(req.query, req.top_k, req.collection)
+    return {"query": req.query, "top_k": req.top_k, "collection": req.collection, "sources": hits}
+
+@router.get("/search/stats")
+def search_stats():
+    svc = get_service()
+    return {"caches": svc.retrieval.cache_stats(), "query_log": svc.querylog.stats(), "prewarm": svc.last_prewarm}
@@ -1,6 +1,8 @@
 from typing import Optional, List, Dict, Any
 from pydantic import BaseModel, Field
 
+COLLECTION_PATTERN = r"^[a-z0-9][a-z0-9_-]{0,63}$"
+
 class DocumentOut(BaseModel):
     id: str
     filename: str
@@ -9,7 +11,28 @@ class DocumentOut(BaseModel):
     bytes: int
     sha256: str
     created_at: str
+    collection: str = "default"
     chunks: int = 0
+    chunk_count: int = 0
+    duplicate: bool = False
+    aliases: List[str] = []
+
+class CollectionOut(BaseModel):
+    name: str
+    doc_count: int
+    total_bytes: int
+    chunk_count: int
+    created_at: str
+    resident: bool = False
+    generation: int = 0
+
+class DocumentPage(BaseModel):
+    items: List[DocumentOut]
+    next_cursor: Optional[str] = None
+    total: Optional[int] = None
+    total_bytes: Optional[int] = None
+    total_chunks: Optional[int] = None
+    total_scope: Optional[str] = None
 
 class SourceSpan(BaseModel):
     chunk_id: str
@@ -17,6 +40,8 @@ class SourceSpan(BaseModel):
     original_name: str
     filename: str
     chunk_index: int
+    chunk_end: Optional[int] = None
+    chunk_ids: List[str] = []
     page_start: Optional[int] = None
     page_end: Optional[int] = None
     section: Optional[str] = None
@@ -26,10 +51,12 @@ class SourceSpan(BaseModel):
 class SearchRequest(BaseModel):
     query: str = Field(min_length=1)
     top_k: int = 8
+    collection: str = Field(default="default", pattern=COLLECTION_PATTERN)
 
 class SearchResponse(BaseModel):
     query: str
     top_k: int
+    collection: str = "default"
     sources: List[SourceSpan]
 
 class ChatRequest(BaseModel):
@@ -37,26 +64,62 @@ class ChatRequest(BaseModel):
     top_k: int = 8
     style: str = "concise"
     include_sources: bool = True
+    collection: str = Field(default="default", pattern=COLLECTION_PATTERN)
+    mode: str = Field(default="auto", pattern="^(auto|single|map_reduce)$")
 
 class ChatAnswer(BaseModel):
     answer: str
     sources: List[SourceSpan]
     refused: bool = False
     reason: str = ""
+    context_stats: Optional[Dict[str, Any]] = None
+    llm: Optional[Dict[str, Any]] = None
 
 class EvalItem(BaseModel):
     question: str
     expected_doc_ids: List[str] = []
     expected_chunk_ids: List[str] = []
 
+class RetrievalConfig(BaseModel):
+    name: str = ""
+    hybrid_alpha: Optional[float] = Field(default=None, ge=0.0, le=1.0)
+    candidate_mult: int = Field(default=4, ge=1, le=50)
+    rerank: bool = True
+    collection: str = Field(default="default", pattern=COLLECTION_PATTERN)
+    rescore_mult: Optional[int] = Field(default=None, ge=0, le=1000)
+
 class EvalRequest(BaseModel):
     items: List[EvalItem]
     top_k: int = 8
+    batch_size: int = Field(default=32, ge=1, le=512)
+    config: Optional[RetrievalConfig] = None
+    compare_with: Optional[RetrievalConfig] = None
 
 class EvalMetrics(BaseModel):
+    name: str = ""
     top_k: int
     count: int
     precision_at_k: float
     recall_at_k_docs: float
     recall_at_k_chunks: float
+    mrr: float = 0.0
+    ndcg_at_k: float = 0.0
+    latency_ms: Dict[str, float] = {}
     per_item: List[Dict[str, Any]]
+
+class EvalComparison(BaseModel):
+    top_k: int
+    count: int
+    a: EvalMetrics
+    b: EvalMetrics
+    delta: Dict[str, float]
+
+class EvalJob(BaseModel):
+    id: str
+    status: str
+    total: int
+    done: int
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: str
+    finished_at: Optional[str] = None
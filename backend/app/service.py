@@ -1,81 +1,329 @@
 import os
+import time
+import asyncio
 import uuid
+import sqlite3
+import threading
 import datetime
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Tuple, Iterable
 
 from .config import settings
 from .db import execute, executemany, fetchall, fetchone, scalar
 from .utils.files import sha256_bytes, safe_filename, ensure_dir
-from .utils.text import chunk_by_sentences, soft_dedup, normalize_text
-from .ingest.parsers import parse_pdf, parse_text
-from .retrieval.service import RetrievalService
+from .utils.pagination import encode_cursor, decode_cursor, weak_etag
+from .ingest.parsers import parse_pdf_bytes, decode_text
+from .ingest.chunker import chunk_pages
+from .ingest.blobs import BlobStore
+from .retrieval.service import RetrievalService, SearchParams
+from .retrieval.vocab import vocabulary, pack_ids
+from .retrieval.collection import CollectionIndex, IndexState, DEFAULT_COLLECTION, validate_collection
 from .llm.providers import make_llm
+from .llm.tokens import Tokenizer, make_context_tokenizer, make_embed_tokenizer
+from .llm.context import pack_batches
+from .llm.mapreduce import map_reduce
+from .evaluation.runner import EvalRunner
+from .telemetry.querylog import QueryLog
+
+DOC_SORTS = {
+    "created_at": "created_at",
+    "name": "original_name",
+    "bytes": "bytes",
+    "chunks": "chunk_count",
+}
 
 class AppService:
     def __init__(self):
         ensure_dir(settings.data_dir)
-        ensure_dir(os.path.join(settings.data_dir, "uploads"))
+        self.blobs = BlobStore(os.path.join(settings.data_dir, "blobs"), level=settings.blob_zstd_level)
         self.retrieval = RetrievalService(settings.data_dir)
         self.llm = make_llm()
-        self.retrieval.load_or_build()
+        self.evals = EvalRunner(self.retrieval)
+        self.ready = False
+        self._write_lock = threading.RLock()
+        self._tokenizer: Optional[Tokenizer] = None
+        self._embed_tokenizer: Optional[Tokenizer] = None
+        self.querylog = QueryLog(
+            batch_size=settings.query_log_batch,
+            flush_s=settings.query_log_flush_s,
+            max_rows=settings.query_log_max_rows,
+            enabled=settings.query_log_enabled,
+        )
+        self.last_prewarm: Dict[str, Any] = {}
+        if settings.prewarm_top_n > 0:
+            self.retrieval.on_generation = self.prewarm
+
+    def startup(self):
+        if settings.preload_models:
+            self.retrieval.warmup()
+        else:
+            self.retrieval.ensure_loaded()
+        if settings.prewarm_top_n > 0:
+            coll = self.retrieval.ensure_loaded()
+            try:
+                self.prewarm(coll, coll.state)
+            except Exception:
+                pass
+        self.ready = True
+
+    def prewarm(self, coll: CollectionIndex, state: IndexState):
+        t0 = time.perf_counter()
+        top = self.querylog.top_queries(coll.name, settings.prewarm_top_n, settings.prewarm_window_h * 3600.0)
+        queries = [(q["query"], q["top_k"], SearchParams(collection=coll.name, **q["params"])) for q in top]
+        done = self.retrieval.prewarm(coll, state, queries) if queries else 0
+        self.last_prewarm = {
+            "collection": coll.name,
+            "generation": state.generation,
+            "queries": done,
+            "elapsed_ms": (time.perf_counter() - t0) * 1000.0,
+            "finished_at": datetime.datetime.utcnow().isoformat() + "Z",
+        }
 
-    def list_documents(self) -> List[Dict[str, Any]]:
-        rows = fetchall(
-            """SELECT d.*, (SELECT COUNT(1) FROM chunks c WHERE c.doc_id = d.id) as chunks
-               FROM documents d ORDER BY created_at DESC"""
+    def _log_query(self, kind: str, query: str, top_k: int, params: SearchParams, timings: Dict[str, float],
+                   hits: List[Dict[str, Any]]):
+        self.querylog.record(
+            kind, params.collection, query, top_k,
+            {"hybrid_alpha": params.hybrid_alpha, "candidate_mult": params.candidate_mult,
+             "rerank": params.rerank, "rescore_mult": params.rescore_mult},
+            timings, [h["chunk_id"] for h in hits],
+            self.retrieval.resident().get(params.collection, 0),
         )
-        return [dict(r) for r in rows]
 
-    def upload_and_index(self, original_name: str, mime_type: str, content: bytes) -> Dict[str, Any]:
+    def list_documents(
+        self,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        sort: str = "created_at",
+        order: str = "desc",
+        prefix: str = "",
+        mime_type: str = "",
+        collection: str = "",
+    ) -> Dict[str, Any]:
+        col = DOC_SORTS.get(sort)
+        if col is None:
+            raise ValueError(f"unknown sort {sort!r}, expected one of {sorted(DOC_SORTS)}")
+        desc = order.lower() != "asc"
+        cmp = "<" if desc else ">"
+        direction = "DESC" if desc else "ASC"
+
+        where = []
+        params: List[Any] = []
+        if collection:
+            collection = validate_collection(collection)
+            where.append("collection = ?")
+            params.append(collection)
+        if prefix:
+            where.append("original_name >= ? AND original_name < ?")
+            params += [prefix, prefix + "\uffff"]
+        if mime_type:
+            where.append("mime_type = ?")
+            params.append(mime_type)
+        after = decode_cursor(cursor)
+        if after is not None:
+            where.append(f"({col} {cmp} ? OR ({col} = ? AND id {cmp} ?))")
+            params += [after[0], after[0], after[1]]
+
+        sql = "SELECT *, chunk_count AS chunks FROM documents"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY {col} {direction}, id {direction} LIMIT ?"
+        rows = fetchall(sql, params + [limit + 1])
+
+        items = [dict(r) for r in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            last = items[-1]
+            next_cursor = encode_cursor([last[col], last["id"]])
+        page = {"items": items, "next_cursor": next_cursor, "total": None, "total_bytes": None, "total_chunks": None,
+                "total_scope": None}
+        if prefix or mime_type:
+            return page
+        stats = self.collection_stats(collection) if collection else self.library_stats()
+        page.update({
+            "total": stats["doc_count"],
+            "total_bytes": stats["total_bytes"],
+            "total_chunks": stats["chunk_count"],
+            "total_scope": "collection" if collection else "library",
+        })
+        return page
+
+    def library_stats(self) -> Dict[str, Any]:
+        row = fetchone("SELECT doc_count, total_bytes, chunk_count, version FROM library_stats WHERE id = 1")
+        if row is None:
+            return {"doc_count": 0, "total_bytes": 0, "chunk_count": 0, "version": 0}
+        return dict(row)
+
+    def collection_stats(self, name: str) -> Dict[str, Any]:
+        row = fetchone("SELECT doc_count, total_bytes, chunk_count FROM collections WHERE name = ?", (name,))
+        if row is None:
+            return {"doc_count": 0, "total_bytes": 0, "chunk_count": 0}
+        return dict(row)
+
+    def list_collections(self) -> List[Dict[str, Any]]:
+        resident = self.retrieval.resident()
+        out = []
+        for r in fetchall("SELECT * FROM collections ORDER BY name ASC"):
+            item = dict(r)
+            item["resident"] = item["name"] in resident
+            item["generation"] = resident.get(item["name"], 0)
+            out.append(item)
+        return out
+
+    def documents_etag(self, *params: Any) -> str:
+        return weak_etag(self.library_stats()["version"], *params)
+
+    def _bump_stats(self, docs: int = 0, nbytes: int = 0, chunks: int = 0, collection: str = ""):
+        execute(
+            """UPDATE library_stats SET doc_count = doc_count + ?, total_bytes = total_bytes + ?,
+                   chunk_count = chunk_count + ?, version = version + 1 WHERE id = 1""",
+            (docs, nbytes, chunks)
+        )
+        if collection and (docs or nbytes or chunks):
+            execute(
+                """UPDATE collections SET doc_count = doc_count + ?, total_bytes = total_bytes + ?,
+                       chunk_count = chunk_count + ? WHERE name = ?""",
+                (docs, nbytes, chunks, collection)
+            )
+
+    def upload_and_index(
+        self,
+        original_name: str,
+        mime_type: str,
+        content: bytes,
+        sync_index: bool = True,
+        collection: str = DEFAULT_COLLECTION,
+    ) -> Dict[str, Any]:
+        collection = validate_collection(collection)
+        with self._write_lock:
+            doc = self._ingest(original_name, mime_type, content, collection)
+            if sync_index and not doc.get("duplicate"):
+                self.retrieval.load_or_build(collection)
+            return doc
+
+    def _ingest(self, original_name: str, mime_type: str, content: bytes, collection: str) -> Dict[str, Any]:
+        digest = sha256_bytes(content)
+        existing = fetchone(
+            "SELECT * FROM documents WHERE sha256 = ? AND collection = ? ORDER BY created_at ASC LIMIT 1",
+            (digest, collection)
+        )
+        if existing is not None:
+            return self._link_duplicate(existing, original_name)
+
         doc_id = str(uuid.uuid4())
         created_at = datetime.datetime.utcnow().isoformat() + "Z"
-        digest = sha256_bytes(content)
         fname = safe_filename(original_name)
         stored_name = f"{doc_id}_{fname}"
-        upath = os.path.join(settings.data_dir, "uploads", stored_name)
-        with open(upath, "wb") as f:
-            f.write(content)
+        self.blobs.put(digest, content)
+
+        pages = self._parse(content, mime_type, original_name)
+        if self._is_pdf(mime_type, original_name):
+            self.blobs.put_pages(digest, (text for text, _ in pages))
 
         execute(
-            """INSERT INTO documents (id, filename, original_name, mime_type, bytes, sha256, created_at)
-               VALUES (?, ?, ?, ?, ?, ?, ?)""",
-            (doc_id, stored_name, original_name, mime_type, len(content), digest, created_at)
+            "INSERT OR IGNORE INTO collections (name, doc_count, total_bytes, chunk_count, created_at) VALUES (?, 0, 0, 0, ?)",
+            (collection, created_at)
         )
+        try:
+            execute(
+                """INSERT INTO documents (id, filename, original_name, mime_type, bytes, sha256, created_at, collection)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                (doc_id, stored_name, original_name, mime_type, len(content), digest, created_at, collection)
+            )
+        except sqlite3.IntegrityError:
+            existing = fetchone("SELECT * FROM documents WHERE sha256 = ? AND collection = ?", (digest, collection))
+            if existing is None:
+                raise
+            return self._link_duplicate(existing, original_name)
+        self._bump_stats(docs=1, nbytes=len(content), collection=collection)
 
-        chunks = self._extract_chunks(upath, mime_type, original_name)
-        self._store_chunks(doc_id, chunks)
-        self.retrieval.load_or_build()
+        chunks = self._extract_chunks(pages)
+        self._store_chunks(doc_id, chunks, collection)
         out = fetchone("SELECT * FROM documents WHERE id = ?", (doc_id,))
         return dict(out) if out else {"id": doc_id}
 
-    def _extract_chunks(self, path: str, mime_type: str, original_name: str):
-        lower = original_name.lower()
-        items = []
-        if lower.endswith(".pdf") or mime_type == "application/pdf":
-            pages = parse_pdf(path)
-            for text, page_no in pages:
-                text = normalize_text(text)
-                if not text:
-                    continue
-                parts = chunk_by_sentences(text)
-                parts = soft_dedup(parts)
-                for p in parts:
-                    items.append({"text": p, "page_start": page_no, "page_end": page_no, "section": None})
+    def delete_document(self, doc_id: str, sync_index: bool = True) -> bool:
+        with self._write_lock:
+            doc = fetchone("SELECT * FROM documents WHERE id = ?", (doc_id,))
+            if doc is None:
+                return False
+            execute("DELETE FROM chunks WHERE doc_id = ?", (doc_id,))
+            execute("DELETE FROM document_aliases WHERE doc_id = ?", (doc_id,))
+            execute("DELETE FROM documents WHERE id = ?", (doc_id,))
+            self._bump_stats(docs=-1, nbytes=-int(doc["bytes"]), chunks=-int(doc["chunk_count"]), collection=doc["collection"])
+            if fetchone("SELECT 1 FROM documents WHERE sha256 = ? LIMIT 1", (doc["sha256"],)) is None:
+                self.blobs.delete(doc["sha256"])
+            if sync_index:
+                self.retrieval.load_or_build(doc["collection"])
+            return True
+
+    def reingest(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        with self._write_lock:
+            doc = fetchone("SELECT * FROM documents WHERE id = ?", (doc_id,))
+            if doc is None:
+                return None
+            pages = self._stored_pages(doc)
+            execute("DELETE FROM chunks WHERE doc_id = ?", (doc_id,))
+            execute("UPDATE documents SET chunk_count = 0 WHERE id = ?", (doc_id,))
+            self._bump_stats(chunks=-int(doc["chunk_count"]), collection=doc["collection"])
+            self._store_chunks(doc_id, self._extract_chunks(pages), doc["collection"])
+            self.retrieval.load_or_build(doc["collection"])
+        return dict(doc)
+
+    def _link_duplicate(self, existing, original_name: str) -> Dict[str, Any]:
+        doc_id = existing["id"]
+        if original_name != existing["original_name"]:
+            cur = execute(
+                "INSERT OR IGNORE INTO document_aliases (doc_id, original_name, created_at) VALUES (?, ?, ?)",
+                (doc_id, original_name, datetime.datetime.utcnow().isoformat() + "Z")
+            )
+            if cur.rowcount:
+                self._bump_stats()
+        out = dict(existing)
+        out["duplicate"] = True
+        out["aliases"] = [r["original_name"] for r in fetchall(
+            "SELECT original_name FROM document_aliases WHERE doc_id = ? ORDER BY created_at ASC", (doc_id,)
+        )]
+        return out
+
+    def _is_pdf(self, mime_type: str, original_name: str) -> bool:
+        return original_name.lower().endswith(".pdf") or mime_type == "application/pdf"
+
+    def _parse(self, content: bytes, mime_type: str, original_name: str) -> List[Tuple[str, Optional[int]]]:
+        if self._is_pdf(mime_type, original_name):
+            return parse_pdf_bytes(content)
+        return [(decode_text(content), None)]
+
+    def _stored_pages(self, doc) -> Iterable[Tuple[str, Optional[int]]]:
+        digest = doc["sha256"]
+        is_pdf = self._is_pdf(doc["mime_type"], doc["original_name"])
+        if is_pdf and self.blobs.exists(digest, "pages"):
+            return self.blobs.iter_pages(digest)
+        if self.blobs.exists(digest):
+            content = self.blobs.read(digest)
         else:
-            text = normalize_text(parse_text(path))
-            if text:
-                parts = chunk_by_sentences(text)
-                parts = soft_dedup(parts)
-                for p in parts:
-                    items.append({"text": p, "page_start": None, "page_end": None, "section": None})
-        return items
-
-    def _store_chunks(self, doc_id: str, chunks: List[Dict[str, Any]]):
+            with open(os.path.join(settings.data_dir, "uploads", doc["filename"]), "rb") as f:
+                content = f.read()
+            self.blobs.put(digest, content)
+        pages = self._parse(content, doc["mime_type"], doc["original_name"])
+        if is_pdf:
+            self.blobs.put_pages(digest, (text for text, _ in pages))
+        return pages
+
+    def _extract_chunks(self, pages: Iterable[Tuple[str, Optional[int]]]):
+        return chunk_pages(
+            pages,
+            self.embed_tokenizer,
+            vocabulary,
+            chunk_size=settings.chunk_size,
+            overlap=settings.chunk_overlap,
+            max_tokens=settings.chunk_max_tokens,
+        )
+
+    def _store_chunks(self, doc_id: str, chunks: List[Dict[str, Any]], collection: str = DEFAULT_COLLECTION):
         created_at = datetime.datetime.utcnow().isoformat() + "Z"
         rows = []
         for i, ch in enumerate(chunks):
             cid = str(uuid.uuid4())
-            txt = normalize_text(ch["text"])
+            txt = ch["text"]
             if not txt:
                 continue
             sh = sha256_bytes(txt.encode("utf-8"))
@@ -83,41 +331,86 @@ class AppService:
                 cid, doc_id, i,
                 ch.get("page_start"), ch.get("page_end"),
                 ch.get("section"),
-                txt, len(txt), sh, created_at
+                txt, len(txt), sh, created_at, collection,
+                pack_ids(ch["term_ids"]), ch["token_count"]
             ))
         if rows:
             executemany(
-                """INSERT INTO chunks (id, doc_id, chunk_index, page_start, page_end, section, text, text_len, sha256, created_at)
-                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                """INSERT INTO chunks (id, doc_id, chunk_index, page_start, page_end, section, text, text_len, sha256, created_at, collection,
+                                       term_ids, token_count)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
                 rows
             )
+            execute("UPDATE documents SET chunk_count = chunk_count + ? WHERE id = ?", (len(rows), doc_id))
+            self._bump_stats(chunks=len(rows), collection=collection)
 
-    def search(self, query: str, top_k: int):
-        hits = self.retrieval.search(query, top_k)
+    def search(self, query: str, top_k: int, collection: str = DEFAULT_COLLECTION):
+        t0 = time.perf_counter()
+        params = SearchParams(collection=collection)
+        timings: Dict[str, float] = {}
+        hits = self.retrieval.search(query, top_k, params, timings)
+        timings["total_ms"] = (time.perf_counter() - t0) * 1000.0
+        self._log_query("search", query, top_k, params, timings, hits)
         return hits
 
-    async def chat(self, query: str, top_k: int, style: str):
-        hits = self.retrieval.search(query, top_k)
+    async def chat(self, query: str, top_k: int, style: str, collection: str = DEFAULT_COLLECTION, mode: str = "auto"):
+        t0 = time.perf_counter()
+        params = SearchParams(collection=collection)
+        timings: Dict[str, float] = {}
+        hits = await asyncio.to_thread(self.retrieval.search, query, top_k, params, timings)
         if not hits:
+            timings["total_ms"] = (time.perf_counter() - t0) * 1000.0
+            self._log_query("chat", query, top_k, params, timings, hits)
             return {"answer": "Kaynaklarda bu soruya dair içerik bulamadım.", "sources": [], "refused": True, "reason": "no_sources"}
-        context = self._make_context(hits)
-        if len(context) > settings.max_context_chars:
-            context = context[:settings.max_context_chars]
-        ans = await self.llm.generate(query, context)
+        t1 = time.perf_counter()
+        max_batches = 1 if mode == "single" else settings.map_reduce_max_batches
+        contexts, sources, stats = await asyncio.to_thread(self._make_context, hits, max_batches)
+        t2 = time.perf_counter()
+        if len(contexts) > 1 or (mode == "map_reduce" and contexts):
+            ans, llm_meta = await map_reduce(self.llm, query, contexts, settings.map_reduce_concurrency,
+                                             self.tokenizer, settings.max_context_tokens, settings.max_context_chars)
+        else:
+            ans, llm_meta = await self.llm.generate_with_meta(query, contexts[0] if contexts else "")
+            llm_meta["mode"] = "single"
+        t3 = time.perf_counter()
+        timings.update({
+            "retrieval_ms": (t1 - t0) * 1000.0,
+            "pack_ms": (t2 - t1) * 1000.0,
+            "llm_ms": (t3 - t2) * 1000.0,
+            "total_ms": (t3 - t0) * 1000.0,
+        })
+        self._log_query("chat", query, top_k, params, timings, hits)
         ans2 = self._postprocess_answer(ans, hits)
         refused = "bulamad" in ans2.lower() and len(hits) == 0
-        return {"answer": ans2, "sources": hits, "refused": refused, "reason": ""}
-
-    def _make_context(self, hits: List[Dict[str, Any]]):
-        lines = []
-        for i, h in enumerate(hits, start=1):
-            header = f"[{i}] doc={h['original_name']} chunk={h['chunk_index']}"
-            if h.get("page_start"):
-                header += f" pages={h['page_start']}-{h.get('page_end') or h['page_start']}"
-            lines.append(header)
-            lines.append(h["text"].strip())
-            lines.append("")
-        return "\n".join(lines).strip()
+        return {"answer": ans2, "sources": sources, "refused": refused, "reason": "", "context_stats": stats, "llm": llm_meta}
+
+    def llm_stats(self) -> Dict[str, Any]:
+        stats = getattr(self.llm, "stats", None)
+        out = stats() if stats is not None else {"chain": [self.llm.name], "providers": {}}
+        out["tokenizer"] = {"name": self.tokenizer.name, "fallback": self.tokenizer.fallback}
+        return out
+
+    @property
+    def tokenizer(self) -> Tokenizer:
+        if self._tokenizer is None:
+            self._tokenizer = make_context_tokenizer([x.name for x in getattr(self.llm, "remote", [])])
+        return self._tokenizer
+
+    @property
+    def embed_tokenizer(self) -> Tokenizer:
+        if self._embed_tokenizer is None:
+            self._embed_tokenizer = make_embed_tokenizer()
+        return self._embed_tokenizer
+
+    def _make_context(self, hits: List[Dict[str, Any]], max_batches: int = 1) -> Tuple[List[str], List[Dict[str, Any]], Dict[str, Any]]:
+        return pack_batches(
+            hits,
+            self.tokenizer,
+            settings.max_context_tokens,
+            max_chars=settings.max_context_chars,
+            dedup_threshold=settings.context_dedup_threshold,
+            max_batches=max_batches,
+        )
 
     def _postprocess_answer(self, answer: str, hits: List[Dict[str, Any]]):
         a = (answer or "").strip()
@@ -127,54 +420,4 @@ class AppService:
         return a
 
     def build_eval_metrics(self, items: List[Dict[str, Any]], top_k: int):
-        per = []
-        p_sum = 0.0
-        r_docs_sum = 0.0
-        r_chunks_sum = 0.0
-        for it in items:
-            q = it["question"]
-            exp_docs = set(it.get("expected_doc_ids") or [])
-            exp_chunks = set(it.get("expected_chunk_ids") or [])
-            hits = self.retrieval.search(q, top_k)
-            got_docs = [h["doc_id"] for h in hits]
-            got_chunks = [h["chunk_id"] for h in hits]
-            got_docs_set = set(got_docs)
-            got_chunks_set = set(got_chunks)
-
-            correct = 0
-            if exp_chunks:
-                correct = len(exp_chunks_set & got_chunks_set)
-                denom = max(1, top_k)
-                prec = correct / denom
-                rec_chunks = correct / max(1, len(exp_chunks))
-            else:
-                correct = len(exp_docs & got_docs_set)
-                denom = max(1, top_k)
-                prec = correct / denom
-                rec_chunks = 0.0
-
-            if exp_docs:
-                rec_docs = len(exp_docs & got_docs_set) / max(1, len(exp_docs))
-            else:
-                rec_docs = 0.0
-
-            p_sum += prec
-            r_docs_sum += rec_docs
-            r_chunks_sum += rec_chunks
-            per.append({
-                "question": q,
-                "precision_at_k": prec,
-                "recall_at_k_docs": rec_docs,
-                "recall_at_k_chunks": rec_chunks,
-                "top_docs": got_docs[:min(5, len(got_docs))],
-                "top_chunks": got_chunks[:min(5, len(got_chunks))]
-            })
-        n = max(1, len(items))
-        return {
-            "top_k": top_k,
-            "count": len(items),
-            "precision_at_k": p_sum / n,
-            "recall_at_k_docs": r_docs_sum / n,
-            "recall_at_k_chunks": r_chunks_sum / n,
-            "per_item": per
-        }
+        return self.evals.run(items, top_k)
@@ -0,0 +1,222 @@
+import os
+import time
+import datetime
+import mimetypes
+import threading
+from typing import List, Dict, Any, Optional, Iterator, Tuple
+
+from ..db import execute, fetchone, fetchall
+from ..utils.files import sha256_bytes
+
+SUPPORTED_EXTS = (".pdf", ".md", ".txt")
+
+def _now() -> str:
+    return datetime.datetime.utcnow().isoformat() + "Z"
+
+def _supported(path: str) -> bool:
+    return path.lower().endswith(SUPPORTED_EXTS)
+
+def scan_folder(root: str) -> Iterator[Tuple[str, os.stat_result]]:
+    stack = [root]
+    while stack:
+        cur = stack.pop()
+        try:
+            it = os.scandir(cur)
+        except OSError:
+            continue
+        with it:
+            for entry in it:
+                if entry.name.startswith("."):
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file() and _supported(entry.name):
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    yield os.path.relpath(entry.path, root), st
+
+class FolderSync:
+    def __init__(self, service, root: str, debounce_s: float = 2.0, poll_s: float = 30.0, use_inotify: bool = True,
+                 collection: str = "default", reconcile_s: float = 600.0):
+        self.service = service
+        self.root = os.path.abspath(root)
+        self.collection = collection
+        self.debounce_s = max(0.0, debounce_s)
+        self.poll_s = max(1.0, poll_s)
+        self.reconcile_s = max(self.poll_s, reconcile_s)
+        self.use_inotify = use_inotify
+        self.last_scan: Dict[str, Any] = {}
+        self._pending: Dict[str, float] = {}
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._observer = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        os.makedirs(self.root, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="folder-sync", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join(timeout=5)
+        if self._thread is not None:
+            self._thread.join(timeout=30)
+
+    def notify(self, abs_path: str):
+        rel = os.path.relpath(os.path.abspath(abs_path), self.root)
+        if rel.startswith(".."):
+            return
+        with self._cond:
+            self._pending[rel] = time.monotonic()
+            self._cond.notify_all()
+
+    def reconcile(self) -> Dict[str, Any]:
+        t0 = time.perf_counter()
+        known = {r["path"]: (r["mtime_ns"], r["size"], r["error"] is None)
+                 for r in fetchall("SELECT path, mtime_ns, size, error FROM sync_files")}
+        changed: List[str] = []
+        seen = 0
+        for rel, st in scan_folder(self.root):
+            seen += 1
+            if known.pop(rel, None) != (st.st_mtime_ns, st.st_size, True):
+                changed.append(rel)
+        changed.extend(known.keys())
+        applied = self.apply(changed) if changed else 0
+        self.last_scan = {
+            "files": seen,
+            "changed": len(changed),
+            "applied": applied,
+            "elapsed_ms": (time.perf_counter() - t0) * 1000.0,
+            "finished_at": _now(),
+        }
+        return self.last_scan
+
+    def apply(self, paths: List[str]) -> int:
+        applied = 0
+        for rel in sorted(set(paths)):
+            if self._stop.is_set():
+                break
+            if self._apply_one(rel):
+                applied += 1
+        if applied:
+            self.service.retrieval.load_or_build(self.collection)
+        return applied
+
+    def _apply_one(self, rel: str) -> bool:
+        full = os.path.join(self.root, rel)
+        row = fetchone("SELECT * FROM sync_files WHERE path = ?", (rel,))
+        try:
+            st = os.stat(full) if _supported(rel) else None
+        except OSError:
+            st = None
+
+        if st is None:
+            if row is None:
+                return False
+            execute("DELETE FROM sync_files WHERE path = ?", (rel,))
+            return self._release(row)
+
+        if row is not None and row["error"] is None and row["mtime_ns"] == st.st_mtime_ns and row["size"] == st.st_size:
+            return False
+        try:
+            with open(full, "rb") as f:
+                content = f.read()
+        except OSError:
+            return False
+        digest = sha256_bytes(content)
+        if row is not None and row["sha256"] == digest and row["error"] is None:
+            execute(
+                "UPDATE sync_files SET mtime_ns = ?, size = ?, synced_at = ? WHERE path = ?",
+                (st.st_mtime_ns, st.st_size, _now(), rel)
+            )
+            return False
+
+        released = self._release(row) if row is not None else False
+        doc_id, owned, error = None, 0, None
+        try:
+            mime = mimetypes.guess_type(full)[0] or "text/plain"
+            doc = self.service.upload_and_index(os.path.basename(rel), mime, content, sync_index=False,
+                                                 collection=self.collection)
+            doc_id, owned = doc.get("id"), 0 if doc.get("duplicate") else 1
+        except Exception as e:
+            error = str(e) or e.__class__.__name__
+        execute(
+            """INSERT OR REPLACE INTO sync_files (path, mtime_ns, size, sha256, doc_id, owned, error, synced_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+            (rel, st.st_mtime_ns, st.st_size, digest, doc_id, owned, error, _now())
+        )
+        return released or bool(owned)
+
+    def _release(self, row) -> bool:
+        if not row["owned"] or not row["doc_id"]:
+            return False
+        heir = fetchone(
+            "SELECT path FROM sync_files WHERE doc_id = ? AND path != ? LIMIT 1",
+            (row["doc_id"], row["path"])
+        )
+        if heir is not None:
+            execute("UPDATE sync_files SET owned = 1 WHERE path = ?", (heir["path"],))
+            return False
+        return self.service.delete_document(row["doc_id"], sync_index=False)
+
+    def _take_due(self) -> List[str]:
+        now = time.monotonic()
+        with self._cond:
+            due = [p for p, t in self._pending.items() if now - t >= self.debounce_s]
+            for p in due:
+                del self._pending[p]
+        return due
+
+    def _start_watcher(self):
+        if not self.use_inotify:
+            return None
+        try:
+            from watchdog.observers import Observer
+            from watchdog.events import FileSystemEventHandler
+        except ImportError:
+            return None
+
+        sync = self
+
+        class _Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                if event.is_directory:
+                    return
+                for p in (event.src_path, getattr(event, "dest_path", "")):
+                    if p and _supported(p):
+                        sync.notify(p)
+
+        observer = Observer()
+        observer.daemon = True
+        try:
+            observer.schedule(_Handler(), self.root, recursive=True)
+            observer.start()
+        except OSError:
+            return None
+        return observer
+
+    def _run(self):
+        self._observer = self._start_watcher()
+        self.reconcile()
+        interval = self.poll_s if self._observer is None else self.reconcile_s
+        next_scan = time.monotonic() + interval
+        while not self._stop.is_set():
+            with self._cond:
+                wait = self.debounce_s if self._pending else interval
+                wait = min(wait, max(0.0, next_scan - time.monotonic()))
+                self._cond.wait(timeout=max(0.05, wait))
+            if self._stop.is_set():
+                break
+            due = self._take_due()
+            if due:
+                self.apply(due)
+            if time.monotonic() >= next_scan:
+                self.reconcile()
+                next_scan = time.monotonic() + interval
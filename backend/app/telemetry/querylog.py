@@ -0,0 +1,105 @@
+import json
+import time
+import threading
+from typing import List, Dict, Any, Optional, Tuple
+
+from ..db import executemany, execute, fetchall
+
+class QueryLog:
+    def __init__(self, batch_size: int = 64, flush_s: float = 2.0, max_rows: int = 200000, enabled: bool = True):
+        self.batch_size = max(1, batch_size)
+        self.flush_s = max(0.1, flush_s)
+        self.max_rows = max(0, max_rows)
+        self.enabled = enabled
+        self.written = 0
+        self.dropped = 0
+        self._buf: List[Tuple[Any, ...]] = []
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._since_prune = 0
+
+    def start(self):
+        if not self.enabled or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="query-log", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
+        self.flush()
+
+    def record(
+        self,
+        kind: str,
+        collection: str,
+        query: str,
+        top_k: int,
+        params: Dict[str, Any],
+        latency: Dict[str, float],
+        chunk_ids: List[str],
+        generation: int,
+    ):
+        if not self.enabled:
+            return
+        row = (
+            time.time(), kind, collection, query, top_k,
+            json.dumps(params, sort_keys=True, separators=(",", ":")),
+            json.dumps({k: round(v, 3) for k, v in latency.items()}, sort_keys=True, separators=(",", ":")),
+            ",".join(chunk_ids), generation,
+        )
+        with self._cond:
+            if len(self._buf) >= self.batch_size * 64:
+                self.dropped += 1
+                return
+            self._buf.append(row)
+            if len(self._buf) >= self.batch_size:
+                self._cond.notify_all()
+
+    def flush(self) -> int:
+        with self._cond:
+            rows, self._buf = self._buf, []
+        if not rows:
+            return 0
+        executemany(
+            """INSERT INTO query_log (ts, kind, collection, query, top_k, params, latency, chunk_ids, generation)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            rows
+        )
+        self.written += len(rows)
+        self._since_prune += len(rows)
+        if self.max_rows and self._since_prune >= max(self.batch_size, self.max_rows // 100):
+            self._since_prune = 0
+            execute("DELETE FROM query_log WHERE id <= (SELECT MAX(id) FROM query_log) - ?", (self.max_rows,))
+        return len(rows)
+
+    def top_queries(self, collection: str, limit: int, window_s: float) -> List[Dict[str, Any]]:
+        rows = fetchall(
+            """SELECT query, top_k, params, COUNT(1) AS hits, MAX(ts) AS last_ts
+               FROM query_log WHERE collection = ? AND ts >= ?
+               GROUP BY query, top_k, params
+               ORDER BY hits DESC, last_ts DESC LIMIT ?""",
+            (collection, time.time() - window_s, limit)
+        )
+        return [
+            {"query": r["query"], "top_k": r["top_k"], "params": json.loads(r["params"]), "hits": r["hits"]}
+            for r in rows
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"enabled": self.enabled, "written": self.written, "pending": len(self._buf), "dropped": self.dropped}
+
+    def _run(self):
+        while not self._stop.is_set():
+            with self._cond:
+                if len(self._buf) < self.batch_size:
+                    self._cond.wait(timeout=self.flush_s)
+            try:
+                self.flush()
+            except Exception:
+                pass
@@ -0,0 +1,47 @@
+import bisect
+import threading
+from typing import List, Dict, Any
+
+def log_buckets(lo: float = 1.0, hi: float = 120000.0, factor: float = 1.25) -> List[float]:
+    out = [lo]
+    while out[-1] < hi:
+        out.append(out[-1] * factor)
+    return out
+
+DEFAULT_BUCKETS = log_buckets()
+
+class LatencyHistogram:
+    def __init__(self, buckets: List[float] = DEFAULT_BUCKETS):
+        self.bounds = list(buckets)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, ms: float):
+        i = bisect.bisect_left(self.bounds, ms)
+        with self._lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.total += ms
+
+    def percentile(self, p: float) -> float:
+        with self._lock:
+            if not self.count:
+                return 0.0
+            target = max(1, int(round(p * self.count)))
+            seen = 0
+            for i, c in enumerate(self.counts):
+                seen += c
+                if seen >= target:
+                    return self.bounds[min(i, len(self.bounds) - 1)]
+        return self.bounds[-1]
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "mean_ms": self.total / self.count if self.count else 0.0,
+            "p50_ms": self.percentile(0.50),
+            "p90_ms": self.percentile(0.90),
+            "p99_ms": self.percentile(0.99),
+        }
@@ -0,0 +1,24 @@
+import json
+import base64
+import hashlib
+from typing import Any, List, Optional
+
+def encode_cursor(values: List[Any]) -> str:
+    raw = json.dumps(values, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: Optional[str]) -> Optional[List[Any]]:
+    if not cursor:
+        return None
+    pad = "=" * (-len(cursor) % 4)
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + pad).decode("utf-8"))
+    except Exception:
+        raise ValueError("invalid cursor")
+    if not isinstance(values, list) or len(values) != 2:
+        raise ValueError("invalid cursor")
+    return values
+
+def weak_etag(version: int, *parts: Any) -> str:
+    h = hashlib.sha1(json.dumps(parts, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()[:12]
+    return f'W/"{version}-{h}"'
@@ -0,0 +1,37 @@
+import os
+import sys
+import tempfile
+
+_data = tempfile.mkdtemp(prefix="second-brain-test-")
+os.environ["DATA_DIR"] = _data
+os.environ["DB_PATH"] = os.path.join(_data, "test.db")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+
+import re
+import hashlib
+
+import numpy as np
+import pytest
+
+from app.retrieval.embedders import Embedder
+
+class HashEmbedder(Embedder):
+    dim = 64
+
+    def encode(self, texts, batch_size=64, lengths=None):
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, t in enumerate(texts):
+            for w in re.findall(r"\w+", t.lower()):
+                h = int(hashlib.md5(w.encode()).hexdigest(), 16)
+                out[i, h % self.dim] += 1.0 if (h >> 8) & 1 else -1.0
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        return out / np.maximum(norms, 1e-12)
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+    from app import main
+    main.service.retrieval._embedder = HashEmbedder()
+    with TestClient(main.app) as c:
+        yield c
@@ -0,0 +1,13 @@
+from app.admission.control import client_key, parse_keys
+
+def _scope(headers, ip="10.0.0.7"):
+    return {"headers": [(k.encode(), v.encode()) for k, v in headers], "client": (ip, 5123)}
+
+def test_client_headers_are_trusted_only_for_configured_keys():
+    keys = parse_keys(" team-a , team-b,")
+    assert keys == {"team-a", "team-b"}
+    assert client_key(_scope([("x-api-key", "team-a")]), keys) == "key:team-a"
+    assert client_key(_scope([("x-client-id", "team-b")]), keys) == "key:team-b"
+    assert client_key(_scope([("x-api-key", "made-up")]), keys) == "ip:10.0.0.7"
+    assert client_key(_scope([("x-api-key", "team-a")])) == "ip:10.0.0.7"
+    assert client_key({"headers": []}, keys) == "ip:unknown"
@@ -0,0 +1,44 @@
+import os
+import io
+
+from app.ingest.blobs import BlobStore
+
+def test_reads_and_seeks_across_frame_boundaries(tmp_path):
+    store = BlobStore(str(tmp_path), frame_size=1000, level=3)
+    content = bytes((i * 7 + i // 13) % 251 for i in range(3500))
+    store.put("abc", content)
+    assert store.read("abc") == content
+    with store.open("abc") as r:
+        assert r.size == len(content) and len(r.entries) == 4
+        r.seek(990)
+        assert r.read(25) == content[990:1015]
+        assert r.tell() == 1015
+        r.seek(-600, os.SEEK_END)
+        assert r.read() == content[-600:]
+        r.seek(-1500, os.SEEK_CUR)
+        assert r.read(2100) == content[2000:3500]
+        r.seek(1999)
+        buf = bytearray(2)
+        assert r.readinto(buf) == 2 and bytes(buf) == content[1999:2001]
+        r.seek(5000)
+        assert r.read(10) == b""
+    with io.BufferedReader(store.open("abc"), buffer_size=333) as f:
+        assert f.read() == content
+
+def test_empty_blob_round_trips(tmp_path):
+    store = BlobStore(str(tmp_path), frame_size=1000)
+    store.put("empty", b"")
+    assert store.read("empty") == b""
+
+def test_pages_read_by_number_and_range(tmp_path):
+    store = BlobStore(str(tmp_path), frame_size=1000)
+    pages = ["first page", "", "üçüncü sayfa " * 200, "fourth"]
+    store.put_pages("pdf", pages)
+    assert store.page_count("pdf") == 4
+    assert [store.read_page("pdf", n) for n in (1, 2, 3, 4)] == pages
+    assert list(store.iter_pages("pdf", 2, 3)) == [("", 2), (pages[2], 3)]
+    assert list(store.iter_pages("pdf", 3, 99)) == [(pages[2], 3), ("fourth", 4)]
+    assert list(store.iter_pages("pdf", 0, 1)) == [("first page", 1)]
+    assert list(store.iter_pages("pdf")) == [(p, i) for i, p in enumerate(pages, 1)]
+    store.delete("pdf")
+    assert not store.exists("pdf", "pages")
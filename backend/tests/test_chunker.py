@@ -0,0 +1,69 @@
+import re
+
+from app.ingest.chunker import iter_blocks
+
+def test_fenced_code_is_its_own_block():
+    text = "Intro line\nstill intro\n```python\nx = 1\n\ny = 2\n```\nAfter the fence\n\nNext paragraph"
+    blocks = [b for _, b, _ in iter_blocks([(text, 1)])]
+    assert blocks == [
+        "Intro line still intro",
+        "```python x = 1  y = 2 ```",
+        "After the fence",
+        "Next paragraph",
+    ]
+
+def test_embed_batches_are_ordered_by_stored_token_counts():
+    from app.retrieval.embedders import length_order
+    texts = ["short", "a much longer sentence here", "mid length"]
+    assert length_order(texts) == [1, 2, 0]
+    assert length_order(texts, [40, 3, 12]) == [0, 2, 1]
+    assert length_order(texts, [1, 2]) == [1, 2, 0]
+
+def _chunks(pages, **kw):
+    from app.llm.tokens import Tokenizer
+    from app.retrieval.vocab import vocabulary
+    from app.ingest.chunker import chunk_pages
+    kw.setdefault("chunk_size", 200)
+    kw.setdefault("overlap", 0)
+    return chunk_pages(pages, Tokenizer(), vocabulary, **kw)
+
+def test_markdown_headings_set_the_section_path():
+    text = ("# Guide\nIntro about the guide.\n\n## Install\nRun the installer first.\n\n"
+            "### Linux\nUse the package manager.\n\n## Usage\nStart the server.\n\nSetext Title\n============\nLast words.")
+    got = [(c["section"], c["text"]) for c in _chunks([(text, None)])]
+    assert got == [
+        ("Guide", "Intro about the guide."),
+        ("Guide > Install", "Run the installer first."),
+        ("Guide > Install > Linux", "Use the package manager."),
+        ("Guide > Usage", "Start the server."),
+        ("Setext Title", "Last words."),
+    ]
+
+def test_pdf_chunks_carry_page_ranges():
+    import fitz
+    from app.ingest.parsers import parse_pdf_bytes
+    doc = fitz.open()
+    for n in range(1, 4):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"Page {n} opens with a sentence about topic {n}.", fontsize=11)
+        page.insert_text((72, 90), f"It closes with more words on page {n}.", fontsize=11)
+    pages = parse_pdf_bytes(doc.tobytes())
+    doc.close()
+    assert [p for _, p in pages] == [1, 2, 3]
+    chunks = _chunks(pages, chunk_size=150)
+    assert chunks[0]["page_start"] == 1
+    assert any(c["page_start"] < c["page_end"] for c in chunks)
+    assert chunks[-1]["page_end"] == 3
+    for c in chunks:
+        pages_in = {int(m) for m in re.findall(r"page (\d)", c["text"].lower())}
+        assert min(pages_in) == c["page_start"] and max(pages_in) == c["page_end"]
+
+def test_term_ids_round_trip_through_the_blob():
+    from app.retrieval.bm25 import tokenize
+    from app.retrieval.vocab import vocabulary, pack_ids, unpack_ids
+    chunks = _chunks([("Alpha beta gamma. Beta gamma delta gamma.", 1)])
+    assert len(chunks) == 1
+    ids = chunks[0]["term_ids"]
+    assert unpack_ids(pack_ids(ids)) == ids
+    assert ids == vocabulary.lookup(tokenize(chunks[0]["text"]))
+    assert unpack_ids(pack_ids([])) == []
@@ -0,0 +1,70 @@
+import re
+import asyncio
+
+from app.llm.context import pack_batches, fit_notes
+from app.llm.mapreduce import map_reduce
+from app.llm.providers import LLM
+from app.config import settings
+from app.llm.tokens import Tokenizer, make_context_tokenizer
+
+def _hit(doc: str, idx: int, text: str, score: float):
+    return {"chunk_id": f"{doc}-{idx}", "doc_id": doc, "original_name": f"{doc}.txt", "filename": f"{doc}.txt",
+            "chunk_index": idx, "page_start": None, "page_end": None, "section": None, "score": score, "text": text}
+
+def _hits():
+    return [
+        _hit("a", 3, "Alpha three says the launch slipped to March.", 0.9),
+        _hit("b", 0, "Bravo zero lists the budget at two million euros.", 0.8),
+        _hit("a", 4, "Alpha four adds that the vendor missed a deadline.", 0.7),
+        _hit("c", 7, "Charlie seven covers the hiring plan for the team.", 0.6),
+    ]
+
+def test_citation_numbers_index_sources():
+    for max_tokens, max_batches in ((1000, 1), (30, 4)):
+        contexts, sources, stats = pack_batches(_hits(), Tokenizer(), max_tokens, max_batches=max_batches)
+        headers = [h for c in contexts for h in re.findall(r"^\[(\d+)\] doc=(\S+)", c, re.M)]
+        assert [int(n) for n, _ in headers] == list(range(1, len(sources) + 1))
+        for n, name in headers:
+            assert sources[int(n) - 1]["original_name"] == name
+        assert stats["blocks"] == len(sources)
+    contexts, sources, _ = pack_batches(_hits(), Tokenizer(), 1000)
+    assert sources[0]["chunk_ids"] == ["a-3", "a-4"] and sources[0]["chunk_end"] == 4
+    assert [s["doc_id"] for s in sources] == ["a", "b", "c"]
+
+def test_fit_notes_respects_budget():
+    notes = ["- " + "word " * 30 + f"[{i}]\n- short line [{i}]" for i in range(1, 9)]
+    tok = Tokenizer()
+    joined, stats = fit_notes(notes, tok, 120)
+    assert tok.count(joined) <= 120 + len(joined.splitlines())
+    assert stats["dropped_notes"] + stats["truncated_notes"] > 0
+
+class _Recorder(LLM):
+    def __init__(self):
+        self.reduce_context = ""
+
+    async def generate(self, query, context, task="answer"):
+        if task == "map":
+            return "- " + "evidence " * 40 + "[1]"
+        self.reduce_context = context
+        return "answer [1]"
+
+def test_reduce_prompt_is_trimmed():
+    llm = _Recorder()
+    ans, meta = asyncio.run(map_reduce(llm, "q", ["ctx"] * 8, 4, Tokenizer(), 200))
+    assert ans == "answer [1]"
+    assert Tokenizer().count(llm.reduce_context) <= 200
+    assert meta["reduce"]["dropped_notes"] > 0
+
+def test_context_tokenizer_budgets_every_provider(monkeypatch):
+    monkeypatch.setattr(settings, "max_context_tokens", 3000)
+    monkeypatch.setattr(settings, "context_tokenizer", "")
+    monkeypatch.setattr(settings, "llm_tokenizers", "")
+    monkeypatch.setattr(settings, "llm_context_tokens", "ollama:small=1000")
+    tok = make_context_tokenizer(["ollama:big", "ollama:small"])
+    assert tok.count("x" * 400) == 300
+    assert "ollama:big: no tokenizer configured" in tok.fallback and "ollama:small" in tok.fallback
+    _, _, stats = pack_batches(_hits(), tok, 3000)
+    assert stats["tokenizer"] == "chars/4" and stats["tokenizer_fallback"] == tok.fallback
+    monkeypatch.setattr(settings, "llm_tokenizers", "ollama:big=/nonexistent/tokenizer")
+    assert make_context_tokenizer(["ollama:big"]).fallback.startswith("ollama:big: hf:/nonexistent/tokenizer")
+    assert make_context_tokenizer([]).fallback == ""
@@ -0,0 +1,72 @@
+from app.db import fetchall
+from app.service import DOC_SORTS
+
+def test_collection_listings_use_a_collection_index():
+    for col in DOC_SORTS.values():
+        for direction, cmp in (("DESC", "<"), ("ASC", ">")):
+            plan = " ".join(r["detail"] for r in fetchall(
+                f"""EXPLAIN QUERY PLAN SELECT * FROM documents WHERE collection = ? AND ({col} {cmp} ? OR ({col} = ? AND id {cmp} ?))
+                    ORDER BY {col} {direction}, id {direction} LIMIT 51""", ("c", 1, 1, "x")))
+            assert "USING INDEX idx_documents_collection_" in plan and "TEMP B-TREE" not in plan, plan
+            assert "idx_documents_collection_sha" not in plan, plan
+
+def test_cursor_pages_are_stable_across_created_at_ties(client):
+    from app.db import executemany
+    from app.main import service
+    executemany(
+        "INSERT INTO documents (id, filename, original_name, mime_type, bytes, sha256, created_at, collection) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        [(f"tie-{i:02d}", f"f{i}", f"tie{i}.txt", "text/plain", 10 + i % 3, f"sha-tie-{i}",
+          "2026-01-01T00:00:0%dZ" % (i // 4), "ties") for i in range(11)]
+    )
+    for sort in DOC_SORTS:
+        for order in ("desc", "asc"):
+            seen, cursor = [], None
+            while True:
+                page = service.list_documents(3, cursor, sort, order, collection="ties")
+                assert len(page["items"]) <= 3
+                seen += [d["id"] for d in page["items"]]
+                cursor = page["next_cursor"]
+                if cursor is None:
+                    break
+            assert sorted(seen) == [f"tie-{i:02d}" for i in range(11)] and len(set(seen)) == 11
+    filtered = service.list_documents(50, None, "created_at", "desc", prefix="tie1", collection="ties")
+    assert [d["original_name"] for d in filtered["items"]] == ["tie10.txt", "tie1.txt"]
+    assert filtered["total"] is None and filtered["total_scope"] is None
+
+def test_upload_changes_the_documents_etag(client):
+    first = client.get("/documents", params={"collection": "etag"})
+    etag = first.headers["ETag"]
+    assert first.json()["total_scope"] == "collection"
+    assert client.get("/documents", params={"collection": "etag"}, headers={"If-None-Match": etag}).status_code == 304
+    r = client.post("/documents/upload", params={"collection": "etag"},
+                    files={"file": ("etag.txt", b"ETag tests need a fresh upload to bump the version.", "text/plain")})
+    assert r.status_code == 200, r.text
+    second = client.get("/documents", params={"collection": "etag"}, headers={"If-None-Match": etag})
+    assert second.status_code == 200 and second.headers["ETag"] != etag
+    assert [d["original_name"] for d in second.json()["items"]] == ["etag.txt"] and second.json()["total"] == 1
+
+def test_duplicate_upload_links_an_alias(client):
+    body = b"Duplicate uploads keep one document and remember every name."
+    first = client.post("/documents/upload", params={"collection": "dups"},
+                        files={"file": ("original.txt", body, "text/plain")}).json()
+    assert not first.get("duplicate")
+    second = client.post("/documents/upload", params={"collection": "dups"},
+                         files={"file": ("renamed.txt", body, "text/plain")}).json()
+    assert second["duplicate"] is True and second["id"] == first["id"]
+    assert "renamed.txt" in second["aliases"]
+    assert client.get("/documents", params={"collection": "dups"}).json()["total"] == 1
+
+def test_delete_keeps_blobs_shared_with_another_collection(client):
+    from app.main import service
+    body = b"The same bytes live in two collections and share one stored blob."
+    a = client.post("/documents/upload", params={"collection": "share-a"},
+                    files={"file": ("shared.txt", body, "text/plain")}).json()
+    b = client.post("/documents/upload", params={"collection": "share-b"},
+                    files={"file": ("shared.txt", body, "text/plain")}).json()
+    assert a["id"] != b["id"] and a["sha256"] == b["sha256"] and not b.get("duplicate")
+    assert client.delete(f"/documents/{a['id']}").status_code == 200
+    assert service.blobs.exists(b["sha256"]) and service.blobs.read(b["sha256"]) == body
+    assert client.post(f"/documents/{b['id']}/reindex").status_code == 200
+    assert client.delete(f"/documents/{b['id']}").status_code == 200
+    assert not service.blobs.exists(b["sha256"])
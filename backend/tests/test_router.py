@@ -0,0 +1,119 @@
+import json
+import time
+import asyncio
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+from app.llm.providers import OpenAILLM, OllamaLLM, ExtractiveLLM
+from app.llm.router import RouterLLM
+
+CONTEXT = "[1] doc=a.txt chunk=0\nThe launch moved to March because the vendor missed the integration deadline."
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        srv = self.server
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        srv.started.append(time.perf_counter())
+        time.sleep(srv.delay)
+        if srv.status != 200:
+            self.send_response(srv.status)
+            self.end_headers()
+            return
+        if self.path.endswith("/chat/completions"):
+            body = {"choices": [{"message": {"content": srv.answer}}]}
+        else:
+            body = {"response": srv.answer}
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        try:
+            self.wfile.write(data)
+        except OSError:
+            pass
+
+def _server(answer: str):
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    srv.daemon_threads = True
+    srv.answer, srv.delay, srv.status, srv.started = answer, 0.0, 200, []
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv
+
+@pytest.fixture
+def servers():
+    openai, ollama = _server("openai says hi [1]"), _server("ollama says hi [1]")
+    yield openai, ollama
+    for srv in (openai, ollama):
+        srv.shutdown()
+        srv.server_close()
+
+def _router(openai, ollama, **kw):
+    primary = OpenAILLM("test-key", "stub", base_url=f"http://127.0.0.1:{openai.server_port}/v1", timeout=5.0)
+    backup = OllamaLLM(f"http://127.0.0.1:{ollama.server_port}", "stub", timeout=5.0)
+    kw.setdefault("hedge_default_ms", 0.0)
+    return RouterLLM([primary, backup, ExtractiveLLM()], **kw), primary, backup
+
+def _ask(router):
+    return asyncio.run(router.generate_with_meta("when is the launch", CONTEXT))
+
+def test_primary_answers_without_hedging(servers):
+    openai, ollama = servers
+    router, primary, _ = _router(openai, ollama, hedge_default_ms=2000.0)
+    ans, meta = _ask(router)
+    assert ans == "openai says hi [1]"
+    assert meta["attempts"] == [primary.name] and not meta["hedged"]
+    assert not ollama.started
+
+def test_failover_follows_chain_order(servers):
+    openai, ollama = servers
+    openai.status = 500
+    router, primary, backup = _router(openai, ollama)
+    ans, meta = _ask(router)
+    assert ans == "ollama says hi [1]"
+    assert meta["attempts"] == [primary.name, backup.name]
+    assert meta["errors"][0].startswith(primary.name) and not meta["hedged"]
+    assert openai.started[0] < ollama.started[0]
+
+    ollama.status = 503
+    ans, meta = _ask(router)
+    assert meta["provider"] == ExtractiveLLM.name
+    assert meta["attempts"] == [primary.name, backup.name, ExtractiveLLM.name]
+    assert len(meta["errors"]) == 2
+    assert router.stats()["providers"][primary.name]["errors"] == 2
+
+def test_slow_primary_is_hedged_and_cancelled(servers):
+    openai, ollama = servers
+    openai.delay = 1.5
+    router, primary, backup = _router(openai, ollama, hedge_default_ms=200.0, hedge_min_samples=100)
+    t0 = time.perf_counter()
+    ans, meta = _ask(router)
+    elapsed = time.perf_counter() - t0
+    assert ans == "ollama says hi [1]"
+    assert meta["hedged"] and meta["attempts"] == [primary.name, backup.name]
+    assert elapsed < 1.0
+    gap = ollama.started[0] - openai.started[0]
+    assert 0.15 <= gap <= 0.6
+    st = router.stats()["providers"]
+    assert st[primary.name]["hedges"] == 1
+    assert st[primary.name]["cancelled"] == 1
+    assert st[primary.name]["censored"] == 1 and st[primary.name]["count"] == 1
+    assert st[backup.name]["wins"] == 1
+
+def test_cancelled_calls_raise_the_hedge_threshold(servers):
+    openai, ollama = servers
+    router, primary, _ = _router(openai, ollama, hedge_percentile=0.9, hedge_min_samples=10, hedge_floor_ms=50.0)
+    for _ in range(10):
+        _ask(router)
+    fast = router.hedge_delay_ms(primary)
+    openai.delay = 1.0
+    for _ in range(3):
+        _, meta = _ask(router)
+        assert meta["hedged"]
+    assert router.stats()["providers"][primary.name]["censored"] == 3
+    assert router.hedge_delay_ms(primary) > fast
@@ -0,0 +1,170 @@
+import os
+import random
+
+import numpy as np
+import pytest
+
+from app.retrieval.bm25 import BM25Index
+from app.retrieval.faiss_store import FaissStore
+from app.retrieval.segments import SegmentStore, SEGMENTS_FILE, live_diff
+
+DIM = 32
+WORDS = "alpha bravo charlie delta echo foxtrot golf hotel india juliet kilo lima".split()
+
+def _vectors(rng, n: int) -> np.ndarray:
+    v = rng.standard_normal((n, DIM)).astype(np.float32)
+    return v / np.linalg.norm(v, axis=1, keepdims=True)
+
+def _step(store: SegmentStore, path: str, removed, vecs, ids) -> SegmentStore:
+    out = store.fork(path)
+    out.remove(removed)
+    name, segment = out.new_segment()
+    if len(ids):
+        segment.add(vecs, ids)
+    out.append(name, segment)
+    out.compact()
+    out.save(path)
+    return out
+
+@pytest.mark.parametrize("index_type", ["flat", "sq8", "binary"])
+def test_incremental_segments_match_rebuild(tmp_path, index_type):
+    rng = np.random.default_rng(1)
+    store = SegmentStore(str(tmp_path / "g0"), mmap=False, index_type=index_type)
+    live = {}
+    n = 0
+    for step in range(1, 13):
+        ids = [f"c{n + j}" for j in range(40 if step == 1 else 7)]
+        n += len(ids)
+        vecs = _vectors(rng, len(ids))
+        removed = random.Random(step).sample(sorted(live), min(len(live), 5)) if step > 1 else []
+        store = _step(store, str(tmp_path / f"g{step}"), removed, vecs, ids)
+        for cid in removed:
+            live.pop(cid)
+        live.update(zip(ids, vecs))
+        assert sorted(store.chunk_ids.tolist()) == sorted(live)
+        assert len(store) == len(live)
+        assert len(store.segments) <= 4
+
+    reloaded = SegmentStore(str(tmp_path / "g12"), mmap=True)
+    reloaded.load()
+    assert sorted(reloaded.chunk_ids.tolist()) == sorted(live)
+
+    q = _vectors(rng, 5)
+    ref = FaissStore(0, "", mmap=False)
+    keys = sorted(live)
+    ref.add(np.stack([live[k] for k in keys]), keys)
+    expected = [[ref.chunk_id(i) for i, _ in hits] for hits in ref.search_batch(q, 10)]
+    for s in (store, reloaded):
+        got = [[s.chunk_id(i) for i, _ in hits] for hits in s.search_batch(q, 10)]
+        for e, g in zip(expected, got):
+            assert set(g) <= set(live)
+            if index_type == "flat":
+                assert g == e
+            else:
+                assert len(set(g) & set(e)) >= 7
+
+def test_unchanged_segments_are_linked(tmp_path):
+    rng = np.random.default_rng(2)
+    store = _step(SegmentStore(str(tmp_path / "g1"), mmap=False), str(tmp_path / "g1"), [], _vectors(rng, 200),
+                  [f"c{i}" for i in range(200)])
+    store = _step(store, str(tmp_path / "g2"), ["c3"], _vectors(rng, 5), [f"d{i}" for i in range(5)])
+    assert len(store.segments) == 2
+    base = store.segments[0].store.index_path
+    assert os.path.samefile(base, str(tmp_path / "g1" / "chunks.faiss"))
+    assert os.path.exists(str(tmp_path / "g2" / SEGMENTS_FILE))
+
+    prev = SegmentStore(str(tmp_path / "g1"), mmap=False)
+    prev.load()
+    cur = SegmentStore(str(tmp_path / "g2"), mmap=False)
+    cur.load(prev)
+    assert cur.segments[0].store is prev.segments[0].store
+    removed, added = live_diff(prev, cur)
+    assert removed.tolist() == ["c3"]
+    assert sorted(added.tolist()) == [f"d{i}" for i in range(5)]
+
+def test_bm25_updates_match_rebuild():
+    wr = random.Random(0)
+    docs = {f"c{i}": [wr.choice(WORDS) for _ in range(wr.randint(3, 30))] for i in range(300)}
+    inc = BM25Index()
+    keys = sorted(docs)
+    inc.build_terms([docs[k] for k in keys[:200]], keys[:200])
+    gone = wr.sample(keys[:200], 60)
+    inc.remove(gone)
+    inc.add_terms([docs[k] for k in keys[200:]], keys[200:])
+    kept = [k for k in keys if k not in set(gone)]
+    full = BM25Index()
+    full.build_terms([docs[k] for k in kept], kept)
+    assert len(inc) == len(full) == len(kept)
+    for q in ("alpha", "bravo kilo", "lima lima echo", "zulu"):
+        a, b = inc.search(q, 20), full.search(q, 20)
+        assert {k for k, _ in a} <= set(kept)
+        np.testing.assert_allclose(sorted(s for _, s in a), sorted(s for _, s in b), rtol=1e-5)
+
+def test_ids_hash_is_cached_until_the_store_changes(tmp_path, monkeypatch):
+    from app.retrieval import segments
+    rng = np.random.default_rng(3)
+    store = _step(SegmentStore(str(tmp_path / "g1"), mmap=False), str(tmp_path / "g1"), [], _vectors(rng, 50),
+                  [f"c{i}" for i in range(50)])
+    calls = []
+    real = segments.ids_digest
+    monkeypatch.setattr(segments, "ids_digest", lambda ids: calls.append(1) or real(ids))
+    first = store.ids_hash
+    assert store.ids_hash == first == real(store.chunk_ids.tolist())
+    assert len(calls) == 1
+    store.remove(["c1"])
+    assert store.ids_hash != first and len(calls) == 2
+
+def test_binary_sidecar_is_streamed_through_merges(tmp_path):
+    rng = np.random.default_rng(4)
+    vecs = _vectors(rng, 300)
+    store = SegmentStore(str(tmp_path / "g0"), mmap=False, index_type="binary")
+    for step, start in enumerate(range(0, 300, 60), start=1):
+        ids = [f"c{i}" for i in range(start, start + 60)]
+        store = _step(store, str(tmp_path / f"g{step}"), [], vecs[start:start + 60], ids)
+    merged = store.merged()
+    merged.save()
+    assert not [f for f in os.listdir(os.path.dirname(merged.index_path)) if ".spill" in f]
+    assert isinstance(merged._vecs, np.memmap)
+    order = [int(cid[1:]) for cid in merged.chunk_ids.tolist()]
+    np.testing.assert_allclose(merged.vector_rows(0, len(order)), vecs[order], rtol=1e-6)
+
+def test_shared_projection_is_used_by_every_segment(tmp_path):
+    from app.retrieval.faiss_store import new_transform
+    rng = np.random.default_rng(5)
+    transform = new_transform(_vectors(rng, 200), "pca", 8)
+    stores = []
+    for shard in range(2):
+        store = SegmentStore(str(tmp_path / f"s{shard}"), mmap=False, transform=transform)
+        for step in range(3):
+            ids = [f"s{shard}-{step}-{i}" for i in range(4)]
+            store = _step(store, str(tmp_path / f"s{shard}"), [], _vectors(rng, 4), ids)
+        stores.append(store)
+    for store in stores:
+        assert store.dim == 8 and store.projection == "pca:8"
+        assert all(s.store.transform is transform for s in store.segments)
+    reloaded = SegmentStore(str(tmp_path / "s0"), mmap=False)
+    reloaded.load()
+    q = _vectors(rng, 3)
+    np.testing.assert_allclose(reloaded.project(q), stores[1].project(q), rtol=1e-5)
+
+def test_binary_target_dim_is_checked_up_front():
+    from app.retrieval.faiss_store import check_index_config
+    check_index_config("binary", "pca", 64)
+    check_index_config("flat", "truncate", 100)
+    with pytest.raises(ValueError):
+        check_index_config("binary", "truncate", 100)
+    with pytest.raises(ValueError):
+        check_index_config("sq4", "", 0)
+
+@pytest.mark.parametrize("index_type", ["flat", "sq8"])
+def test_mmap_load_maps_the_codes(tmp_path, index_type):
+    rng = np.random.default_rng(6)
+    store = FaissStore(0, str(tmp_path / "chunks.faiss"), mmap=False, index_type=index_type)
+    store.add(_vectors(rng, 500), [f"c{i}" for i in range(500)])
+    store.save()
+    mapped = FaissStore(0, store.index_path, mmap=True)
+    mapped.load()
+    assert len(mapped) == 500 and mapped.search(_vectors(rng, 1), 3)
+    if os.path.exists("/proc/self/maps"):
+        with open("/proc/self/maps") as f:
+            assert store.index_path in f.read()
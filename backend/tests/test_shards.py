@@ -0,0 +1,155 @@
+import os
+import random
+import socket
+import hashlib
+
+import numpy as np
+import pytest
+
+from app.db import executemany
+from app.retrieval.bm25 import tokenize
+from app.retrieval.vocab import vocabulary, pack_ids
+from app.retrieval.segments import SegmentStore
+from app.retrieval.shards import (Shard, ShardServer, LocalShardCluster, shard_of, shard_dir,
+                                  check_authkey)
+
+WORDS = ("alpha bravo charlie delta echo foxtrot golf hotel india juliet kilo lima mike november oscar papa "
+         "quebec romeo sierra tango uniform victor whiskey xray yankee zulu").split()
+DIM = 32
+NUM_SHARDS = 2
+
+def _free_base_port(n: int) -> int:
+    for _ in range(50):
+        base = random.randint(20000, 60000)
+        try:
+            socks = []
+            for i in range(n):
+                s = socket.socket()
+                s.bind(("127.0.0.1", base + i))
+                socks.append(s)
+            return base
+        except OSError:
+            continue
+        finally:
+            for s in socks:
+                s.close()
+    raise RuntimeError("no free ports")
+
+@pytest.fixture(scope="module")
+def corpus(tmp_path_factory):
+    rng = np.random.default_rng(0)
+    wr = random.Random(0)
+    rows, ids, vecs = [], [], []
+    for d in range(40):
+        doc_id = f"doc-{d}"
+        for c in range(8):
+            cid = f"{doc_id}-{c}"
+            text = " ".join(wr.choice(WORDS) for _ in range(20))
+            terms = tokenize(text)
+            ids_of = vocabulary.intern(terms)
+            rows.append((cid, doc_id, c, text, len(text), hashlib.sha256(text.encode()).hexdigest(), "t", "default",
+                         pack_ids([ids_of[t] for t in terms])))
+            ids.append(cid)
+    executemany(
+        """INSERT INTO chunks (id, doc_id, chunk_index, text, text_len, sha256, created_at, collection, term_ids)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+        rows
+    )
+    vecs = rng.standard_normal((len(ids), DIM)).astype(np.float32)
+    vecs /= np.linalg.norm(vecs, axis=1, keepdims=True)
+    gen_dir = str(tmp_path_factory.mktemp("gen"))
+    for i in range(NUM_SHARDS):
+        sel = [j for j, cid in enumerate(ids) if shard_of(cid.rsplit("-", 1)[0], NUM_SHARDS) == i]
+        path = shard_dir(gen_dir, i)
+        store = SegmentStore(path, mmap=False)
+        name, segment = store.new_segment()
+        segment.add(vecs[sel], [ids[j] for j in sel])
+        store.append(name, segment)
+        Shard(i, store, None).save(path)
+    queries = [" ".join(wr.choice(WORDS) for _ in range(3)) for _ in range(10)]
+    qv = rng.standard_normal((len(queries), DIM)).astype(np.float32)
+    qv /= np.linalg.norm(qv, axis=1, keepdims=True)
+    return gen_dir, queries, qv
+
+def _assert_same(a, b):
+    for (va, ba), (vb, bb) in zip(a, b):
+        assert [cid for cid, _ in va] == [cid for cid, _ in vb]
+        assert [cid for cid, _ in ba] == [cid for cid, _ in bb]
+        np.testing.assert_allclose([s for _, s in va], [s for _, s in vb], rtol=1e-5)
+        np.testing.assert_allclose([s for _, s in ba], [s for _, s in bb], rtol=1e-5)
+
+def test_subprocess_shards_match_in_process(corpus):
+    gen_dir, queries, qv = corpus
+    local = [Shard.load(i, shard_dir(gen_dir, i), mmap=False) for i in range(NUM_SHARDS)]
+    assert sum(len(s) for s in local) == 320
+    with LocalShardCluster(NUM_SHARDS, _free_base_port(NUM_SHARDS), mmap=False) as remote:
+        for s in remote:
+            s.load(shard_dir(gen_dir, s.shard_id), 1)
+        assert [len(s) for s in remote] == [len(s) for s in local]
+        for ls, rs in zip(local, remote):
+            _assert_same(ls.search_batch(qv, queries, 10), rs.search_batch(qv, queries, 10))
+
+def test_rpc_refuses_public_authkeys():
+    for key in (b"", b"second-brain", b"short"):
+        with pytest.raises(ValueError):
+            check_authkey(key)
+    with pytest.raises(ValueError):
+        ShardServer(0, ("127.0.0.1", 0), b"second-brain")
+    with pytest.raises(ValueError):
+        ShardServer(0, ("0.0.0.0", 0), os.urandom(32))
+    with pytest.raises(ValueError):
+        LocalShardCluster(2, 7100, host="0.0.0.0")
+    assert LocalShardCluster(2, 7100).authkey not in (b"", b"second-brain")
+
+def test_staged_generation_serves_only_pinned_searches(corpus, tmp_path):
+    gen_dir, queries, qv = corpus
+    server = ShardServer(0, ("127.0.0.1", 0), os.urandom(32), mmap=False)
+    try:
+        n = server._dispatch(("load", "default", shard_dir(gen_dir, 0), 1))
+        store = Shard.load(0, shard_dir(gen_dir, 0), mmap=False).faiss.fork(str(tmp_path))
+        gone = set(store.chunk_ids[:10].tolist())
+        store.remove(gone)
+        store.save(str(tmp_path))
+        assert server._dispatch(("stage", "default", str(tmp_path), 2)) == n - 10
+
+        def vector_ids(generation):
+            hits = server._dispatch(("search_batch", "default", qv, queries, n, None, generation))
+            return {cid for vec, _ in hits for cid, _ in vec}
+
+        assert gone <= vector_ids(None) and gone <= vector_ids(1)
+        assert not gone & vector_ids(2)
+        assert server._dispatch(("activate", "default", 2)) == n - 10
+        assert not gone & vector_ids(None) and not gone & vector_ids(1)
+    finally:
+        server.listener.close()
+
+def test_readers_defer_legacy_rows_until_the_writer_backfills():
+    from app.db import fetchall, scalar
+    from app.retrieval.bm25 import BM25Index
+    from app.retrieval.shards import fetch_terms, backfill_terms, sync_bm25
+    executemany(
+        """INSERT INTO chunks (id, doc_id, chunk_index, text, text_len, sha256, created_at, collection, term_ids)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?, NULL)""",
+        [("legacy-0", "legacy", 0, "alpha zzlegacyterm alpha", 24, "x", "t", "legacy"),
+         ("legacy-1", "legacy", 1, "bravo", 5, "y", "t", "legacy")]
+    )
+    terms_before = scalar("SELECT COUNT(1) FROM terms")
+    assert fetch_terms(["legacy-0", "legacy-1"]) == {}
+    assert scalar("SELECT COUNT(1) FROM terms") == terms_before
+    assert all(r["term_ids"] is None for r in fetchall("SELECT term_ids FROM chunks WHERE collection = 'legacy'"))
+
+    rng = np.random.default_rng(7)
+    store = SegmentStore("", mmap=False)
+    name, segment = store.new_segment()
+    segment.add(rng.standard_normal((2, DIM)).astype(np.float32), ["legacy-0", "legacy-1"])
+    store.append(name, segment)
+    bm25 = BM25Index()
+    sync_bm25(bm25, SegmentStore(""), store)
+    assert len(bm25) == 0 and len(store) == 2
+
+    assert backfill_terms("legacy") == 2 and backfill_terms("legacy") == 0
+    got = fetch_terms(["legacy-0", "legacy-1"])
+    assert got["legacy-0"] == vocabulary.lookup(["alpha", "zzlegacyterm", "alpha"])
+    assert got["legacy-1"] == vocabulary.lookup(["bravo"])
+    sync_bm25(bm25, SegmentStore(""), store)
+    assert [cid for cid, _ in bm25.search("zzlegacyterm", 5)] == ["legacy-0"]
@@ -0,0 +1,67 @@
+import os
+
+from app.db import fetchone, fetchall, scalar
+from app.sync.folder import FolderSync
+
+def _write(root, rel, text, mtime):
+    path = os.path.join(root, rel)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(text)
+    os.utime(path, ns=(mtime, mtime))
+
+def _docs(collection):
+    return {r["original_name"]: r["id"] for r in fetchall(
+        "SELECT id, original_name FROM documents WHERE collection = ?", (collection,))}
+
+def test_reconcile_applies_adds_modifies_and_deletes(client, tmp_path):
+    from app.main import service
+    root = str(tmp_path)
+    sync = FolderSync(service, root, collection="sync-a")
+    _write(root, "notes/alpha.md", "# Alpha\n\nFirst version of the alpha note.", 10**18)
+    _write(root, "beta.txt", "Beta note about sqlite folders.", 10**18)
+    _write(root, "ignored.bin", "not a supported file", 10**18)
+    scan = sync.reconcile()
+    assert (scan["files"], scan["changed"], scan["applied"]) == (2, 2, 2)
+    first = _docs("sync-a")
+    assert set(first) == {"alpha.md", "beta.txt"}
+    assert sync.reconcile()["changed"] == 0
+
+    _write(root, "notes/alpha.md", "# Alpha\n\nSecond, longer version of the alpha note.", 10**18 + 1)
+    os.remove(os.path.join(root, "beta.txt"))
+    scan = sync.reconcile()
+    assert scan["changed"] == 2 and scan["applied"] == 2
+    after = _docs("sync-a")
+    assert list(after) == ["alpha.md"] and after["alpha.md"] != first["alpha.md"]
+    assert fetchone("SELECT doc_id FROM sync_files WHERE path = ?", ("beta.txt",)) is None
+    assert scalar("SELECT COUNT(*) FROM chunks WHERE doc_id IN (?, ?)", (first["alpha.md"], first["beta.txt"])) == 0
+
+    _write(root, "notes/alpha.md", "# Alpha\n\nSecond, longer version of the alpha note.", 10**18 + 2)
+    assert sync.apply(["notes/alpha.md"]) == 0
+    assert _docs("sync-a") == after
+
+def test_duplicate_owner_hands_off_before_delete(client, tmp_path):
+    from app.main import service
+    root = str(tmp_path)
+    sync = FolderSync(service, root, collection="sync-b")
+    text = "Shared body that two synced files carry verbatim."
+    _write(root, "one.md", text, 10**18)
+    _write(root, "copy/two.md", text, 10**18)
+    sync.reconcile()
+    rows = {r["path"]: r for r in fetchall("SELECT path, doc_id, owned FROM sync_files WHERE path IN (?, ?)",
+                                          ("one.md", "copy/two.md"))}
+    doc_id = rows["one.md"]["doc_id"]
+    assert rows["copy/two.md"]["doc_id"] == doc_id
+    assert sorted(r["owned"] for r in rows.values()) == [0, 1]
+    owner = next(p for p, r in rows.items() if r["owned"])
+    heir = next(p for p in rows if p != owner)
+
+    os.remove(os.path.join(root, owner))
+    assert sync.apply([owner]) == 0
+    assert fetchone("SELECT owned FROM sync_files WHERE path = ?", (heir,))["owned"] == 1
+    assert fetchone("SELECT id FROM documents WHERE id = ?", (doc_id,)) is not None
+
+    os.remove(os.path.join(root, heir))
+    assert sync.apply([heir]) == 1
+    assert fetchone("SELECT id FROM documents WHERE id = ?", (doc_id,)) is None
+    assert _docs("sync-b") == {}
@@ -0,0 +1,68 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from app.config import settings
+from app.db import fetchall
+from app.utils.text import normalize_text
+from app.retrieval.embedders import make_embedder, PooledEmbedder
+
+def sample_texts(n: int):
+    rows = fetchall("SELECT text FROM chunks ORDER BY rowid LIMIT ?", (n,))
+    texts = [normalize_text(r["text"]) for r in rows]
+    if not texts:
+        base = "Kişisel not kütüphanesinde arama ve kaynak gösteren cevaplar için örnek cümle."
+        texts = [" ".join([base] * (1 + i % 12)) for i in range(n)]
+    return texts
+
+def timed(embedder, texts, batch_size: int):
+    embedder.encode(texts[:batch_size], batch_size)
+    t0 = time.perf_counter()
+    vecs = embedder.encode(texts, batch_size)
+    return vecs, time.perf_counter() - t0
+
+def compare(name: str, ref: np.ndarray, vecs: np.ndarray, secs: float, n: int):
+    cos = np.sum(ref * vecs, axis=1)
+    diff = float(np.max(np.abs(ref - vecs)))
+    print(f"{name:<14} {n / secs:>10.1f} {float(np.min(cos)):>10.5f} {float(np.mean(cos)):>10.5f} {diff:>10.2e}")
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 512
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+    texts = sample_texts(n)
+    base = {
+        "model": settings.embed_model,
+        "onnx_model_dir": settings.onnx_model_dir,
+        "threads": settings.embed_threads,
+    }
+    print(f"texts {len(texts)}, batch {batch_size}, cpus {os.cpu_count()}")
+    print(f"{'backend':<14} {'chunks/s':>10} {'min_cos':>10} {'mean_cos':>10} {'max_abs':>10}")
+    ref_emb = make_embedder(dict(base, backend="torch"))
+    ref, secs = timed(ref_emb, texts, batch_size)
+    compare("torch", ref, ref, secs, len(texts))
+
+    candidates = []
+    if os.path.exists(os.path.join(settings.onnx_model_dir, "model.onnx")):
+        candidates.append(("onnx", dict(base, backend="onnx")))
+    if os.path.exists(os.path.join(settings.onnx_model_dir, "model.int8.onnx")):
+        candidates.append(("onnx-int8", dict(base, backend="onnx", onnx_quantized=True)))
+    for name, spec in candidates:
+        vecs, secs = timed(make_embedder(spec), texts, batch_size)
+        compare(name, ref, vecs, secs, len(texts))
+
+    workers = settings.embed_workers or max(1, (os.cpu_count() or 1) // 4)
+    for name, spec in [("torch", dict(base, backend="torch"))] + candidates:
+        pool = PooledEmbedder(dict(spec, threads=0), workers)
+        try:
+            vecs, secs = timed(pool, texts, batch_size)
+            compare(f"{name} x{workers}", ref, vecs, secs, len(texts))
+        finally:
+            pool.close()
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,76 @@
+import os
+import sys
+import time
+import random
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db import fetchall, scalar
+from app.retrieval.bm25 import BM25Index, tokenize
+from app.retrieval.shards import fetch_terms
+from app.retrieval.vocab import vocabulary
+from app.retrieval.fts import FtsIndex
+from app.evaluation.metrics import latency_summary
+
+def sample_queries(texts, n: int, rng: random.Random):
+    out = []
+    for _ in range(n):
+        toks = tokenize(rng.choice(texts))
+        if toks:
+            out.append(" ".join(rng.sample(toks, min(3, len(toks)))))
+    return out
+
+def fts_bytes() -> int:
+    try:
+        return int(scalar("SELECT COALESCE(SUM(pgsize), 0) FROM dbstat WHERE name LIKE 'chunks_fts%'") or 0)
+    except Exception:
+        return -1
+
+def main():
+    nq = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    k = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+    collection = sys.argv[3] if len(sys.argv) > 3 else "default"
+    rows = fetchall("SELECT id, text FROM chunks WHERE collection = ? ORDER BY created_at ASC, rowid ASC", (collection,))
+    if not rows:
+        print("no chunks")
+        return 1
+    ids = [r["id"] for r in rows]
+    texts = [r["text"] for r in rows]
+    queries = sample_queries(texts, nq, random.Random(0))
+
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    bm25 = BM25Index()
+    terms = fetch_terms(ids)
+    bm25.build_terms([terms.get(cid, []) for cid in ids], ids, vocabulary)
+    build_s = time.perf_counter() - t0
+    bm25_mem = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    fts = FtsIndex()
+    t0 = time.perf_counter()
+    fts.ensure_schema()
+    fts_build_s = time.perf_counter() - t0
+
+    bm_lat, fts_lat, overlap = [], [], []
+    for q in queries:
+        t0 = time.perf_counter()
+        a = [cid for cid, _ in bm25.search(q, k)]
+        bm_lat.append((time.perf_counter() - t0) * 1000.0)
+        t0 = time.perf_counter()
+        b = [cid for cid, _ in fts.search(q, k, collection)]
+        fts_lat.append((time.perf_counter() - t0) * 1000.0)
+        overlap.append(len(set(a) & set(b)) / max(1, min(k, len(a))))
+
+    bl, fl = latency_summary(bm_lat), latency_summary(fts_lat)
+    print(f"chunks {len(rows)}, queries {len(queries)}, k {k}")
+    print(f"{'backend':<8} {'resident_bytes':>15} {'build_s':>8} {'p50_ms':>8} {'p95_ms':>8}")
+    print(f"{'bm25':<8} {bm25_mem:>15,} {build_s:>8.2f} {bl['p50']:>8.2f} {bl['p95']:>8.2f}")
+    print(f"{'fts5':<8} {fts_bytes():>15,} {fts_build_s:>8.2f} {fl['p50']:>8.2f} {fl['p95']:>8.2f}")
+    print(f"top-{k} overlap: {sum(overlap) / max(1, len(overlap)):.3f}")
+    print("fts5 bytes are on-disk index pages (dbstat), paged in by SQLite on demand; -1 if dbstat is unavailable")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,114 @@
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import settings
+from app.retrieval.faiss_store import FaissStore, REDUCTIONS
+from app.retrieval.snapshots import SnapshotStore
+from app.retrieval.segments import SegmentStore
+from app.retrieval.shards import shard_dir
+from app.retrieval.collection import collection_dir, validate_collection
+
+def load_reference(gen_dir: str):
+    stores = []
+    i = 0
+    while os.path.isdir(shard_dir(gen_dir, i)):
+        seg = SegmentStore(shard_dir(gen_dir, i), mmap=False)
+        if seg.exists():
+            seg.load()
+            st = seg.merged()
+            if st.index_type != "flat" or st.projection:
+                raise SystemExit("dim_sweep needs a full-dimension flat generation as reference "
+                                 "(INDEX_TYPE=flat, INDEX_REDUCTION unset)")
+            stores.append(st)
+        i += 1
+    return stores
+
+def build_reduced(ref, reduction: str, dim: int, batch: int = 4096) -> FaissStore:
+    store = FaissStore(0, "", mmap=False, index_type="flat", reduction=reduction, target_dim=dim)
+    n = ref.ntotal
+    first = min(n, max(batch, settings.quant_train_size))
+    store.add(ref.reconstruct_n(0, first), [str(i) for i in range(first)])
+    for start in range(first, n, batch):
+        m = min(batch, n - start)
+        store.add(ref.reconstruct_n(start, m), [str(i) for i in range(start, start + m)])
+    return store
+
+def default_dims(d: int):
+    out = []
+    x = 32
+    while x < d:
+        out.append(x)
+        x *= 2
+    if d // 2 not in out and d // 2 >= 32:
+        out.append(d // 2)
+    if (3 * d) // 4 not in out:
+        out.append((3 * d) // 4)
+    return sorted(out)
+
+def main():
+    k = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    nq = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    collection = validate_collection(sys.argv[3] if len(sys.argv) > 3 else "default")
+    snaps = SnapshotStore(collection_dir(os.path.join(settings.data_dir, "index"), collection))
+    gen = snaps.current()
+    if not gen:
+        print("no index generation published yet")
+        return 1
+    stores = load_reference(snaps.path(gen))
+    if not stores:
+        print("index is empty")
+        return 1
+    d = stores[0].dim
+    dims = [int(x) for x in sys.argv[4].split(",")] if len(sys.argv) > 4 else default_dims(d)
+
+    rng = np.random.default_rng(0)
+    samples = []
+    for st in stores:
+        ref = st.index
+        qids = rng.choice(ref.ntotal, size=min(nq, ref.ntotal), replace=False)
+        q = ref.reconstruct_batch(qids.astype(np.int64))
+        kk = min(k, ref.ntotal)
+        t0 = time.perf_counter()
+        _, exact = ref.search(q, kk)
+        samples.append((q, kk, exact, time.perf_counter() - t0))
+
+    rows = [("full", d, sum(int(st.index.sa_code_size()) * int(st.index.ntotal) for st in stores), 1.0,
+             sum(x[3] for x in samples) * 1000.0, 0.0)]
+    for reduction in REDUCTIONS:
+        for dim in dims:
+            if dim >= d:
+                continue
+            total_bytes = hit = seen = 0
+            lat = build_s = 0.0
+            for st, (q, kk, exact, _) in zip(stores, samples):
+                t0 = time.perf_counter()
+                store = build_reduced(st.index, reduction, dim)
+                build_s += time.perf_counter() - t0
+                if not store.projection:
+                    break
+                total_bytes += store.memory_bytes()
+                t0 = time.perf_counter()
+                approx = [[int(store.chunk_id(i)) for i, _ in hits] for hits in store.search_batch(q, kk)]
+                lat += time.perf_counter() - t0
+                for a, b in zip(exact, approx):
+                    hit += len(set(a.tolist()) & set(b))
+                    seen += kk
+            else:
+                rows.append((reduction, dim, total_bytes, hit / max(1, seen), lat * 1000.0, build_s))
+                continue
+            print(f"skip {reduction}:{dim}: pca needs at least {2 * dim} vectors per shard")
+
+    base = rows[0][2] or 1
+    print(f"generation {gen}, shards {len(stores)}, vectors {sum(s.index.ntotal for s in stores)}, dim {d}")
+    print(f"{'method':<9} {'dim':>5} {'bytes':>14} {'saved':>8} {'recall@' + str(k):>10} {'search_ms':>10} {'build_s':>8}")
+    for name, dim, b, rec, ms, bs in rows:
+        print(f"{name:<9} {dim:>5} {b:>14,} {100.0 * (1 - b / base):>7.1f}% {rec:>10.4f} {ms:>10.1f} {bs:>8.2f}")
+    print("truncate only keeps recall on Matryoshka-trained models; pca is learned from the stored vectors")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
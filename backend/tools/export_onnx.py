@@ -0,0 +1,75 @@
+import os
+import sys
+import json
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import settings
+
+def export(out_dir: str, quantize: bool):
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    st = SentenceTransformer(settings.embed_model, device="cpu")
+    pooling = st[1]
+    if not getattr(pooling, "pooling_mode_mean_tokens", False):
+        raise SystemExit("only mean-pooling models are supported by the ONNX backend")
+    if len(st) > 2 and type(st[2]).__name__ != "Normalize":
+        raise SystemExit(f"unsupported module after pooling: {type(st[2]).__name__}")
+    auto_model = st[0].auto_model.eval()
+    tokenizer = st.tokenizer
+
+    class Encoder(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            return self.model(input_ids=input_ids, attention_mask=attention_mask, token_type_ids=token_type_ids)[0]
+
+    os.makedirs(out_dir, exist_ok=True)
+    enc = tokenizer(["export sample sentence", "another one"], padding=True, return_tensors="pt")
+    token_type_ids = enc.get("token_type_ids", torch.zeros_like(enc["input_ids"]))
+    path = os.path.join(out_dir, "model.onnx")
+    kwargs = {}
+    if "dynamo" in torch.onnx.export.__code__.co_varnames:
+        kwargs["dynamo"] = False
+    torch.onnx.export(
+        Encoder(auto_model),
+        (enc["input_ids"], enc["attention_mask"], token_type_ids),
+        path,
+        input_names=["input_ids", "attention_mask", "token_type_ids"],
+        output_names=["last_hidden_state"],
+        dynamic_axes={
+            "input_ids": {0: "batch", 1: "seq"},
+            "attention_mask": {0: "batch", 1: "seq"},
+            "token_type_ids": {0: "batch", 1: "seq"},
+            "last_hidden_state": {0: "batch", 1: "seq"},
+        },
+        opset_version=17,
+        **kwargs,
+    )
+    tokenizer.save_pretrained(out_dir)
+    with open(os.path.join(out_dir, "embedder.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "model": settings.embed_model,
+            "dim": int(st.get_sentence_embedding_dimension()),
+            "max_seq_length": int(st.max_seq_length),
+            "pooling": "mean",
+        }, f, indent=2)
+    print("wrote", path)
+
+    if quantize:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        qpath = os.path.join(out_dir, "model.int8.onnx")
+        quantize_dynamic(path, qpath, weight_type=QuantType.QInt8)
+        print("wrote", qpath)
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    out_dir = args[0] if args else settings.onnx_model_dir
+    export(out_dir, "--quantize" in sys.argv)
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
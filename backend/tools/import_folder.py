@@ -1,5 +1,6 @@
 import os
 import sys
+import time
 import mimetypes
 import httpx
 
@@ -22,10 +23,14 @@ def main():
     with httpx.Client(timeout=180.0) as client:
         for p in files:
             mt = mimetypes.guess_type(p)[0] or "application/octet-stream"
-            with open(p, "rb") as f:
-                r = client.post(api + "/documents/upload", files={"file": (os.path.basename(p), f, mt)})
-                r.raise_for_status()
-                print("uploaded", os.path.basename(p))
+            for attempt in range(10):
+                with open(p, "rb") as f:
+                    r = client.post(api + "/documents/upload", files={"file": (os.path.basename(p), f, mt)})
+                if r.status_code not in (429, 503):
+                    break
+                time.sleep(float(r.headers.get("retry-after") or 1))
+            r.raise_for_status()
+            print("uploaded", os.path.basename(p))
     return 0
 
 if __name__ == "__main__":
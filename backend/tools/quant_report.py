@@ -0,0 +1,143 @@
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import settings
+from app.retrieval.faiss_store import FaissStore, new_index, INDEX_TYPES
+from app.retrieval.snapshots import SnapshotStore
+from app.retrieval.segments import SegmentStore
+from app.retrieval.shards import shard_dir
+from app.retrieval.collection import collection_dir, validate_collection
+from app.retrieval.service import RetrievalService
+from app.telemetry.querylog import QueryLog
+from app.utils.text import normalize_text
+
+def load_flat(gen_dir: str):
+    stores = []
+    i = 0
+    while os.path.isdir(shard_dir(gen_dir, i)):
+        seg = SegmentStore(shard_dir(gen_dir, i), mmap=False)
+        if seg.exists():
+            seg.load()
+            st = seg.merged()
+            if st.index_type != "flat":
+                raise SystemExit("quant_report needs a flat generation as reference (INDEX_TYPE=flat)")
+            stores.append(st)
+        i += 1
+    return stores
+
+def build(ref, index_type: str, batch: int = 4096):
+    idx = new_index(ref.d, index_type)
+    n = ref.ntotal
+    if not idx.is_trained:
+        idx.train(ref.reconstruct_n(0, min(n, settings.quant_train_size)))
+    for start in range(0, n, batch):
+        idx.add(ref.reconstruct_n(start, min(batch, n - start)))
+    return idx
+
+def build_binary(ref, batch: int = 4096) -> FaissStore:
+    store = FaissStore(0, "", mmap=False, index_type="binary")
+    n = ref.ntotal
+    for start in range(0, n, batch):
+        m = min(batch, n - start)
+        store.add(ref.reconstruct_n(start, m), [str(i) for i in range(start, start + m)])
+    return store
+
+def held_out_queries(collection: str, nq: int):
+    out = []
+    for row in QueryLog(enabled=False).top_queries(collection, nq * 4, 365 * 86400.0):
+        q = normalize_text(row["query"])
+        if q and q not in out:
+            out.append(q)
+    return out[:nq]
+
+def drop_self(lists, qids, k: int):
+    return [[i for i in row if i != qid][:k] for row, qid in zip(lists, qids)]
+
+def variants():
+    for name in INDEX_TYPES:
+        if name == "binary":
+            yield "binary", 0
+            yield f"bin+r{settings.binary_rescore_mult}", settings.binary_rescore_mult
+        else:
+            yield name, None
+
+def main():
+    k = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    nq = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    collection = validate_collection(sys.argv[3] if len(sys.argv) > 3 else "default")
+    snaps = SnapshotStore(collection_dir(os.path.join(settings.data_dir, "index"), collection))
+    gen = snaps.current()
+    if not gen:
+        print("no index generation published yet")
+        return 1
+    stores = load_flat(snaps.path(gen))
+    if not stores:
+        print("index is empty")
+        return 1
+
+    texts = held_out_queries(collection, nq)
+    qv = RetrievalService(settings.data_dir)._encode(texts) if texts else None
+    source = f"{len(texts)} logged queries" if texts else f"{nq} stored vectors per shard, self-match excluded"
+
+    rng = np.random.default_rng(0)
+    samples = []
+    for st in stores:
+        ref = st.index
+        kk = min(k, ref.ntotal)
+        if qv is not None:
+            qids, q, fetch = None, (st.project(qv) if st.projection else qv), kk
+        else:
+            qids = rng.choice(ref.ntotal, size=min(nq, ref.ntotal), replace=False)
+            q, fetch = ref.reconstruct_batch(qids.astype(np.int64)), min(kk + 1, ref.ntotal)
+        _, exact = ref.search(q, fetch)
+        exact = exact.tolist()
+        if qids is not None:
+            exact = drop_self(exact, qids.tolist(), kk)
+        samples.append((q, kk, fetch, qids, exact))
+
+    rows = []
+    binaries = {}
+    for name, rescore in variants():
+        total_bytes = 0
+        hit = 0
+        seen = 0
+        lat = 0.0
+        for si, (st, (q, kk, fetch, qids, exact)) in enumerate(zip(stores, samples)):
+            ref = st.index
+            if rescore is not None:
+                if si not in binaries:
+                    binaries[si] = build_binary(ref)
+                store = binaries[si]
+                total_bytes += store.memory_bytes()
+                t0 = time.perf_counter()
+                approx = [[i for i, _ in hits] for hits in store.search_batch(q, fetch, rescore)]
+                lat += time.perf_counter() - t0
+            else:
+                idx = ref if name == "flat" else build(ref, name)
+                total_bytes += int(idx.sa_code_size()) * int(idx.ntotal)
+                t0 = time.perf_counter()
+                _, approx = idx.search(q, fetch)
+                approx = approx.tolist()
+                lat += time.perf_counter() - t0
+            if qids is not None:
+                approx = drop_self(approx, qids.tolist(), kk)
+            for a, b in zip(exact, approx):
+                hit += len(set(a) & set(b))
+                seen += len(a)
+        rows.append((name, total_bytes, hit / max(1, seen), lat * 1000.0))
+
+    base = rows[0][1] or 1
+    print(f"generation {gen}, shards {len(stores)}, vectors {sum(s.index.ntotal for s in stores)}, dim {stores[0].dim}")
+    print(f"queries: {source}")
+    print(f"{'type':<10} {'bytes':>14} {'saved':>8} {'recall@' + str(k):>10} {'search_ms':>10}")
+    for name, b, rec, ms in rows:
+        print(f"{name:<10} {b:>14,} {100.0 * (1 - b / base):>7.1f}% {rec:>10.4f} {ms:>10.1f}")
+    print("binary bytes are resident codes only; rescoring reads float rows from the memory-mapped .f32.npy on disk")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
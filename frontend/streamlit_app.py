@@ -17,26 +17,52 @@ def api_get(path: str):
         r.raise_for_status()
         return r.json()
 
+def api_get_cached(path: str):
+    cache = st.session_state.setdefault("etag_cache", {})
+    headers = {}
+    if path in cache:
+        headers["If-None-Match"] = cache[path][0]
+    with httpx.Client(timeout=60.0) as client:
+        r = client.get(API_BASE + path, headers=headers)
+        if r.status_code == 304 and path in cache:
+            return cache[path][1]
+        r.raise_for_status()
+        data = r.json()
+    etag = r.headers.get("ETag")
+    if etag:
+        cache[path] = (etag, data)
+    return data
+
 def api_post(path: str, payload):
     with httpx.Client(timeout=60.0) as client:
         r = client.post(API_BASE + path, json=payload)
         r.raise_for_status()
         return r.json()
 
-def api_upload(file):
+def api_upload(file, collection: str):
     with httpx.Client(timeout=120.0) as client:
         files = {"file": (file.name, file.getvalue(), file.type or "application/octet-stream")}
-        r = client.post(API_BASE + "/documents/upload", files=files)
+        r = client.post(API_BASE + "/documents/upload", files=files, params={"collection": collection})
         r.raise_for_status()
         return r.json()
 
 with left:
     st.subheader("Kütüphane")
+    try:
+        names = [c["name"] for c in api_get("/collections")] or ["default"]
+    except Exception:
+        names = ["default"]
+    collection = st.selectbox("Koleksiyon", names + ["+ yeni"], index=names.index("default") if "default" in names else 0)
+    if collection == "+ yeni":
+        collection = st.text_input("Yeni koleksiyon adı", value="").strip().lower() or "default"
+    if st.session_state.get("docs_collection") != collection:
+        st.session_state["docs_collection"] = collection
+        st.session_state["docs_cursor"] = None
     up = st.file_uploader("PDF / Markdown / TXT yükle", type=["pdf", "md", "txt"])
     if up is not None:
         if st.button("Yükle ve İndeksle", use_container_width=True):
             try:
-                doc = api_upload(up)
+                doc = api_upload(up, collection)
                 st.success(f"İndekslendi: {doc.get('original_name')}")
             except Exception as e:
                 st.error(str(e))
@@ -44,28 +70,43 @@ with left:
     if st.button("Yenile", use_container_width=True):
         st.rerun()
 
+    cursor = st.session_state.get("docs_cursor")
+    path = f"/documents?limit=50&collection={collection}" + (f"&cursor={cursor}" if cursor else "")
     try:
-        docs = api_get("/documents")
+        page = api_get_cached(path)
     except Exception as e:
-        docs = []
+        page = {"items": [], "next_cursor": None, "total": 0}
         st.error(f"Backend erişilemiyor: {e}")
 
+    docs = page.get("items", [])
     if docs:
+        if page.get("total") is not None:
+            st.caption(f"Toplam: {page.get('total')} doküman · {page.get('total_chunks', 0)} chunk")
         for d in docs:
             st.markdown(f"**{d.get('original_name')}**")
-            st.caption(f"id: {d.get('id')} · chunks: {d.get('chunks')} · sha: {d.get('sha256')[:10]}…")
+            st.caption(f"id: {d.get('id')} · chunks: {d.get('chunk_count')} · sha: {d.get('sha256')[:10]}…")
+        c1, c2 = st.columns(2)
+        if cursor and c1.button("İlk sayfa", use_container_width=True):
+            st.session_state["docs_cursor"] = None
+            st.rerun()
+        if page.get("next_cursor") and c2.button("Sonraki sayfa", use_container_width=True):
+            st.session_state["docs_cursor"] = page["next_cursor"]
+            st.rerun()
     else:
         st.info("Henüz doküman yok.")
 
 with right:
     st.subheader("Soru Sor")
     q = st.text_input("Soru", placeholder="Örn: Bu dokümanlarda RAG için en iyi chunk boyutu ne?")
-    top_k = st.slider("Top K", min_value=3, max_value=20, value=8, step=1)
+    top_k = st.slider("Top K", min_value=3, max_value=60, value=8, step=1)
     mode = st.selectbox("Mod", ["Cevap üret", "Sadece ara"], index=0)
+    chat_mode = {"Otomatik": "auto", "Tek istek": "single", "Map-reduce": "map_reduce"}[
+        st.selectbox("Cevap modu", ["Otomatik", "Tek istek", "Map-reduce"], index=0)
+    ]
     if st.button("Çalıştır", use_container_width=True) and q.strip():
         if mode == "Sadece ara":
             try:
-                res = api_post("/search", {"query": q, "top_k": top_k})
+                res = api_post("/search", {"query": q, "top_k": top_k, "collection": collection})
                 st.markdown("### Sonuçlar")
                 for i, s in enumerate(res.get("sources", []), start=1):
                     with st.expander(f"[{i}] {s.get('original_name')} · chunk {s.get('chunk_index')} · score {s.get('score'):.3f}", expanded=(i<=2)):
@@ -76,14 +117,15 @@ with right:
                 st.error(str(e))
         else:
             try:
-                res = api_post("/chat", {"query": q, "top_k": top_k, "style": "concise", "include_sources": True})
+                res = api_post("/chat", {"query": q, "top_k": top_k, "style": "concise", "include_sources": True, "collection": collection, "mode": chat_mode})
                 st.markdown("### Cevap")
                 st.write(res.get("answer", ""))
                 st.markdown("### Kaynaklar")
                 for i, s in enumerate(res.get("sources", []), start=1):
-                    with st.expander(f"[{i}] {s.get('original_name')} · chunk {s.get('chunk_index')} · score {s.get('score'):.3f}", expanded=(i<=3)):
+                    span = s.get("chunk_index") if s.get("chunk_end") in (None, s.get("chunk_index")) else f"{s.get('chunk_index')}-{s.get('chunk_end')}"
+                    with st.expander(f"[{i}] {s.get('original_name')} · chunk {span} · score {s.get('score'):.3f}", expanded=(i<=3)):
                         st.write(s.get("text", ""))
-                        meta = {k: s.get(k) for k in ["doc_id","chunk_id","page_start","page_end","section"]}
+                        meta = {k: s.get(k) for k in ["doc_id","chunk_ids","page_start","page_end","section"]}
                         st.json(meta)
             except Exception as e:
                 st.error(str(e))